@@ -1,5 +1,6 @@
 from flask import Flask
 from core import init_directories
+from utils import metrics
 
 # 创建 Flask 应用
 app = Flask(__name__, static_folder='static', static_url_path='/static')
@@ -7,6 +8,9 @@ app = Flask(__name__, static_folder='static', static_url_path='/static')
 # 初始化目录
 init_directories()
 
+# 请求耗时、状态码与响应大小统计（/metrics 暴露）
+metrics.init_app(app)
+
 # 注册所有 Blueprint（无 prefix，保持原有 URL）
 from routers.auth import auth_bp
 from routers.speaking import speaking_bp
@@ -20,6 +24,8 @@ from routers.asr_transcription import asr_bp
 from routers.writing_logic import writing_bp
 from routers.listening_review import listening_review_bp
 from routers.learning import learning_bp
+from routers.metrics import metrics_bp
+from routers.jobs import jobs_bp
 
 app.register_blueprint(auth_bp)
 app.register_blueprint(speaking_bp)
@@ -33,10 +39,15 @@ app.register_blueprint(asr_bp)
 app.register_blueprint(writing_bp)
 app.register_blueprint(listening_review_bp)
 app.register_blueprint(learning_bp)
+app.register_blueprint(metrics_bp)
+app.register_blueprint(jobs_bp)
 
-# 启动词汇音频后台任务处理器
+# 词汇音频后台任务处理器在首个请求时启动（幂等），导入 app 本身不创建线程
 from routers.vocabulary import start_audio_task_processor
-start_audio_task_processor()
+
+@app.before_request
+def _start_background_workers():
+    start_audio_task_processor()
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5001)
@@ -3,17 +3,21 @@
 """
 
 import os
+import re
 import json
+import string
 import secrets
 import hashlib
 import shutil
 import threading
-import requests
-import yaml
-from datetime import datetime
+from datetime import datetime, timedelta
 from functools import wraps
 from flask import request, jsonify
 from dotenv import load_dotenv
+from utils import audio_catalog, audio_manifest, http_client, metrics, mp3
+from utils import json_store
+from utils.json_store import file_lock, save_json_atomic
+from utils.tts_batch import TTSBatchEngine, PRIORITY_BULK, PRIORITY_INTERACTIVE
 
 load_dotenv()
 
@@ -47,37 +51,124 @@ WRITING_SMALL_MD_FILE = 'writing_correction/resource/小作文仿写.md'
 WRITING_IMAGES_DIR = 'writing_correction/images'
 WRITING_CHAT_DIR = 'writing_correction/data/chat_history'
 LISTENING_REVIEW_DIR = 'listening_review'
+TTS_CACHE_DIR = 'tts_cache'
+# STORAGE_BACKEND=sqlite 时记录型数据（留言、评论、练习记录等）存放的 SQLite 文件
+STORAGE_DB_FILE = os.getenv('STORAGE_DB_FILE', 'storage.sqlite3')
 PROMPTS_DIR = os.path.join(os.path.dirname(__file__), 'prompts')
 
-# 代理配置（用于访问需要翻墙的外部 API，如 Groq / DeerAPI）
-PROXY_URL = os.getenv('PROXY_URL', '').strip()
+# 外部 API 的连接池、超时与代理（PROXY_URL）统一由 utils/http_client.py 管理
 
 
-def get_proxies():
-    """返回 requests 库可用的代理字典，若未配置 PROXY_URL 则返回 None"""
-    if PROXY_URL:
-        return {'http': PROXY_URL, 'https': PROXY_URL}
-    return None
+# ==================== 文件签名 ====================
 
+def _file_signature(path):
+    """返回文件签名 (path, mtime_ns, size)，文件不存在时 mtime/size 为 None"""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return (path, None, None)
+    return (path, st.st_mtime_ns, st.st_size)
 
-def get_openai_http_client(timeout=120.0):
-    """返回带代理的 httpx.Client，供 OpenAI SDK 使用；未配置代理时返回 None。
 
-    DeerAPI 等服务在国内机房会区限制，必须经 PROXY_URL 出站。
-    """
-    if not PROXY_URL:
-        return None
-    import httpx
-    return httpx.Client(proxy=PROXY_URL, timeout=timeout)
+# ==================== Prompt 管理 ====================
 
+# Prompt 注册表：{name: {'signature', 'config', 'version', 'variables', 'templates'}}
+# 每个 YAML 只在文件 mtime/size 变化时解析一次，请求路径上只有一次 stat
+_prompt_registry = {}
+_prompt_registry_lock = threading.Lock()
+_PROMPT_VARIABLES_RE = re.compile(r'^#\s*变量\s*[:：]\s*(.+)$', re.MULTILINE)
 
-# ==================== Prompt 管理 ====================
 
-def load_prompt(name):
-    """从 prompts/ 目录加载指定的 YAML prompt 配置（每次读取磁盘，支持热加载）"""
+def _compile_prompt_template(text):
+    """把含 {变量} 的字符串预编译为 [(字面量, 变量名或None), ...]；不是模板时返回 None"""
+    try:
+        parts = list(string.Formatter().parse(text))
+    except ValueError:
+        return None
+    names = [field for _, field, _, _ in parts if field is not None]
+    # 含 JSON 示例等字面花括号的字段不是模板（原样发送，不做 format）
+    if not names or not all(field.isidentifier() for field in names):
+        return None
+    if any(spec or conv for _, field, spec, conv in parts if field is not None):
+        return None
+    return [(literal, field) for literal, field, _, _ in parts]
+
+def _parse_prompt_file(name, filepath):
+    with open(filepath, 'rb') as f:
+        raw = f.read()
+    text = raw.decode('utf-8')
+    import yaml  # 延迟导入：只有首次加载 prompt 时才需要
+    config = yaml.safe_load(text)
+    if not isinstance(config, dict):
+        raise ValueError(f'Prompt {name} 格式错误：顶层必须是映射')
+
+    templates = {}
+    for field, value in config.items():
+        if isinstance(value, str):
+            compiled = _compile_prompt_template(value)
+            if compiled is not None:
+                templates[field] = compiled
+
+    used = {part[1] for parts in templates.values() for part in parts if part[1]}
+    match = _PROMPT_VARIABLES_RE.search(text)
+    if match:
+        declared = {v.strip() for v in match.group(1).split(',') if v.strip()}
+        if used != declared:
+            raise ValueError(
+                f'Prompt {name} 变量不一致：声明 {sorted(declared)}，模板中使用 {sorted(used)}'
+            )
+
+    return {
+        'config': config,
+        'version': hashlib.sha256(raw).hexdigest()[:12],
+        'variables': frozenset(used),
+        'templates': templates,
+    }
+
+def _get_prompt_entry(name):
+    """返回 prompt 注册表条目，文件变化时重新解析；新版本校验失败时继续使用上一个可用版本"""
     filepath = os.path.join(PROMPTS_DIR, f'{name}.yaml')
-    with open(filepath, 'r', encoding='utf-8') as f:
-        return yaml.safe_load(f)
+    signature = _file_signature(filepath)
+    entry = _prompt_registry.get(name)
+    if entry is not None and entry['signature'] == signature:
+        return entry
+
+    with _prompt_registry_lock:
+        entry = _prompt_registry.get(name)
+        if entry is not None and entry['signature'] == signature:
+            return entry
+        try:
+            new_entry = _parse_prompt_file(name, filepath)
+        except Exception as e:
+            if entry is None:
+                raise
+            print(f"Prompt {name} 重新加载失败，继续使用版本 {entry['version']}: {e}")
+            entry['signature'] = signature
+            return entry
+        new_entry['signature'] = signature
+        _prompt_registry[name] = new_entry
+        return new_entry
+
+def load_prompt(name):
+    """返回 prompts/ 目录下指定 YAML 的配置（已缓存，调用方不要修改；文件变化时自动热加载）"""
+    return _get_prompt_entry(name)['config']
+
+def get_prompt_version(name):
+    """返回 prompt 文件内容的短哈希，可作为下游缓存的版本键"""
+    return _get_prompt_entry(name)['version']
+
+def render_prompt(name, field, /, **values):
+    """用预编译模板渲染 prompt 字段，缺少变量时抛出 KeyError"""
+    entry = _get_prompt_entry(name)
+    template = entry['templates'].get(field)
+    if template is None:
+        return entry['config'][field]
+    missing = [var for _, var in template if var and var not in values]
+    if missing:
+        raise KeyError(f'Prompt {name}.{field} 缺少变量: {", ".join(sorted(set(missing)))}')
+    return ''.join(
+        literal + (str(values[var]) if var else '') for literal, var in template
+    )
 
 
 # ==================== 路径安全 ====================
@@ -91,39 +182,68 @@ def is_safe_path_segment(name):
     return '/' not in name and '\\' not in name and '\x00' not in name
 
 
+# ==================== 数据集合存储 ====================
+
+def open_collection(name, json_path, layout='list'):
+    """按 STORAGE_BACKEND 打开逻辑集合：json（默认，沿用原文件布局）或 sqlite（WAL）"""
+    return json_store.open_collection(name, json_path, STORAGE_DB_FILE, layout=layout)
+
+
 # ==================== 目录初始化 ====================
 
+# 上次已创建的目录集合；同一进程内路径未变时 init_directories 直接返回
+_initialized_dirs = None
+
 def init_directories():
     """初始化所有必要的目录"""
-    os.makedirs(MOTHER_DIR, exist_ok=True)
-    os.makedirs(COMBINED_DIR, exist_ok=True)
-    os.makedirs(INTENSIVE_DIR, exist_ok=True)
-    os.makedirs(INTENSIVE_IMAGES_DIR, exist_ok=True)
-    os.makedirs(VOCAB_AUDIO_DIR, exist_ok=True)
-    os.makedirs(VOCABULARY_BOOK_DIR, exist_ok=True)
-    os.makedirs(VOCABULARY_CATEGORIES_DIR, exist_ok=True)
-    os.makedirs(VOCABULARY_TASKS_DIR, exist_ok=True)
-    os.makedirs(VOCABULARY_CHALLENGE_DIR, exist_ok=True)
-    # 创建分类音频目录
-    for category in ['listening', 'speaking', 'reading', 'writing']:
-        os.makedirs(os.path.join(VOCABULARY_AUDIO_DIR, category), exist_ok=True)
-    os.makedirs(MESSAGE_BOARD_DIR, exist_ok=True)
-    os.makedirs(MESSAGE_IMAGES_DIR, exist_ok=True)
-    os.makedirs(CHALLENGES_DIR, exist_ok=True)
-    os.makedirs(STUDY_TECHNIQUES_DIR, exist_ok=True)
-    os.makedirs(STUDY_TECHNIQUES_DATA_DIR, exist_ok=True)
-    os.makedirs(STUDY_TECHNIQUES_AUDIO_DIR, exist_ok=True)
-    os.makedirs(AUDIO_TRANSCRIPTION_DIR, exist_ok=True)
-    os.makedirs(WRITING_DATA_DIR, exist_ok=True)
-    os.makedirs(WRITING_IMAGES_DIR, exist_ok=True)
-    os.makedirs(WRITING_CHAT_DIR, exist_ok=True)
-    os.makedirs(LISTENING_REVIEW_DIR, exist_ok=True)
+    global _initialized_dirs
+    dirs = (
+        MOTHER_DIR, COMBINED_DIR, INTENSIVE_DIR, INTENSIVE_IMAGES_DIR, VOCAB_AUDIO_DIR,
+        VOCABULARY_BOOK_DIR, VOCABULARY_CATEGORIES_DIR, VOCABULARY_TASKS_DIR, VOCABULARY_CHALLENGE_DIR,
+        # 分类音频目录
+        *(os.path.join(VOCABULARY_AUDIO_DIR, category) for category in ['listening', 'speaking', 'reading', 'writing']),
+        MESSAGE_BOARD_DIR, MESSAGE_IMAGES_DIR, CHALLENGES_DIR,
+        STUDY_TECHNIQUES_DIR, STUDY_TECHNIQUES_DATA_DIR, STUDY_TECHNIQUES_AUDIO_DIR,
+        AUDIO_TRANSCRIPTION_DIR, WRITING_DATA_DIR, WRITING_IMAGES_DIR, WRITING_CHAT_DIR,
+        LISTENING_REVIEW_DIR, TTS_CACHE_DIR,
+    )
+    if dirs == _initialized_dirs:
+        return
+    for path in dirs:
+        os.makedirs(path, exist_ok=True)
+    _initialized_dirs = dirs
 
 
 # ==================== Token 管理 ====================
 
-def load_tokens():
-    """加载token数据"""
+# token 存储：tokens.json 为快照，tokens.json.log 为追加日志（每行一个 JSON 事件），
+# 登录只追加一行日志，日志达到 TOKEN_LOG_COMPACT_LINES 行时合并回快照并清空日志。
+# 内存中维护 token 索引 {token: {'created_time', 'username', ['expires_at']}} 和
+# 按用户的 token 列表（按创建时间升序），快照/日志变化时增量或全量重新加载
+TOKEN_MAX_PER_USER = 30
+TOKEN_LOG_COMPACT_LINES = int(os.getenv('TOKEN_LOG_COMPACT_LINES', '1000'))
+# token 有效期（天），0 表示永久有效
+TOKEN_TTL_DAYS = float(os.getenv('TOKEN_TTL_DAYS', '0'))
+
+_token_index = {}
+_user_token_index = {}
+_token_index_signature = None   # (快照签名, 日志 inode, 已读取的日志字节数)
+_token_log_lines = 0
+_token_index_lock = threading.RLock()
+
+
+def _token_log_file():
+    return f"{TOKEN_FILE}.log"
+
+def _token_log_stat():
+    """返回 (inode, size)，日志不存在时为 (None, 0)"""
+    try:
+        st = os.stat(_token_log_file())
+    except OSError:
+        return (None, 0)
+    return (st.st_ino, st.st_size)
+
+def _read_tokens_file():
     if os.path.exists(TOKEN_FILE):
         try:
             with open(TOKEN_FILE, 'r', encoding='utf-8') as f:
@@ -132,42 +252,193 @@ def load_tokens():
             return {}
     return {}
 
+def _index_add_token(token, record):
+    if token in _token_index:
+        _index_remove_token(token)
+    _token_index[token] = record
+    username = record.get('username')
+    if username:
+        _user_token_index.setdefault(username, []).append(token)
+
+def _index_remove_token(token):
+    record = _token_index.pop(token, None)
+    username = record.get('username') if record else None
+    if username and token in _user_token_index.get(username, ()):
+        _user_token_index[username].remove(token)
+
+def _apply_token_event(event):
+    token = event.get('token')
+    if not token:
+        return
+    if event.get('op') == 'del':
+        _index_remove_token(token)
+    else:
+        _index_add_token(token, {k: v for k, v in event.items() if k not in ('op', 'token')})
+
+def _replay_token_log(offset):
+    """从 offset 开始重放日志中的完整行，返回 (新的 offset, 行数)"""
+    try:
+        with open(_token_log_file(), 'rb') as f:
+            f.seek(offset)
+            chunk = f.read()
+    except OSError:
+        return offset, 0
+    # 只处理以换行结尾的完整行，半行留到下次
+    end = chunk.rfind(b'\n') + 1
+    lines = chunk[:end].splitlines()
+    for line in lines:
+        try:
+            _apply_token_event(json.loads(line))
+        except (ValueError, AttributeError):
+            continue
+    return offset + end, len(lines)
+
+def _rebuild_token_index(tokens):
+    global _token_index, _user_token_index
+    _token_index = {}
+    _user_token_index = {}
+    for token, record in sorted(tokens.items(), key=lambda item: item[1].get('created_time', '')):
+        _index_add_token(token, record)
+
+def _reload_token_index(snapshot_signature, log_inode):
+    global _token_index_signature, _token_log_lines
+    _rebuild_token_index(_read_tokens_file())
+    offset, _token_log_lines = _replay_token_log(0)
+    _token_index_signature = (snapshot_signature, log_inode, offset)
+
+def _get_token_index():
+    """返回 token 索引（只读），快照或日志变化时自动重新加载"""
+    global _token_index_signature, _token_log_lines
+    snapshot_signature = _file_signature(TOKEN_FILE)
+    log_inode, log_size = _token_log_stat()
+    if _token_index_signature == (snapshot_signature, log_inode, log_size):
+        metrics.record_cache('tokens', True)
+        return _token_index
+    metrics.record_cache('tokens', False)
+    with _token_index_lock:
+        current = _token_index_signature
+        if current and current[:2] == (snapshot_signature, log_inode) and log_size >= current[2]:
+            # 只有其他进程追加了日志：从上次读取的位置增量重放
+            offset, count = _replay_token_log(current[2])
+            _token_log_lines += count
+            _token_index_signature = (snapshot_signature, log_inode, offset)
+        elif current != (snapshot_signature, log_inode, log_size):
+            # 先取签名再读文件：读取期间若文件再次变化，下次请求会重新加载
+            _reload_token_index(snapshot_signature, log_inode)
+        return _token_index
+
+def load_tokens():
+    """加载token数据（返回副本，可自由修改）"""
+    return dict(_get_token_index())
+
+def _append_token_events(events):
+    """在 TOKEN_FILE 文件锁内调用：追加日志行并推进已读取位置（内存索引由调用方更新）"""
+    global _token_index_signature, _token_log_lines
+    data = ''.join(json.dumps(event, ensure_ascii=False) + '\n' for event in events).encode('utf-8')
+    fd = os.open(_token_log_file(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        os.write(fd, data)
+    finally:
+        os.close(fd)
+    snapshot_signature, log_inode, offset = _token_index_signature
+    _token_index_signature = (snapshot_signature, _token_log_stat()[0], offset + len(data))
+    _token_log_lines += len(events)
+
+def _write_tokens_file(tokens):
+    """写快照并清空日志（快照已包含日志中的全部事件）"""
+    global _token_index_signature, _token_log_lines
+    try:
+        save_json_atomic(TOKEN_FILE, tokens)
+        log_file = _token_log_file()
+        tmp_path = f"{log_file}.{secrets.token_hex(4)}.tmp"
+        open(tmp_path, 'w').close()
+        os.replace(tmp_path, log_file)
+    except Exception:
+        # 写入失败时让下次访问从磁盘重新加载，避免内存与文件不一致
+        _token_index_signature = None
+        raise
+    _token_log_lines = 0
+    _token_index_signature = (_file_signature(TOKEN_FILE), _token_log_stat()[0], 0)
+
+def _token_expired(record, now=None):
+    expires_at = record.get('expires_at')
+    return bool(expires_at) and expires_at <= (now or datetime.now().isoformat())
+
+def compact_tokens():
+    """把日志合并回 tokens.json，同时丢弃已过期的 token"""
+    with file_lock(TOKEN_FILE), _token_index_lock:
+        now = datetime.now().isoformat()
+        tokens = {k: v for k, v in _get_token_index().items() if not _token_expired(v, now)}
+        _rebuild_token_index(tokens)
+        _write_tokens_file(_token_index)
+
 def save_tokens(tokens):
-    """保存token数据"""
-    with open(TOKEN_FILE, 'w', encoding='utf-8') as f:
-        json.dump(tokens, f, ensure_ascii=False, indent=2)
+    """保存token数据（整体重写快照），并同步更新内存索引"""
+    with file_lock(TOKEN_FILE), _token_index_lock:
+        _rebuild_token_index(dict(tokens))
+        _write_tokens_file(_token_index)
 
 def generate_token():
     """生成新的token"""
     return secrets.token_urlsafe(32)
 
+def get_token_record(token):
+    """O(1) 查询 token 记录，不存在或已过期时返回 None"""
+    if not token:
+        return None
+    record = _get_token_index().get(token)
+    if record is None or _token_expired(record):
+        return None
+    return record
+
 def is_token_valid(token):
-    """检查token是否有效（token永久有效，只需检查是否存在）"""
-    tokens = load_tokens()
-    return token in tokens
+    """检查token是否有效（存在且未过期）"""
+    return get_token_record(token) is not None
 
 def create_token(username=None):
-    """创建新token，同时清理同一用户的旧token（保留最近30个）"""
+    """创建新token：追加一行日志，并按用户索引清理同一用户的旧token（保留最近30个）。
+    持有 tokens.json 的文件锁，并在锁内增量加载其他进程追加的日志，多 worker 并发登录也不会丢 token"""
     token = generate_token()
-    tokens = load_tokens()
-    # 清理同一用户的旧token，防止tokens.json无限增长
-    if username:
-        user_tokens = [(k, v) for k, v in tokens.items() if v.get('username') == username]
-        user_tokens.sort(key=lambda x: x[1].get('created_time', ''), reverse=True)
-        for old_token, _ in user_tokens[30:]:
-            del tokens[old_token]
-    tokens[token] = {
-        'created_time': datetime.now().isoformat(),
-        'username': username
-    }
-    save_tokens(tokens)
+    now = datetime.now()
+    record = {'created_time': now.isoformat(), 'username': username}
+    if TOKEN_TTL_DAYS > 0:
+        record['expires_at'] = (now + timedelta(days=TOKEN_TTL_DAYS)).isoformat()
+    with file_lock(TOKEN_FILE), _token_index_lock:
+        _get_token_index()
+        events = [{'op': 'add', 'token': token, **record}]
+        _index_add_token(token, record)
+        # 清理同一用户的旧token，防止 token 存储无限增长
+        if username:
+            user_tokens = _user_token_index.get(username, [])
+            for old_token in user_tokens[:-TOKEN_MAX_PER_USER]:
+                events.append({'op': 'del', 'token': old_token})
+            for event in events[1:]:
+                _index_remove_token(event['token'])
+        _append_token_events(events)
+        if _token_log_lines >= TOKEN_LOG_COMPACT_LINES:
+            compact_tokens()
     return token
 
 
 # ==================== 用户管理 ====================
 
-def load_users():
-    """加载用户数据"""
+# 进程级用户目录缓存：原始用户数据 + 预先构建好的公开资料，按 users.json 的 mtime/size 失效
+_users_cache = {'signature': None, 'users': {}, 'profiles': {}}
+_users_cache_lock = threading.Lock()
+
+DEFAULT_AVATAR = 'avatar_admin.svg'
+
+
+def _build_public_profile(username, user_data):
+    """构建不含密码的公开用户资料"""
+    return {
+        'username': user_data.get('username', username),
+        'display_name': user_data.get('display_name', username),
+        'role': user_data.get('role'),
+        'avatar': user_data.get('avatar', DEFAULT_AVATAR)
+    }
+
+def _read_users_file():
     if os.path.exists(USERS_FILE):
         try:
             with open(USERS_FILE, 'r', encoding='utf-8') as f:
@@ -176,30 +447,72 @@ def load_users():
             return {}
     return {}
 
+def _set_users_cache(users, signature):
+    _users_cache['users'] = users
+    _users_cache['profiles'] = {
+        username: _build_public_profile(username, data)
+        for username, data in users.items() if isinstance(data, dict)
+    }
+    _users_cache['signature'] = signature
+
+def _get_users_cache():
+    """返回用户目录缓存，文件变化时自动重新加载"""
+    signature = _file_signature(USERS_FILE)
+    hit = signature == _users_cache['signature']
+    metrics.record_cache('users', hit)
+    if not hit:
+        with _users_cache_lock:
+            if signature != _users_cache['signature']:
+                _set_users_cache(_read_users_file(), signature)
+    return _users_cache
+
+def load_users():
+    """加载用户数据（返回浅拷贝）"""
+    return dict(_get_users_cache()['users'])
+
 def save_users(users):
-    """保存用户数据"""
-    with open(USERS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(users, f, ensure_ascii=False, indent=2)
+    """保存用户数据，并同步刷新缓存"""
+    with _users_cache_lock:
+        save_json_atomic(USERS_FILE, users)
+        _set_users_cache(dict(users), _file_signature(USERS_FILE))
+
+def get_user_profile(username):
+    """返回预构建的公开用户资料（共享对象，调用方不要修改），用户不存在返回 None"""
+    if not username:
+        return None
+    return _get_users_cache()['profiles'].get(username)
+
+def get_user_profiles():
+    """返回 {username: 公开资料} 的只读映射"""
+    return _get_users_cache()['profiles']
 
 def authenticate_user(username, password):
     """验证用户凭据"""
-    users = load_users()
-    if username in users:
-        user_data = users[username]
-        if user_data.get('password') == password:
-            return user_data
+    user_data = _get_users_cache()['users'].get(username)
+    if isinstance(user_data, dict) and user_data.get('password') == password:
+        return user_data
     return None
 
 
 # ==================== 认证辅助函数 ====================
 
+def get_request_token():
+    """从 Authorization 头中取出 token（兼容带或不带 'Bearer ' 前缀），缺失时返回 None"""
+    auth_header = request.headers.get('Authorization', '')
+    if auth_header.startswith('Bearer '):
+        auth_header = auth_header[7:]
+    return auth_header.strip() or None
+
 def verify_token_get_username(token):
     """从token中获取用户名"""
-    if not token or not is_token_valid(token):
+    record = get_token_record(token)
+    if record is None:
         return None
+    return record.get('username')
 
-    tokens = load_tokens()
-    return tokens.get(token, {}).get('username')
+def get_request_username():
+    """从当前请求的 Authorization 头解析用户名，未登录返回 None"""
+    return verify_token_get_username(get_request_token())
 
 def verify_token_from_request():
     """从请求中验证token"""
@@ -207,8 +520,7 @@ def verify_token_from_request():
     if not auth_header or not auth_header.startswith('Bearer '):
         return False
 
-    token = auth_header.split(' ')[1]
-    return is_token_valid(token)
+    return is_token_valid(get_request_token())
 
 def require_auth(f):
     """装饰器：要求认证"""
@@ -218,8 +530,7 @@ def require_auth(f):
         if not auth_header or not auth_header.startswith('Bearer '):
             return jsonify({'error': 'Missing or invalid token'}), 401
 
-        token = auth_header.split(' ')[1]
-        username = verify_token_get_username(token)
+        username = get_request_username()
         if not username:
             return jsonify({'error': 'Invalid token'}), 401
 
@@ -231,36 +542,294 @@ def require_auth(f):
 
 # ==================== TTS 基础函数 ====================
 
-def generate_tts(text, folder):
-    """生成 TTS 音频并保存到指定文件夹"""
-    url = "https://api.deerapi.com/v1/audio/speech"
-    payload = json.dumps({
-        "model": "tts-1",
-        "input": text,
-        "voice": "nova"
-    })
+TTS_API_URL = "https://api.deerapi.com/v1/audio/speech"
+TTS_MODEL = "tts-1"
+TTS_VOICE = "nova"
+TTS_TIMEOUT = (10, 120)  # (连接超时, 读取超时)，长文本合成可能较慢
+TTS_STREAM_CHUNK = 16 * 1024  # 流式转发时每次读取的字节数
+
+
+class TTSError(Exception):
+    """TTS 接口返回非 200 状态码"""
+
+    def __init__(self, status_code, detail=''):
+        super().__init__(f'TTS API错误: {status_code}, 响应: {detail[:200]}')
+        self.status_code = status_code
+
+
+def synthesize_speech(text, timeout=TTS_TIMEOUT):
+    """调用 DeerAPI TTS（复用连接池，受 deerapi_tts 调度器限流），返回 MP3 二进制数据；失败抛出 TTSError、CircuitOpenError 或 requests 异常"""
+    headers = {
+        'Authorization': f"Bearer {os.getenv('DEER_API_KEY')}",
+        'Content-Type': 'application/json'
+    }
+    payload = {"model": TTS_MODEL, "input": text, "voice": TTS_VOICE}
+    response = http_client.post(
+        'deerapi', TTS_API_URL, channel='deerapi_tts', headers=headers, json=payload, timeout=timeout
+    )
+    if response.status_code != 200:
+        raise TTSError(response.status_code, response.text)
+    return response.content
+
+def open_speech_stream(text, timeout=TTS_TIMEOUT):
+    """以 stream=True 调用 TTS，收到响应头即返回 response（正文尚未读取）；非 200 抛出 TTSError。
+
+    正文读完或 response 关闭前一直占用 deerapi_tts 调度器的并发名额，调用方必须 close()
+    """
     headers = {
         'Authorization': f"Bearer {os.getenv('DEER_API_KEY')}",
         'Content-Type': 'application/json'
     }
-    response = requests.request("POST", url, headers=headers, data=payload)
+    payload = {"model": TTS_MODEL, "input": text, "voice": TTS_VOICE}
+    response = http_client.post(
+        'deerapi', TTS_API_URL, channel='deerapi_tts', headers=headers, json=payload,
+        timeout=timeout, stream=True
+    )
     if response.status_code != 200:
-        raise Exception(f'TTS API错误: {response.status_code}, 响应: {response.text[:200]}')
-    audio_data = response.content
+        try:
+            raise TTSError(response.status_code, response.text)
+        finally:
+            response.close()
+    return response
+
+# ==================== TTS 内容寻址缓存 ====================
+# 所有 TTS 音频按 hash(model, voice, 规范化文本) 存放在 TTS_CACHE_DIR/<前两位>/<hash>.mp3，
+# 各业务目录下的旧路径（文件夹音频、词汇音频、单词本音频、文章分片）以硬链接挂到缓存文件上。
+# 别名文件只会被整体替换或删除，不能原地改写，否则会改到共享的缓存内容。
+
+def normalize_tts_text(text):
+    """规范化 TTS 文本：去掉首尾空白并合并连续空白"""
+    return ' '.join(text.split())
+
+def tts_cache_key(text, model=None, voice=None):
+    """计算 TTS 缓存键 sha256(model, voice, 规范化文本)"""
+    raw = f"{model or TTS_MODEL}\n{voice or TTS_VOICE}\n{normalize_tts_text(text)}"
+    return hashlib.sha256(raw.encode('utf-8')).hexdigest()
+
+def tts_cache_path(key):
+    """返回缓存键对应的文件路径"""
+    return os.path.join(TTS_CACHE_DIR, key[:2], f"{key}.mp3")
+
+def _write_bytes_atomic(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{secrets.token_hex(4)}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def get_cached_tts(text, timeout=TTS_TIMEOUT):
+    """返回缓存中的音频路径；命中只需一次 stat，未命中时调用 TTS 并写入缓存"""
+    path = tts_cache_path(tts_cache_key(text))
+    if os.path.exists(path):
+        metrics.record_cache('tts', True)
+        return path
+    metrics.record_cache('tts', False)
+    audio_data = synthesize_speech(text, timeout=timeout)
+    if not audio_data:
+        raise Exception("生成的音频文件为空")
+    _write_bytes_atomic(path, audio_data)
+    return path
+
+def link_tts_alias(cache_path, alias_path):
+    """把缓存文件以硬链接挂到业务路径（跨设备等不支持硬链接时退化为复制），原子替换已有文件"""
+    os.makedirs(os.path.dirname(alias_path) or '.', exist_ok=True)
+    tmp_path = f"{alias_path}.{secrets.token_hex(4)}.tmp"
+    try:
+        try:
+            os.link(cache_path, tmp_path)
+        except OSError:
+            shutil.copyfile(cache_path, tmp_path)
+        os.replace(tmp_path, alias_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return alias_path
+
+# ==================== 批量 TTS ====================
+
+# 批量并发上限；实际速率与并发由 deerapi_tts 调度器（utils/governor.py）按服务端反馈自适应
+TTS_BATCH_WORKERS = int(os.getenv('TTS_BATCH_WORKERS', '8'))
+
+_tts_batch_engine = None
+_tts_batch_engine_lock = threading.Lock()
+
+
+def get_tts_batch_engine():
+    """返回进程内共享的批量 TTS 引擎（首次使用时创建）"""
+    global _tts_batch_engine
+    if _tts_batch_engine is None:
+        with _tts_batch_engine_lock:
+            if _tts_batch_engine is None:
+                _tts_batch_engine = TTSBatchEngine(get_cached_tts, tts_cache_key, workers=TTS_BATCH_WORKERS)
+    return _tts_batch_engine
+
+def synthesize_many(words, priority=PRIORITY_BULK):
+    """批量合成多条文本：缓存命中直接返回，其余在有界线程池中并发合成（去重、限速）。
+
+    返回与输入顺序一致的结果列表 [{'text', 'ok', 'path', 'cached', 'error'}]
+    """
+    results = [None] * len(words)
+    misses = []
+    for i, text in enumerate(words):
+        path = tts_cache_path(tts_cache_key(text))
+        if os.path.exists(path):
+            results[i] = {'text': text, 'ok': True, 'path': path, 'cached': True, 'error': None}
+        else:
+            misses.append(i)
+
+    if misses:
+        batch = get_tts_batch_engine().run_many([words[i] for i in misses], priority)
+        for i, item in zip(misses, batch):
+            results[i] = {
+                'text': words[i], 'ok': item['ok'], 'path': item['result'],
+                'cached': False, 'error': item['error']
+            }
+    return results
+
+def _save_tts_clip(folder, filename, text, cache_path):
+    """把缓存音频链接到口语文件夹，写同名文本文件并追加到文件夹 manifest"""
     folder_path = os.path.join(MOTHER_DIR, folder)
     os.makedirs(folder_path, exist_ok=True)
-    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    filename = f"{folder}_{timestamp}.mp3"
     filepath = os.path.join(folder_path, filename)
-    with open(filepath, 'wb') as f:
-        f.write(audio_data)
+    link_tts_alias(cache_path, filepath)
     # 保存同名文本文件
     txt_filename = filename.replace('.mp3', '.txt')
     txt_filepath = os.path.join(folder_path, txt_filename)
     with open(txt_filepath, 'w', encoding='utf-8') as f:
         f.write(text)
+    audio_manifest.add_clip(folder_path, filename, text=text)
+    audio_catalog.folder_changed(MOTHER_DIR, folder)
+
+def generate_tts(text, folder):
+    """生成 TTS 音频并保存到指定文件夹"""
+    cache_path = get_cached_tts(text)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{folder}_{timestamp}.mp3"
+    _save_tts_clip(folder, filename, text, cache_path)
     return folder, filename
 
+def _iter_file(path, chunk_size=TTS_STREAM_CHUNK):
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
+
+def _tee_tts_stream(response, cache_path, folder, filename, text):
+    """边转发 TTS 分块边写入临时文件；读完后原子放入缓存并挂到口语文件夹"""
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    tmp_path = f"{cache_path}.{secrets.token_hex(4)}.tmp"
+    chunks = response.iter_content(chunk_size=TTS_STREAM_CHUNK)
+    completed = False
+    try:
+        size = 0
+        with open(tmp_path, 'wb') as f:
+            try:
+                for chunk in chunks:
+                    if chunk:
+                        f.write(chunk)
+                        size += len(chunk)
+                        yield chunk
+            except GeneratorExit:
+                # 客户端中途断开：读完剩余内容，音频库里仍保存完整文件
+                for chunk in chunks:
+                    f.write(chunk)
+                    size += len(chunk)
+        if not size:
+            raise Exception("生成的音频文件为空")
+        os.replace(tmp_path, cache_path)
+        completed = True
+        _save_tts_clip(folder, filename, text, cache_path)
+    finally:
+        response.close()
+        if not completed and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+def stream_tts(text, folder):
+    """流式生成 TTS：返回 (filename, 分块迭代器)。
+
+    缓存命中时直接读缓存文件；未命中时把上游分块响应原样转发，同时写盘，
+    迭代结束后文件进入缓存和文件夹（与 generate_tts 的结果相同）。
+    上游错误在返回前抛出，调用方仍可返回普通错误响应。
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"{folder}_{timestamp}.mp3"
+    cache_path = tts_cache_path(tts_cache_key(text))
+    if os.path.exists(cache_path):
+        metrics.record_cache('tts', True)
+        _save_tts_clip(folder, filename, text, cache_path)
+        return filename, _iter_file(cache_path)
+    metrics.record_cache('tts', False)
+    response = open_speech_stream(text)
+    return filename, _tee_tts_stream(response, cache_path, folder, filename, text)
+
+def generate_tts_batch(folder, texts, batch_id, on_item=None):
+    """并发合成一组文本，按输入顺序写入文件夹。
+
+    文件名为 {folder}_{时间}_{batch_id}_{序号:03d}.mp3，同一秒内的多个批次也不会冲突；
+    合成在批量 TTS 引擎中并发进行（交互优先级），写入和 manifest 追加严格按序号进行。
+    每条写入或失败后回调 on_item(index, filename, error)，返回文件名列表（失败项为 None）
+    """
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    engine = get_tts_batch_engine()
+    futures = [engine.submit(text, PRIORITY_INTERACTIVE) for text in texts]
+    filenames = []
+    for i, (text, future) in enumerate(zip(texts, futures)):
+        filename = f"{folder}_{timestamp}_{batch_id}_{i:03d}.mp3"
+        try:
+            _save_tts_clip(folder, filename, text, future.result())
+        except Exception as e:
+            filenames.append(None)
+            if on_item:
+                on_item(i, None, str(e))
+            continue
+        filenames.append(filename)
+        if on_item:
+            on_item(i, filename, None)
+    return filenames
+
+
+# ==================== 音频拼接 ====================
+
+def concat_audio_files(paths, output_path, gap_ms=0):
+    """按顺序拼接 MP3 文件，段间插入 gap_ms 毫秒静音，返回 (各段时长列表, 实际静音秒数)。
+
+    同格式的 TTS 音频直接按帧拼接（不解码、不重新编码，边读边写）；
+    格式不一致或无法解析时退回 pydub 解码合并。两种方式都先写临时文件再原子替换，播放端不会读到半个文件
+    """
+    try:
+        return mp3.concat_files(paths, output_path, gap=gap_ms / 1000.0)
+    except mp3.ConcatError as e:
+        print(f"按帧拼接失败，改用 pydub 合并: {e}")
+
+    # pydub 较重，用到时再导入
+    from pydub import AudioSegment
+    combined_audio = None
+    silence = AudioSegment.silent(duration=gap_ms)
+    durations = []
+    for path in paths:
+        audio = AudioSegment.from_mp3(path)
+        durations.append(len(audio) / 1000.0)
+        if combined_audio is None:
+            combined_audio = audio
+        else:
+            combined_audio = combined_audio + silence + audio
+    tmp_path = f"{output_path}.{secrets.token_hex(4)}.tmp"
+    try:
+        combined_audio.export(tmp_path, format="mp3")
+        os.replace(tmp_path, output_path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return durations, gap_ms / 1000.0
 
 # ==================== 词汇音频工具函数 ====================
 
@@ -281,32 +850,25 @@ def generate_and_save_vocab_audio(article_id, word):
     if os.path.exists(audio_path):
         return audio_path
 
-    # 生成音频数据
-    url = "https://api.deerapi.com/v1/audio/speech"
-    payload = json.dumps({
-        "model": "tts-1",
-        "input": word,
-        "voice": "nova"
-    })
-    headers = {
-        'Authorization': f"Bearer {os.getenv('DEER_API_KEY')}",
-        'Content-Type': 'application/json'
-    }
-
     try:
-        response = requests.post(url, headers=headers, data=payload, timeout=10)
-        if response.status_code == 200:
-            with open(audio_path, 'wb') as f:
-                f.write(response.content)
-            print(f"Generated audio for word '{word}' in article '{article_id}'")
-            return audio_path
-        else:
-            print(f"TTS API error for word '{word}': {response.status_code}")
-            return None
+        # 同一个单词在其他文章/挑战中已生成过时直接命中缓存，不再请求 TTS
+        link_tts_alias(get_cached_tts(word, timeout=(10, 10)), audio_path)
+        print(f"Generated audio for word '{word}' in article '{article_id}'")
+        return audio_path
+    except TTSError as e:
+        print(f"TTS API error for word '{word}': {e.status_code}")
+        return None
     except Exception as e:
         print(f"Error generating pronunciation for '{word}': {e}")
         return None
 
+def link_cached_vocab_audio(article_id, word):
+    """词汇音频不存在但缓存中已有同词音频时补建别名，返回路径；缓存未命中返回 None"""
+    cache_path = tts_cache_path(tts_cache_key(word))
+    if not os.path.exists(cache_path):
+        return None
+    return link_tts_alias(cache_path, get_vocab_audio_path(article_id, word))
+
 def delete_vocab_audio(article_id, word):
     """删除特定词汇的音频文件"""
     audio_path = get_vocab_audio_path(article_id, word)
@@ -372,3 +934,23 @@ def generate_vocab_audio_async(article_id, word):
 def generate_challenge_vocab_audio(challenge_id, word):
     """为挑战生成词汇音频（使用challenge_id作为文章ID）"""
     return generate_and_save_vocab_audio(f"challenge_{challenge_id}", word)
+
+def generate_vocab_audio_batch(article_id, words, priority=PRIORITY_BULK):
+    """批量生成一篇文章/一个挑战的词汇音频，返回 (成功数, 失败结果列表)"""
+    words = [w.strip() for w in words if w and w.strip()]
+    failed = []
+    generated = 0
+    for item in synthesize_many(words, priority):
+        if not item['ok']:
+            failed.append(item)
+            continue
+        try:
+            link_tts_alias(item['path'], get_vocab_audio_path(article_id, item['text']))
+            generated += 1
+        except Exception as e:
+            failed.append(dict(item, ok=False, error=str(e)))
+    return generated, failed
+
+def generate_challenge_vocab_audio_batch(challenge_id, words):
+    """为挑战批量生成词汇音频（使用challenge_id作为文章ID）"""
+    return generate_vocab_audio_batch(f"challenge_{challenge_id}", words)
@@ -2,29 +2,44 @@ from flask import Blueprint, request, jsonify, send_file, send_from_directory
 import os, json, re, uuid, threading, shutil, requests, time
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from core import AUDIO_TRANSCRIPTION_DIR, verify_token_from_request, is_token_valid, load_tokens
+from utils import http_client
+from utils.governor import CircuitOpenError, backoff_delay
+from utils.media import send_media
+from core import (
+    AUDIO_TRANSCRIPTION_DIR, verify_token_from_request, is_token_valid,
+    get_token_record, get_request_token, open_collection
+)
 
 asr_bp = Blueprint('asr', __name__)
 
 
 # ==================== 音频转文本相关辅助函数 ====================
 
+def _transcription_file():
+    return os.path.join(AUDIO_TRANSCRIPTION_DIR, 'transcriptions.json')
+
+def transcriptions_collection():
+    """转录记录集合（json 或 sqlite 后端）"""
+    return open_collection('transcriptions', _transcription_file())
+
 def load_transcription_data():
     """加载转录数据"""
-    transcription_file = os.path.join(AUDIO_TRANSCRIPTION_DIR, 'transcriptions.json')
-    if os.path.exists(transcription_file):
-        try:
-            with open(transcription_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_transcription_data(transcriptions):
-    """保存转录数据"""
-    transcription_file = os.path.join(AUDIO_TRANSCRIPTION_DIR, 'transcriptions.json')
-    with open(transcription_file, 'w', encoding='utf-8') as f:
-        json.dump(transcriptions, f, ensure_ascii=False, indent=2)
+    return transcriptions_collection().all()
+
+def update_transcription(transcription_id, changes, remove_keys=()):
+    """按 id 原子更新单条转录记录"""
+    def apply(trans):
+        trans.update(changes)
+        for key in remove_keys:
+            trans.pop(key, None)
+    transcriptions_collection().update(transcription_id, apply)
+
+def _find_user_transcription(transcription_id, username):
+    """按 id 查找属于 username 的转录记录，不存在或无权限时返回 None"""
+    transcription = transcriptions_collection().get(transcription_id)
+    if transcription and transcription.get('username') == username:
+        return transcription
+    return None
 
 def generate_transcription_id():
     """生成转录ID"""
@@ -70,7 +85,10 @@ def call_transcription_api(audio_file_path, language=None, max_retries=3):
                 # 设置不同的超时时间
                 timeout = (10, 300)  # (连接超时, 读取超时)
 
-                response = requests.post(url, headers=headers, files=files, data=data, timeout=timeout)
+                response = http_client.post(
+                    'deerapi', url, channel='deerapi_asr',
+                    headers=headers, files=files, data=data, timeout=timeout
+                )
 
                 if response.status_code == 200:
                     result = response.json()
@@ -100,6 +118,11 @@ def call_transcription_api(audio_file_path, language=None, max_retries=3):
 
                     if attempt == max_retries - 1:
                         return None, error_msg
+                    time.sleep(backoff_delay(attempt))
+
+        except CircuitOpenError as e:
+            # 服务端持续故障时快速失败，不再重试
+            return None, str(e)
 
         except requests.exceptions.Timeout as e:
             error_msg = f"请求超时: {str(e)}"
@@ -107,7 +130,7 @@ def call_transcription_api(audio_file_path, language=None, max_retries=3):
             if attempt == max_retries - 1:
                 return None, error_msg
             # 超时后等待一段时间再重试
-            time.sleep(2 ** attempt)  # 指数退避
+            time.sleep(backoff_delay(attempt))  # 指数退避
 
         except requests.exceptions.ConnectionError as e:
             error_msg = f"网络连接错误: {str(e)}"
@@ -115,21 +138,21 @@ def call_transcription_api(audio_file_path, language=None, max_retries=3):
             if attempt == max_retries - 1:
                 return None, error_msg
             # 连接错误后等待更长时间
-            time.sleep(5 + (2 ** attempt))
+            time.sleep(backoff_delay(attempt, base=4))
 
         except requests.exceptions.RequestException as e:
             error_msg = f"请求异常: {str(e)}"
             print(f"请求异常，尝试 {attempt + 1}: {error_msg}")
             if attempt == max_retries - 1:
                 return None, error_msg
-            time.sleep(2 ** attempt)
+            time.sleep(backoff_delay(attempt))
 
         except Exception as e:
             error_msg = f"未知错误: {str(e)}"
             print(f"未知错误，尝试 {attempt + 1}: {error_msg}")
             if attempt == max_retries - 1:
                 return None, error_msg
-            time.sleep(1 + attempt)
+            time.sleep(backoff_delay(attempt))
 
     return None, f"转录失败，已重试 {max_retries} 次"
 
@@ -146,18 +169,12 @@ def upload_audio_for_transcription():
     """上传音频文件并进行转录"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username', 'unknown')
+        username = record.get('username') or 'unknown'
 
         if 'file' not in request.files:
             return jsonify({'error': '没有上传文件'}), 400
@@ -207,9 +224,7 @@ def upload_audio_for_transcription():
         }
 
         # 保存到数据库
-        transcriptions = load_transcription_data()
-        transcriptions.append(transcription_record)
-        save_transcription_data(transcriptions)
+        transcriptions_collection().insert(transcription_record)
 
         # 异步进行转录
         def transcribe_async():
@@ -218,41 +233,35 @@ def upload_audio_for_transcription():
                 text, error = call_transcription_api(audio_path, language if language else None)
 
                 # 更新记录
-                transcriptions = load_transcription_data()
-                for i, trans in enumerate(transcriptions):
-                    if trans['id'] == transcription_id:
-                        if text:
-                            transcriptions[i]['status'] = 'completed'
-                            transcriptions[i]['text'] = text
-                            transcriptions[i]['updated_at'] = datetime.now().isoformat()
-
-                            # 保存文本文件
-                            text_path = os.path.join(folder_path, 'transcription.txt')
-                            with open(text_path, 'w', encoding='utf-8') as f:
-                                f.write(text)
-                        else:
-                            transcriptions[i]['status'] = 'error'
-                            transcriptions[i]['error'] = error
-                            transcriptions[i]['updated_at'] = datetime.now().isoformat()
-                        break
-
-                save_transcription_data(transcriptions)
+                if text:
+                    # 保存文本文件
+                    text_path = os.path.join(folder_path, 'transcription.txt')
+                    with open(text_path, 'w', encoding='utf-8') as f:
+                        f.write(text)
+                    update_transcription(transcription_id, {
+                        'status': 'completed',
+                        'text': text,
+                        'updated_at': datetime.now().isoformat()
+                    })
+                else:
+                    update_transcription(transcription_id, {
+                        'status': 'error',
+                        'error': error,
+                        'updated_at': datetime.now().isoformat()
+                    })
                 print(f"转录完成: {transcription_id}")
 
             except Exception as e:
                 print(f"转录异步处理失败: {e}")
                 # 更新状态为错误
-                transcriptions = load_transcription_data()
-                for i, trans in enumerate(transcriptions):
-                    if trans['id'] == transcription_id:
-                        transcriptions[i]['status'] = 'error'
-                        transcriptions[i]['error'] = str(e)
-                        transcriptions[i]['updated_at'] = datetime.now().isoformat()
-                        break
-                save_transcription_data(transcriptions)
+                update_transcription(transcription_id, {
+                    'status': 'error',
+                    'error': str(e),
+                    'updated_at': datetime.now().isoformat()
+                })
 
         # 启动异步转录
-        thread = threading.Thread(target=transcribe_async, daemon=True)
+        thread = threading.Thread(target=transcribe_async, name=f'transcribe-asr-{transcription_id}', daemon=True)
         thread.start()
 
         return jsonify({
@@ -269,27 +278,15 @@ def list_audio_transcriptions():
     """获取用户的转录列表"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username', 'unknown')
-
-        # 加载转录数据
-        transcriptions = load_transcription_data()
+        username = record.get('username') or 'unknown'
 
         # 筛选当前用户的转录记录
-        user_transcriptions = [
-            trans for trans in transcriptions
-            if trans.get('username') == username
-        ]
+        user_transcriptions = transcriptions_collection().find('username', username)
 
         # 按时间倒序排列
         user_transcriptions.sort(key=lambda x: x.get('created_at', ''), reverse=True)
@@ -307,20 +304,12 @@ def serve_transcription_audio(transcription_id, filename):
     """提供转录音频文件"""
     try:
         # 验证用户权限
-        token = request.headers.get('Authorization') or request.args.get('token')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-
-        if not token or not is_token_valid(token):
+        token = get_request_token() or request.args.get('token')
+        if not is_token_valid(token):
             return jsonify({'error': '未授权'}), 401
 
         # 查找转录记录
-        transcriptions = load_transcription_data()
-        transcription = None
-        for trans in transcriptions:
-            if trans['id'] == transcription_id:
-                transcription = trans
-                break
+        transcription = transcriptions_collection().get(transcription_id)
 
         if not transcription:
             return jsonify({'error': '转录记录不存在'}), 404
@@ -332,7 +321,7 @@ def serve_transcription_audio(transcription_id, filename):
         if not os.path.exists(file_path):
             return jsonify({'error': '文件不存在'}), 404
 
-        return send_file(file_path, as_attachment=True, download_name=filename)
+        return send_media(file_path, download_name=filename, as_attachment=True)
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -342,41 +331,25 @@ def retranscribe_audio(transcription_id):
     """重新转录音频"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username', 'unknown')
+        username = record.get('username') or 'unknown'
 
         # 查找转录记录
-        transcriptions = load_transcription_data()
-        transcription_index = -1
-        transcription = None
-
-        for i, trans in enumerate(transcriptions):
-            if trans['id'] == transcription_id and trans.get('username') == username:
-                transcription_index = i
-                transcription = trans
-                break
+        transcription = _find_user_transcription(transcription_id, username)
 
         if not transcription:
             return jsonify({'error': '转录记录不存在或无权限'}), 404
 
         # 更新状态为处理中
-        transcriptions[transcription_index]['status'] = 'processing'
-        transcriptions[transcription_index]['updated_at'] = datetime.now().isoformat()
-        transcriptions[transcription_index]['text'] = None
-        if 'error' in transcriptions[transcription_index]:
-            del transcriptions[transcription_index]['error']
-
-        save_transcription_data(transcriptions)
+        update_transcription(transcription_id, {
+            'status': 'processing',
+            'updated_at': datetime.now().isoformat(),
+            'text': None
+        }, remove_keys=('error',))
 
         # 获取音频文件路径
         folder_path = os.path.join(AUDIO_TRANSCRIPTION_DIR, transcription['folder_path'])
@@ -392,40 +365,34 @@ def retranscribe_audio(transcription_id):
                 text, error = call_transcription_api(audio_path, transcription.get('language'))
 
                 # 更新记录
-                transcriptions = load_transcription_data()
-                for i, trans in enumerate(transcriptions):
-                    if trans['id'] == transcription_id:
-                        if text:
-                            transcriptions[i]['status'] = 'completed'
-                            transcriptions[i]['text'] = text
-                            transcriptions[i]['updated_at'] = datetime.now().isoformat()
-
-                            # 更新文本文件
-                            text_path = os.path.join(folder_path, 'transcription.txt')
-                            with open(text_path, 'w', encoding='utf-8') as f:
-                                f.write(text)
-                        else:
-                            transcriptions[i]['status'] = 'error'
-                            transcriptions[i]['error'] = error
-                            transcriptions[i]['updated_at'] = datetime.now().isoformat()
-                        break
-
-                save_transcription_data(transcriptions)
+                if text:
+                    # 更新文本文件
+                    text_path = os.path.join(folder_path, 'transcription.txt')
+                    with open(text_path, 'w', encoding='utf-8') as f:
+                        f.write(text)
+                    update_transcription(transcription_id, {
+                        'status': 'completed',
+                        'text': text,
+                        'updated_at': datetime.now().isoformat()
+                    })
+                else:
+                    update_transcription(transcription_id, {
+                        'status': 'error',
+                        'error': error,
+                        'updated_at': datetime.now().isoformat()
+                    })
                 print(f"重新转录完成: {transcription_id}")
 
             except Exception as e:
                 print(f"重新转录失败: {e}")
-                transcriptions = load_transcription_data()
-                for i, trans in enumerate(transcriptions):
-                    if trans['id'] == transcription_id:
-                        transcriptions[i]['status'] = 'error'
-                        transcriptions[i]['error'] = str(e)
-                        transcriptions[i]['updated_at'] = datetime.now().isoformat()
-                        break
-                save_transcription_data(transcriptions)
+                update_transcription(transcription_id, {
+                    'status': 'error',
+                    'error': str(e),
+                    'updated_at': datetime.now().isoformat()
+                })
 
         # 启动异步重新转录
-        thread = threading.Thread(target=retranscribe_async, daemon=True)
+        thread = threading.Thread(target=retranscribe_async, name=f'transcribe-asr-{transcription_id}', daemon=True)
         thread.start()
 
         return jsonify({
@@ -441,29 +408,15 @@ def delete_audio_transcription(transcription_id):
     """删除转录记录"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username', 'unknown')
+        username = record.get('username') or 'unknown'
 
         # 查找转录记录
-        transcriptions = load_transcription_data()
-        transcription_index = -1
-        transcription = None
-
-        for i, trans in enumerate(transcriptions):
-            if trans['id'] == transcription_id and trans.get('username') == username:
-                transcription_index = i
-                transcription = trans
-                break
+        transcription = _find_user_transcription(transcription_id, username)
 
         if not transcription:
             return jsonify({'error': '转录记录不存在或无权限'}), 404
@@ -473,9 +426,8 @@ def delete_audio_transcription(transcription_id):
         if os.path.exists(folder_path):
             shutil.rmtree(folder_path)
 
-        # 从数据库中删除记录
-        transcriptions.pop(transcription_index)
-        save_transcription_data(transcriptions)
+        # 从数据库中删除记录（按 id 删除）
+        transcriptions_collection().delete(transcription_id)
 
         return jsonify({
             'success': True,
@@ -2,10 +2,11 @@ import os
 import json
 from flask import Blueprint, request, jsonify, send_file
 from core import (
-    load_tokens, is_token_valid, create_token,
-    load_users, authenticate_user,
-    verify_token_get_username, require_auth, USER_DATA_DIR
+    get_token_record, get_request_token, create_token,
+    get_user_profile, authenticate_user,
+    require_auth, USER_DATA_DIR
 )
+from utils.json_store import load_json, save_json_atomic
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -23,29 +24,17 @@ def load_user_completed_status(username):
     if not username:
         return {}
 
-    file_path = get_user_data_file(username)
-    if os.path.exists(file_path):
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return {}
-    return {}
+    return load_json(get_user_data_file(username), {})
 
 def save_user_completed_status(username, completed_items):
     """保存用户的完成状态"""
     if not username:
         return False
 
-    # 确保用户数据目录存在
-    os.makedirs(USER_DATA_DIR, exist_ok=True)
-
-    file_path = get_user_data_file(username)
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(completed_items, f, ensure_ascii=False, indent=2)
+        save_json_atomic(get_user_data_file(username), completed_items)
         return True
-    except:
+    except Exception:
         return False
 
 
@@ -66,22 +55,12 @@ def verify_token():
     data = request.json
     token = data.get('token')
 
-    if token and is_token_valid(token):
+    record = get_token_record(token)
+    if record is not None:
         # 尝试获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username')
-
-        if username:
-            users = load_users()
-            if username in users:
-                user_data = users[username]
-                user_info = {
-                    'username': user_data['username'],
-                    'display_name': user_data['display_name'],
-                    'role': user_data['role'],
-                    'avatar': user_data['avatar']
-                }
-                return jsonify({'valid': True, 'user': user_info})
+        user_info = get_user_profile(record.get('username'))
+        if user_info:
+            return jsonify({'valid': True, 'user': user_info})
 
         return jsonify({'valid': True})
     else:
@@ -101,16 +80,10 @@ def user_login():
     if user_data:
         token = create_token(username)
         # 返回用户信息（不包含密码）
-        user_info = {
-            'username': user_data['username'],
-            'display_name': user_data['display_name'],
-            'role': user_data['role'],
-            'avatar': user_data['avatar']
-        }
         return jsonify({
             'success': True,
             'token': token,
-            'user': user_info
+            'user': get_user_profile(username)
         })
     else:
         return jsonify({'success': False, 'error': '用户名或密码错误'})
@@ -118,29 +91,18 @@ def user_login():
 @auth_bp.route('/get_current_user', methods=['GET'])
 def get_current_user():
     """获取当前登录用户信息"""
-    token = request.headers.get('Authorization')
-    if token and token.startswith('Bearer '):
-        token = token[7:]
-
-    if not token or not is_token_valid(token):
+    record = get_token_record(get_request_token())
+    if record is None:
         return jsonify({'error': '未登录或token无效'}), 401
 
     # 从token获取用户名
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username')
+    username = record.get('username')
 
     if not username:
         return jsonify({'error': '无法获取用户信息'}), 401
 
-    users = load_users()
-    if username in users:
-        user_data = users[username]
-        user_info = {
-            'username': user_data['username'],
-            'display_name': user_data['display_name'],
-            'role': user_data['role'],
-            'avatar': user_data['avatar']
-        }
+    user_info = get_user_profile(username)
+    if user_info:
         return jsonify({'success': True, 'user': user_info})
 
     return jsonify({'error': '用户不存在'}), 404
@@ -183,18 +145,12 @@ def update_user_completed_status():
 def get_user_info():
     """获取用户信息"""
     username = request.username
-    users = load_users()
+    user_info = get_user_profile(username)
 
-    if username in users:
-        user_data = users[username]
+    if user_info:
         return jsonify({
             'success': True,
-            'user': {
-                'username': user_data.get('username'),
-                'display_name': user_data.get('display_name'),
-                'role': user_data.get('role'),
-                'avatar': user_data.get('avatar')
-            }
+            'user': user_info
         })
     else:
         return jsonify({'success': False, 'error': 'User not found'}), 404
@@ -17,12 +17,15 @@ from core import (
     MOTHER_DIR, COMBINED_DIR, INTENSIVE_DIR,
     MESSAGE_BOARD_DIR, MESSAGE_IMAGES_DIR,
     CHALLENGES_DIR, VOCABULARY_CHALLENGE_DIR,
-    is_token_valid, load_tokens, load_users,
+    get_request_token, get_token_record, get_user_profile, get_user_profiles,
+    DEFAULT_AVATAR,
     verify_token_get_username,
-    delete_article_vocab_audio, generate_challenge_vocab_audio,
-    get_vocab_audio_path, is_safe_path_segment
+    delete_article_vocab_audio, generate_challenge_vocab_audio_batch,
+    get_vocab_audio_path, is_safe_path_segment, open_collection
 )
 from routers.intensive_reading import _article_path
+from utils import audio_catalog
+from utils.json_store import load_json, save_json_atomic, update_json, json_transaction
 
 community_bp = Blueprint('community', __name__)
 
@@ -31,22 +34,13 @@ community_bp = Blueprint('community', __name__)
 def _message_board_file():
     return os.path.join(MESSAGE_BOARD_DIR, 'messages.json')
 
+def messages_collection():
+    """留言集合（json 或 sqlite 后端）"""
+    return open_collection('messages', _message_board_file())
+
 def load_messages():
     """加载留言数据"""
-    messages_file = _message_board_file()
-    if os.path.exists(messages_file):
-        try:
-            with open(messages_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_messages(messages):
-    """保存留言数据"""
-    messages_file = _message_board_file()
-    with open(messages_file, 'w', encoding='utf-8') as f:
-        json.dump(messages, f, ensure_ascii=False, indent=2)
+    return messages_collection().all()
 
 def generate_message_id():
     """生成消息ID"""
@@ -74,34 +68,24 @@ def post_message():
     """发送新留言"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
+        token = get_request_token()
+        if not token:
             token = request.json.get('token') if request.json else None
 
-        if not token or not is_token_valid(token):
+        record = get_token_record(token)
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 从token获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username')
+        username = record.get('username')
 
         if not username:
             return jsonify({'error': '无法获取用户信息'}), 401
 
-        users = load_users()
-        if username not in users:
+        user_info = get_user_profile(username)
+        if not user_info:
             return jsonify({'error': '用户不存在'}), 404
 
-        user_data = users[username]
-        user_info = {
-            'username': user_data['username'],
-            'display_name': user_data['display_name'],
-            'role': user_data['role'],
-            'avatar': user_data['avatar']
-        }
-
         data = request.json or {}
         message_type = data.get('type', 'text')
         content = data.get('content', {})
@@ -114,9 +98,7 @@ def post_message():
             'timestamp': datetime.now().isoformat()
         }
 
-        messages = load_messages()
-        messages.append(message)
-        save_messages(messages)
+        messages_collection().insert(message)
 
         return jsonify({'success': True, 'message': message})
 
@@ -128,32 +110,17 @@ def delete_message(message_id):
     """删除留言"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 从token获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username')
+        username = record.get('username')
 
         if not username:
             return jsonify({'error': '无法获取用户信息'}), 401
 
-        messages = load_messages()
-
-        # 找到要删除的消息
-        message_to_delete = None
-        message_index = -1
-        for i, msg in enumerate(messages):
-            if msg.get('id') == message_id:
-                message_to_delete = msg
-                message_index = i
-                break
+        message_to_delete = messages_collection().get(message_id)
 
         if not message_to_delete:
             return jsonify({'error': '消息不存在'}), 404
@@ -168,9 +135,8 @@ def delete_message(message_id):
             message_to_delete.get('content', {}).get('challenge')):
             challenge_id = message_to_delete['content']['challenge'].get('id')
 
-        # 删除消息
-        messages.pop(message_index)
-        save_messages(messages)
+        # 删除消息（按 id 删除，避免并发写入导致下标错位）
+        messages_collection().delete(message_id)
 
         # 删除关联的挑战记录
         if challenge_id:
@@ -360,22 +326,13 @@ def _comments_file():
     """获取评论文件路径"""
     return os.path.join(MESSAGE_BOARD_DIR, 'comments.json')
 
+def comments_collection():
+    """评论集合（json 或 sqlite 后端）"""
+    return open_collection('comments', _comments_file())
+
 def load_comments():
     """加载评论数据"""
-    comments_file = _comments_file()
-    if os.path.exists(comments_file):
-        try:
-            with open(comments_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
-
-def save_comments(comments):
-    """保存评论数据"""
-    comments_file = _comments_file()
-    with open(comments_file, 'w', encoding='utf-8') as f:
-        json.dump(comments, f, ensure_ascii=False, indent=2)
+    return comments_collection().all()
 
 def generate_comment_id():
     """生成评论ID"""
@@ -385,9 +342,8 @@ def generate_comment_id():
 def get_comments(post_id):
     """获取指定帖子的评论"""
     try:
-        comments = load_comments()
         # 筛选出指定帖子的评论，按时间正序排列
-        post_comments = [c for c in comments if c.get('post_id') == post_id]
+        post_comments = comments_collection().find('post_id', post_id)
         post_comments.sort(key=lambda x: x.get('timestamp', ''))
         return jsonify({'success': True, 'comments': post_comments})
     except Exception as e:
@@ -398,34 +354,20 @@ def post_comment():
     """发表评论"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 从token获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username')
+        username = record.get('username')
 
         if not username:
             return jsonify({'error': '无法获取用户信息'}), 401
 
-        users = load_users()
-        if username not in users:
+        user_info = get_user_profile(username)
+        if not user_info:
             return jsonify({'error': '用户不存在'}), 404
 
-        user_data = users[username]
-        user_info = {
-            'username': user_data['username'],
-            'display_name': user_data['display_name'],
-            'role': user_data['role'],
-            'avatar': user_data['avatar']
-        }
-
         data = request.json or {}
         post_id = data.get('post_id')
         comment_type = data.get('type', 'text')
@@ -435,9 +377,7 @@ def post_comment():
             return jsonify({'error': '缺少帖子ID'}), 400
 
         # 验证帖子是否存在
-        messages = load_messages()
-        post_exists = any(msg.get('id') == post_id for msg in messages)
-        if not post_exists:
+        if messages_collection().get(post_id) is None:
             return jsonify({'error': '帖子不存在'}), 404
 
         comment = {
@@ -449,9 +389,7 @@ def post_comment():
             'timestamp': datetime.now().isoformat()
         }
 
-        comments = load_comments()
-        comments.append(comment)
-        save_comments(comments)
+        comments_collection().insert(comment)
 
         return jsonify({'success': True, 'comment': comment})
 
@@ -463,32 +401,17 @@ def delete_comment(comment_id):
     """删除评论"""
     try:
         # 验证用户登录状态
-        token = request.headers.get('Authorization')
-        if token and token.startswith('Bearer '):
-            token = token[7:]
-        else:
-            return jsonify({'error': '未登录或token无效'}), 401
-
-        if not token or not is_token_valid(token):
+        record = get_token_record(get_request_token())
+        if record is None:
             return jsonify({'error': '未登录或token无效'}), 401
 
         # 从token获取用户信息
-        tokens = load_tokens()
-        username = tokens.get(token, {}).get('username')
+        username = record.get('username')
 
         if not username:
             return jsonify({'error': '无法获取用户信息'}), 401
 
-        comments = load_comments()
-
-        # 找到要删除的评论
-        comment_to_delete = None
-        comment_index = -1
-        for i, comment in enumerate(comments):
-            if comment.get('id') == comment_id:
-                comment_to_delete = comment
-                comment_index = i
-                break
+        comment_to_delete = comments_collection().get(comment_id)
 
         if not comment_to_delete:
             return jsonify({'error': '评论不存在'}), 404
@@ -503,9 +426,8 @@ def delete_comment(comment_id):
             comment_to_delete.get('content', {}).get('challenge')):
             challenge_id = comment_to_delete['content']['challenge'].get('id')
 
-        # 删除评论
-        comments.pop(comment_index)
-        save_comments(comments)
+        # 删除评论（按 id 删除）
+        comments_collection().delete(comment_id)
 
         # 删除关联的挑战记录
         if challenge_id:
@@ -533,43 +455,29 @@ def get_audio_list_for_share():
             '其他': []
         }
 
-        if not os.path.exists(MOTHER_DIR):
-            return jsonify({'success': True, 'categories': categories})
+        # 文件夹、音频数量和合集状态来自内存目录索引
+        for entry in audio_catalog.folders(MOTHER_DIR, COMBINED_DIR):
+            if entry['files']:
+                folder = entry['folder']
+                folder_info = {
+                    'folder': folder,
+                    'file_count': len(entry['files']),
+                    'has_combined': entry['has_combined']
+                }
 
-        for folder in os.listdir(MOTHER_DIR):
-            folder_path = os.path.join(MOTHER_DIR, folder)
-            if os.path.isdir(folder_path) and not folder.startswith('.'):
-                files = [f for f in os.listdir(folder_path) if f.endswith('.mp3')]
-                if files:
-                    # 检查是否有合集
-                    combined_file = os.path.join(COMBINED_DIR, f"{folder}.mp3")
-                    has_combined = os.path.exists(combined_file)
-
-                    folder_info = {
-                        'folder': folder,
-                        'file_count': len(files),
-                        'has_combined': has_combined
-                    }
+                # 对于Part2，添加问题信息
+                if folder.startswith('P2') and entry['question'] is not None:
+                    folder_info['question'] = entry['question']
 
-                    # 对于Part2，添加问题信息
-                    if folder.startswith('P2'):
-                        question_file = os.path.join(folder_path, 'question.txt')
-                        if os.path.exists(question_file):
-                            try:
-                                with open(question_file, 'r', encoding='utf-8') as f:
-                                    folder_info['question'] = f.read().strip()
-                            except:
-                                pass
-
-                    # 分类
-                    if folder.startswith('P1'):
-                        categories['Part1'].append(folder_info)
-                    elif folder.startswith('P2'):
-                        categories['Part2'].append(folder_info)
-                    elif folder.startswith('P3'):
-                        categories['Part3'].append(folder_info)
-                    else:
-                        categories['其他'].append(folder_info)
+                # 分类
+                if folder.startswith('P1'):
+                    categories['Part1'].append(folder_info)
+                elif folder.startswith('P2'):
+                    categories['Part2'].append(folder_info)
+                elif folder.startswith('P3'):
+                    categories['Part3'].append(folder_info)
+                else:
+                    categories['其他'].append(folder_info)
 
         return jsonify({'success': True, 'categories': categories})
 
@@ -588,21 +496,18 @@ def get_articles_list_for_share():
         for fname in os.listdir(INTENSIVE_DIR):
             if not fname.endswith('.json'):
                 continue
-            fpath = os.path.join(INTENSIVE_DIR, fname)
-            try:
-                with open(fpath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                article_info = {
-                    'id': data.get('id'),
-                    'title': data.get('title'),
-                    'category': data.get('category', 'Reading'),
-                    'highlight_count': len(data.get('highlights') or [])
-                }
-                category = article_info['category']
-                if category in categories:
-                    categories[category].append(article_info)
-            except:
+            data = load_json(os.path.join(INTENSIVE_DIR, fname), None, cached=True)
+            if not isinstance(data, dict):
                 continue
+            article_info = {
+                'id': data.get('id'),
+                'title': data.get('title'),
+                'category': data.get('category', 'Reading'),
+                'highlight_count': len(data.get('highlights') or [])
+            }
+            category = article_info['category']
+            if category in categories:
+                categories[category].append(article_info)
 
         return jsonify({'success': True, 'categories': categories})
 
@@ -613,13 +518,12 @@ def get_articles_list_for_share():
 def get_users_list():
     """获取用户列表供@功能使用"""
     try:
-        users = load_users()
         user_list = []
-        for username, user_data in users.items():
+        for username, profile in get_user_profiles().items():
             user_list.append({
                 'username': username,
-                'display_name': user_data.get('display_name', username),
-                'avatar': user_data.get('avatar', 'avatar_admin.svg')
+                'display_name': profile['display_name'],
+                'avatar': profile['avatar']
             })
         return jsonify({'success': True, 'users': user_list})
     except Exception as e:
@@ -829,11 +733,10 @@ def create_challenge():
     """创建词汇挑战"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -873,18 +776,14 @@ def create_challenge():
         }
 
         # 保存挑战数据
-        with open(_challenge_file(challenge_id), 'w', encoding='utf-8') as f:
-            json.dump(challenge_data, f, ensure_ascii=False, indent=2)
+        save_json_atomic(_challenge_file(challenge_id), challenge_data)
 
         # 异步生成所有词汇的音频
         def _generate_challenge_audio():
             try:
-                for vocab in vocabulary:
-                    word = vocab.get('word', '').strip()
-                    if word:
-                        generate_challenge_vocab_audio(challenge_id, word)
-                        time.sleep(0.5)  # 避免API频率限制
-                print(f"挑战 {challenge_id} 的音频生成完成")
+                words = [vocab.get('word', '') for vocab in vocabulary]
+                generated, failed = generate_challenge_vocab_audio_batch(challenge_id, words)
+                print(f"挑战 {challenge_id} 的音频生成完成: 成功 {generated}, 失败 {len(failed)}")
             except Exception as e:
                 print(f"挑战 {challenge_id} 音频生成失败: {e}")
 
@@ -904,13 +803,10 @@ def create_challenge():
 def get_challenge(challenge_id):
     """获取挑战详情"""
     try:
-        challenge_path = _challenge_file(challenge_id)
-        if not os.path.exists(challenge_path):
+        challenge_data = load_json(_challenge_file(challenge_id), None, cached=True)
+        if challenge_data is None:
             return jsonify({'error': '挑战不存在'}), 404
 
-        with open(challenge_path, 'r', encoding='utf-8') as f:
-            challenge_data = json.load(f)
-
         return jsonify({'success': True, 'challenge': challenge_data})
 
     except Exception as e:
@@ -921,11 +817,10 @@ def participate_challenge():
     """参与挑战（提交答案）"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -938,49 +833,44 @@ def participate_challenge():
         if not os.path.exists(challenge_path):
             return jsonify({'error': '挑战不存在'}), 404
 
-        # 加载挑战数据
-        with open(challenge_path, 'r', encoding='utf-8') as f:
-            challenge_data = json.load(f)
-
-        # 计算分数
-        total_questions = len(challenge_data['vocabulary'])
-        correct_count = sum(1 for answer in answers if answer.get('is_correct', False))
-
-        # 时间奖励计算：每个问题最多10秒，用时越少奖励越多
-        time_bonus = 0
-        for answer in answers:
-            time_taken = answer.get('time_taken', 10)  # 默认10秒
-            if answer.get('is_correct', False):
-                # 正确答案才有时间奖励，1-10秒对应10-1分的时间奖励
-                time_bonus += max(1, 11 - min(10, time_taken))
-
-        # 总分 = (正确数/总数 * 70) + (时间奖励 * 30 / (总数 * 10))
-        accuracy_score = (correct_count / total_questions) * 70
-        time_score = (time_bonus * 30) / (total_questions * 10)
-        total_score = round(accuracy_score + time_score, 2)
-
-        # 更新参与者数据
-        challenge_data['participants'][username] = {
-            'score': total_score,
-            'correct_count': correct_count,
-            'total_questions': total_questions,
-            'completed_at': datetime.now().isoformat(),
-            'answers': answers,
-            'time_bonus': time_bonus
-        }
-
-        # 检查是否所有被@的用户都已完成
-        if challenge_data.get('mentioned_users'):
-            all_completed = all(
-                user in challenge_data['participants']
-                for user in challenge_data['mentioned_users']
-            )
-            if all_completed:
-                challenge_data['status'] = 'completed'
+        # 在文件锁内读取并更新挑战数据，避免多人同时提交时互相覆盖
+        with json_transaction(challenge_path, None) as txn:
+            challenge_data = txn.data
+            # 计算分数
+            total_questions = len(challenge_data['vocabulary'])
+            correct_count = sum(1 for answer in answers if answer.get('is_correct', False))
+
+            # 时间奖励计算：每个问题最多10秒，用时越少奖励越多
+            time_bonus = 0
+            for answer in answers:
+                time_taken = answer.get('time_taken', 10)  # 默认10秒
+                if answer.get('is_correct', False):
+                    # 正确答案才有时间奖励，1-10秒对应10-1分的时间奖励
+                    time_bonus += max(1, 11 - min(10, time_taken))
+
+            # 总分 = (正确数/总数 * 70) + (时间奖励 * 30 / (总数 * 10))
+            accuracy_score = (correct_count / total_questions) * 70
+            time_score = (time_bonus * 30) / (total_questions * 10)
+            total_score = round(accuracy_score + time_score, 2)
+
+            # 更新参与者数据
+            challenge_data['participants'][username] = {
+                'score': total_score,
+                'correct_count': correct_count,
+                'total_questions': total_questions,
+                'completed_at': datetime.now().isoformat(),
+                'answers': answers,
+                'time_bonus': time_bonus
+            }
 
-        # 保存更新后的挑战数据
-        with open(challenge_path, 'w', encoding='utf-8') as f:
-            json.dump(challenge_data, f, ensure_ascii=False, indent=2)
+            # 检查是否所有被@的用户都已完成
+            if challenge_data.get('mentioned_users'):
+                all_completed = all(
+                    user in challenge_data['participants']
+                    for user in challenge_data['mentioned_users']
+                )
+                if all_completed:
+                    challenge_data['status'] = 'completed'
 
         return jsonify({
             'success': True,
@@ -1005,16 +895,16 @@ def get_challenge_ranking(challenge_id):
             challenge_data = json.load(f)
 
         # 获取用户信息
-        users = load_users()
+        profiles = get_user_profiles()
 
         # 构建排名数据
         ranking = []
         for username, result in challenge_data['participants'].items():
-            user_info = users.get(username, {})
+            user_info = profiles.get(username)
             ranking.append({
                 'username': username,
-                'display_name': user_info.get('display_name', username),
-                'avatar': user_info.get('avatar', 'avatar_admin.svg'),
+                'display_name': user_info['display_name'] if user_info else username,
+                'avatar': user_info['avatar'] if user_info else DEFAULT_AVATAR,
                 'score': result['score'],
                 'correct_count': result['correct_count'],
                 'total_questions': result['total_questions'],
@@ -1043,11 +933,10 @@ def create_vocab_summary_challenge():
     """为词汇汇总创建个人挑战"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -1083,12 +972,9 @@ def create_vocab_summary_challenge():
         # 异步生成所有词汇的音频
         def _generate_vocab_summary_audio():
             try:
-                for vocab in vocabulary:
-                    word = vocab.get('word', '').strip()
-                    if word:
-                        generate_challenge_vocab_audio(challenge_id, word)
-                        time.sleep(0.5)  # 避免API频率限制
-                print(f"词汇汇总挑战 {challenge_id} 的音频生成完成")
+                words = [vocab.get('word', '') for vocab in vocabulary]
+                generated, failed = generate_challenge_vocab_audio_batch(challenge_id, words)
+                print(f"词汇汇总挑战 {challenge_id} 的音频生成完成: 成功 {generated}, 失败 {len(failed)}")
             except Exception as e:
                 print(f"词汇汇总挑战 {challenge_id} 音频生成失败: {e}")
 
@@ -1108,11 +994,10 @@ def save_vocab_challenge_record():
     """保存词汇挑战记录"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -1133,25 +1018,12 @@ def save_vocab_challenge_record():
         # 创建目录（如果不存在）
         os.makedirs(CHALLENGES_DIR, exist_ok=True)
 
-        # 读取现有记录
-        existing_records = []
-        if os.path.exists(user_challenge_file):
-            try:
-                with open(user_challenge_file, 'r', encoding='utf-8') as f:
-                    existing_records = json.load(f)
-            except:
-                existing_records = []
-
-        # 添加新记录到开头
-        existing_records.insert(0, challenge_record)
-
-        # 只保留最近100条记录
-        if len(existing_records) > 100:
-            existing_records = existing_records[:100]
-
-        # 保存记录
-        with open(user_challenge_file, 'w', encoding='utf-8') as f:
-            json.dump(existing_records, f, ensure_ascii=False, indent=2)
+        # 添加新记录到开头，只保留最近100条记录
+        existing_records = update_json(
+            user_challenge_file,
+            lambda records: ([challenge_record] + records)[:100],
+            []
+        )
 
         return jsonify({'success': True, 'record_count': len(existing_records)})
 
@@ -1163,11 +1035,10 @@ def get_vocab_challenge_records():
     """获取用户的词汇挑战记录"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -1193,11 +1064,10 @@ def save_vocab_wrong_words():
     """保存错词记录"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -1212,8 +1082,7 @@ def save_vocab_wrong_words():
         os.makedirs(CHALLENGES_DIR, exist_ok=True)
 
         # 保存错词记录
-        with open(user_wrong_words_file, 'w', encoding='utf-8') as f:
-            json.dump(wrong_words, f, ensure_ascii=False, indent=2)
+        save_json_atomic(user_wrong_words_file, wrong_words)
 
         return jsonify({'success': True, 'word_count': len(wrong_words)})
 
@@ -1225,11 +1094,10 @@ def get_vocab_wrong_words():
     """获取用户的错词记录"""
     try:
         # 验证token
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
@@ -1255,11 +1123,10 @@ def cleanup_orphaned_challenges():
     """清理孤立的挑战记录（没有对应帖子的挑战）"""
     try:
         # 验证管理员权限
-        auth_header = request.headers.get('Authorization', '')
-        if not auth_header.startswith('Bearer '):
+        token = get_request_token()
+        if not token:
             return jsonify({'error': '未授权'}), 401
 
-        token = auth_header.split(' ')[1]
         username = verify_token_get_username(token)
         if not username:
             return jsonify({'error': '无效token'}), 401
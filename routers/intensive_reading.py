@@ -2,15 +2,21 @@ from flask import Blueprint, request, jsonify, send_file, send_from_directory
 import os, json, re, uuid, shutil, time, requests
 from datetime import datetime
 from werkzeug.utils import secure_filename
-from pydub import AudioSegment
 from urllib.parse import unquote
 
+from utils.governor import CircuitOpenError, backoff_delay
+from utils.json_store import file_lock, load_json, save_json_atomic
+from utils.media import send_media
+from utils import jobs
+from routers.jobs import job_accepted
 from core import (
     INTENSIVE_DIR, INTENSIVE_IMAGES_DIR, VOCAB_AUDIO_DIR,
     generate_tts, generate_token, get_vocab_audio_path,
     generate_and_save_vocab_audio, delete_vocab_audio,
     delete_article_vocab_audio, delete_article_audio_files,
-    generate_vocab_audio_async, is_safe_path_segment
+    generate_vocab_audio_async, is_safe_path_segment,
+    get_cached_tts, link_tts_alias, link_cached_vocab_audio, TTSError,
+    concat_audio_files
 )
 
 intensive_reading_bp = Blueprint('intensive_reading', __name__)
@@ -162,17 +168,6 @@ def split_long_segment(segment, max_chars):
 
 def generate_tts_segment(text, temp_dir, segment_index, max_retries=3):
     """生成单个文本段的TTS音频，带重试机制"""
-    url = "https://api.deerapi.com/v1/audio/speech"
-    payload = json.dumps({
-        "model": "tts-1",
-        "input": text,
-        "voice": "nova"
-    })
-    headers = {
-        'Authorization': f"Bearer {os.getenv('DEER_API_KEY')}",
-        'Content-Type': 'application/json'
-    }
-
     segment_path = os.path.join(temp_dir, f"segment_{segment_index:03d}.mp3")
 
     # 检查是否已存在该分片文件
@@ -185,53 +180,28 @@ def generate_tts_segment(text, temp_dir, segment_index, max_retries=3):
         try:
             print(f"正在生成分片 {segment_index}，尝试 {attempt + 1}/{max_retries}")
 
-            # 使用更长的超时时间，并设置连接和读取超时
-            response = requests.post(
-                url,
-                headers=headers,
-                data=payload,
-                timeout=(10, 60)  # (连接超时, 读取超时)
-            )
-
-            if response.status_code == 200:
-                # 先写入临时文件，然后重命名，避免写入过程中的问题
-                temp_path = segment_path + '.tmp'
-                with open(temp_path, 'wb') as f:
-                    f.write(response.content)
-
-                # 验证文件完整性
-                if os.path.getsize(temp_path) > 0:
-                    os.rename(temp_path, segment_path)
-                    print(f"分片 {segment_index} 生成成功")
-                    return segment_path
-                else:
-                    os.remove(temp_path) if os.path.exists(temp_path) else None
-                    raise Exception("生成的音频文件为空")
-            else:
-                raise Exception(f'TTS API错误: {response.status_code}, 响应: {response.text}')
+            # 相同文本命中内容寻址缓存；未命中时带连接/读取超时请求 TTS，原子写入后挂到分片路径
+            link_tts_alias(get_cached_tts(text, timeout=(10, 60)), segment_path)
+            print(f"分片 {segment_index} 生成成功")
+            return segment_path
 
+        except CircuitOpenError as e:
+            # 服务端持续故障时快速失败，不再重试
+            raise Exception(f'分片 {segment_index} 生成失败: {e}')
         except requests.exceptions.Timeout as e:
             last_error = f"请求超时: {str(e)}"
             print(f"分片 {segment_index} 第 {attempt + 1} 次尝试超时: {last_error}")
-            if attempt < max_retries - 1:
-                # 指数退避：等待 2^attempt 秒
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
         except requests.exceptions.RequestException as e:
             last_error = f"网络请求错误: {str(e)}"
             print(f"分片 {segment_index} 第 {attempt + 1} 次尝试网络错误: {last_error}")
-            if attempt < max_retries - 1:
-                wait_time = 2 ** attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
         except Exception as e:
             last_error = str(e)
             print(f"分片 {segment_index} 第 {attempt + 1} 次尝试出错: {last_error}")
-            if attempt < max_retries - 1:
-                wait_time = 1 + attempt
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
+
+        if attempt < max_retries - 1:
+            wait_time = backoff_delay(attempt)
+            print(f"等待 {wait_time:.1f} 秒后重试...")
+            time.sleep(wait_time)
 
     # 所有重试都失败了
     raise Exception(f'分片 {segment_index} 生成失败，已重试 {max_retries} 次。最后错误: {last_error}')
@@ -260,19 +230,16 @@ def intensive_list():
         for fname in os.listdir(INTENSIVE_DIR):
             if not fname.endswith('.json'):
                 continue
-            fpath = os.path.join(INTENSIVE_DIR, fname)
-            try:
-                with open(fpath, 'r', encoding='utf-8') as f:
-                    data = json.load(f)
-                items.append({
-                    'id': data.get('id'),
-                    'title': data.get('title'),
-                    'category': data.get('category'),
-                    'created_at': data.get('created_at'),
-                    'highlight_count': len(data.get('highlights') or [])
-                })
-            except Exception:
+            data = load_json(os.path.join(INTENSIVE_DIR, fname), None, cached=True)
+            if not isinstance(data, dict):
                 continue
+            items.append({
+                'id': data.get('id'),
+                'title': data.get('title'),
+                'category': data.get('category'),
+                'created_at': data.get('created_at'),
+                'highlight_count': len(data.get('highlights') or [])
+            })
     except Exception:
         pass
     # 时间倒序
@@ -344,49 +311,48 @@ def intensive_add_highlight():
     if not os.path.exists(path):
         return jsonify({'error': '文章不存在'}), 404
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            obj = json.load(f)
-        # 简单校验范围
-        text_len = len(obj.get('content_text') or '')
-        if not (0 <= int(start) < int(end) <= text_len):
-            return jsonify({'error': '选择范围无效'}), 400
-        highlights = obj.setdefault('highlights', [])
-        # 去重：如果同一范围已存在高亮，则更新释义并返回，不新增
-        for existing in highlights:
-            same_range = int(existing.get('start', -1)) == int(start) and int(existing.get('end', -1)) == int(end)
-            same_text = sel_text and sel_text == (existing.get('text') or '')
-            if same_range or same_text:
-                existing['meaning'] = meaning
-                existing['created_at'] = datetime.now().isoformat()
-                if sel_text:
-                    existing['text'] = sel_text
-                with open(path, 'w', encoding='utf-8') as f:
-                    json.dump(obj, f, ensure_ascii=False, indent=2)
-
-                # 异步生成词汇音频
-                if sel_text:
-                    generate_vocab_audio_async(article_id, sel_text)
-
-                return jsonify({'success': True, 'highlight': existing, 'updated': True})
-
-        hl_id = generate_token()
-        hl = {
-            'id': hl_id,
-            'start': int(start),
-            'end': int(end),
-            'meaning': meaning,
-            'created_at': datetime.now().isoformat(),
-            'text': sel_text
-        }
-        highlights.append(hl)
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
+        with file_lock(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                obj = json.load(f)
+            # 简单校验范围
+            text_len = len(obj.get('content_text') or '')
+            if not (0 <= int(start) < int(end) <= text_len):
+                return jsonify({'error': '选择范围无效'}), 400
+            highlights = obj.setdefault('highlights', [])
+            # 去重：如果同一范围已存在高亮，则更新释义并返回，不新增
+            for existing in highlights:
+                same_range = int(existing.get('start', -1)) == int(start) and int(existing.get('end', -1)) == int(end)
+                same_text = sel_text and sel_text == (existing.get('text') or '')
+                if same_range or same_text:
+                    existing['meaning'] = meaning
+                    existing['created_at'] = datetime.now().isoformat()
+                    if sel_text:
+                        existing['text'] = sel_text
+                    save_json_atomic(path, obj)
+
+                    # 异步生成词汇音频
+                    if sel_text:
+                        generate_vocab_audio_async(article_id, sel_text)
+
+                    return jsonify({'success': True, 'highlight': existing, 'updated': True})
+
+            hl_id = generate_token()
+            hl = {
+                'id': hl_id,
+                'start': int(start),
+                'end': int(end),
+                'meaning': meaning,
+                'created_at': datetime.now().isoformat(),
+                'text': sel_text
+            }
+            highlights.append(hl)
+            save_json_atomic(path, obj)
 
-        # 异步生成词汇音频
-        if sel_text:
-            generate_vocab_audio_async(article_id, sel_text)
+            # 异步生成词汇音频
+            if sel_text:
+                generate_vocab_audio_async(article_id, sel_text)
 
-        return jsonify({'success': True, 'highlight': hl})
+            return jsonify({'success': True, 'highlight': hl})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -401,28 +367,28 @@ def intensive_delete_highlight():
     if not os.path.exists(path):
         return jsonify({'error': '文章不存在'}), 404
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            obj = json.load(f)
+        with file_lock(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                obj = json.load(f)
 
-        # 找到要删除的高亮，以便删除其音频
-        highlight_to_delete = None
-        for h in (obj.get('highlights') or []):
-            if h.get('id') == highlight_id:
-                highlight_to_delete = h
-                break
+            # 找到要删除的高亮，以便删除其音频
+            highlight_to_delete = None
+            for h in (obj.get('highlights') or []):
+                if h.get('id') == highlight_id:
+                    highlight_to_delete = h
+                    break
 
-        before = len(obj.get('highlights') or [])
-        obj['highlights'] = [h for h in (obj.get('highlights') or []) if h.get('id') != highlight_id]
-        after = len(obj['highlights'])
+            before = len(obj.get('highlights') or [])
+            obj['highlights'] = [h for h in (obj.get('highlights') or []) if h.get('id') != highlight_id]
+            after = len(obj['highlights'])
 
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
+            save_json_atomic(path, obj)
 
-        # 删除对应的音频文件
-        if highlight_to_delete and highlight_to_delete.get('text'):
-            delete_vocab_audio(article_id, highlight_to_delete['text'])
+            # 删除对应的音频文件
+            if highlight_to_delete and highlight_to_delete.get('text'):
+                delete_vocab_audio(article_id, highlight_to_delete['text'])
 
-        return jsonify({'success': True, 'removed': before - after})
+            return jsonify({'success': True, 'removed': before - after})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -437,12 +403,12 @@ def intensive_update_category():
     if not os.path.exists(path):
         return jsonify({'error': '文章不存在'}), 404
     try:
-        with open(path, 'r', encoding='utf-8') as f:
-            obj = json.load(f)
-        obj['category'] = category
-        with open(path, 'w', encoding='utf-8') as f:
-            json.dump(obj, f, ensure_ascii=False, indent=2)
-        return jsonify({'success': True})
+        with file_lock(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                obj = json.load(f)
+            obj['category'] = category
+            save_json_atomic(path, obj)
+            return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
@@ -508,32 +474,32 @@ def intensive_upload_image():
             filepath = os.path.join(article_image_dir, filename)
             file.save(filepath)
 
-            with open(article_path, 'r', encoding='utf-8') as f:
-                article_data = json.load(f)
+            with file_lock(article_path):
+                with open(article_path, 'r', encoding='utf-8') as f:
+                    article_data = json.load(f)
 
-            # 添加图片信息到文章数据
-            image_info = {
-                'id': str(uuid.uuid4()),
-                'filename': filename,
-                'original_name': secure_filename(file.filename),
-                'created_at': datetime.now().isoformat()
-            }
+                # 添加图片信息到文章数据
+                image_info = {
+                    'id': str(uuid.uuid4()),
+                    'filename': filename,
+                    'original_name': secure_filename(file.filename),
+                    'created_at': datetime.now().isoformat()
+                }
 
-            if 'images' not in article_data:
-                article_data['images'] = []
-            article_data['images'].append(image_info)
+                if 'images' not in article_data:
+                    article_data['images'] = []
+                article_data['images'].append(image_info)
 
-            # 保存更新后的文章数据
-            with open(article_path, 'w', encoding='utf-8') as f:
-                json.dump(article_data, f, ensure_ascii=False, indent=2)
+                # 保存更新后的文章数据
+                save_json_atomic(article_path, article_data)
 
-            # 返回图片URL供前端使用
-            image_url = f'/intensive_image/{article_id}/{filename}'
-            return jsonify({
-                'success': True,
-                'image': image_info,
-                'image_url': image_url
-            })
+                # 返回图片URL供前端使用
+                image_url = f'/intensive_image/{article_id}/{filename}'
+                return jsonify({
+                    'success': True,
+                    'image': image_info,
+                    'image_url': image_url
+                })
 
         else:
             return jsonify({'error': '不支持的文件类型'}), 400
@@ -564,31 +530,31 @@ def intensive_delete_image():
             return jsonify({'error': '文章不存在'}), 404
 
         # 读取文章数据
-        with open(article_path, 'r', encoding='utf-8') as f:
-            article_data = json.load(f)
+        with file_lock(article_path):
+            with open(article_path, 'r', encoding='utf-8') as f:
+                article_data = json.load(f)
 
-        # 查找要删除的图片
-        images = article_data.get('images', [])
-        image_to_delete = None
-        for i, img in enumerate(images):
-            if img.get('id') == image_id:
-                image_to_delete = img
-                images.pop(i)
-                break
+            # 查找要删除的图片
+            images = article_data.get('images', [])
+            image_to_delete = None
+            for i, img in enumerate(images):
+                if img.get('id') == image_id:
+                    image_to_delete = img
+                    images.pop(i)
+                    break
 
-        if not image_to_delete:
-            return jsonify({'error': '图片不存在'}), 404
+            if not image_to_delete:
+                return jsonify({'error': '图片不存在'}), 404
 
-        # 删除文件
-        image_file_path = os.path.join(INTENSIVE_IMAGES_DIR, article_id, image_to_delete['filename'])
-        if os.path.exists(image_file_path):
-            os.remove(image_file_path)
+            # 删除文件
+            image_file_path = os.path.join(INTENSIVE_IMAGES_DIR, article_id, image_to_delete['filename'])
+            if os.path.exists(image_file_path):
+                os.remove(image_file_path)
 
-        # 保存更新后的文章数据
-        with open(article_path, 'w', encoding='utf-8') as f:
-            json.dump(article_data, f, ensure_ascii=False, indent=2)
+            # 保存更新后的文章数据
+            save_json_atomic(article_path, article_data)
 
-        return jsonify({'success': True})
+            return jsonify({'success': True})
 
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -626,8 +592,7 @@ def intensive_update_title():
         # 如果ID没有变化，只需要更新标题
         if new_article_id == old_article_id:
             article_data['title'] = new_title
-            with open(old_article_path, 'w', encoding='utf-8') as f:
-                json.dump(article_data, f, ensure_ascii=False, indent=2)
+            save_json_atomic(old_article_path, article_data)
             return jsonify({'success': True, 'new_article_id': old_article_id, 'renamed_files': False})
 
         # 更新文章数据中的标题和ID
@@ -635,8 +600,7 @@ def intensive_update_title():
         article_data['id'] = new_article_id
 
         # 创建新的文章文件
-        with open(new_article_path, 'w', encoding='utf-8') as f:
-            json.dump(article_data, f, ensure_ascii=False, indent=2)
+        save_json_atomic(new_article_path, article_data)
 
         renamed_files = []
         renamed_dirs = []
@@ -694,13 +658,9 @@ def get_vocab_audio(article_id, word):
     # 获取音频文件路径
     audio_path = get_vocab_audio_path(article_id, word)
 
-    if os.path.exists(audio_path):
-        return send_file(
-            audio_path,
-            mimetype='audio/mpeg',
-            as_attachment=False,
-            download_name=f"{word}.mp3"
-        )
+    # 文件名是单词的哈希而非音频内容的哈希，更换 TTS 音色后内容会变：每次用 ETag 重新验证
+    if os.path.exists(audio_path) or link_cached_vocab_audio(article_id, word):
+        return send_media(audio_path, download_name=f"{word}.mp3")
     else:
         return jsonify({'error': '音频文件不存在'}), 404
 
@@ -712,19 +672,15 @@ def get_article_audio(article_id, filename):
     # 构建音频文件路径
     audio_path = os.path.join(VOCAB_AUDIO_DIR, 'articles', article_id, filename)
 
+    # 文章音频每次生成都用新的文件名（时间戳 + 随机后缀，同一秒内生成也不重名），可长期缓存
     if os.path.exists(audio_path):
-        return send_file(
-            audio_path,
-            mimetype='audio/mpeg',
-            as_attachment=False,
-            download_name=filename
-        )
+        return send_media(audio_path, immutable=True, download_name=filename)
     else:
         return jsonify({'error': '音频文件不存在'}), 404
 
 @intensive_reading_bp.route('/generate_article_audio', methods=['POST'])
 def generate_article_audio():
-    """为精听文章生成英文音频（支持长文本分段生成和合并）"""
+    """为精听文章生成英文音频（支持长文本分段生成和合并），在后台任务中进行，返回 202 和任务 id"""
     data = request.json or {}
     article_id = data.get('article_id')
     text = data.get('text', '').strip()
@@ -737,99 +693,78 @@ def generate_article_audio():
     if not os.path.exists(article_path):
         return jsonify({'error': '文章不存在'}), 404
 
-    try:
-        # 创建文章音频目录
-        article_audio_dir = os.path.join(VOCAB_AUDIO_DIR, 'articles', article_id)
-        os.makedirs(article_audio_dir, exist_ok=True)
-
-        # 生成最终音频文件名
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"article_{timestamp}.mp3"
-        final_audio_path = os.path.join(article_audio_dir, filename)
+    def run(job_id):
+        try:
+            return build_article_audio(article_id, text)
+        except TTSError as e:
+            raise RuntimeError(f'TTS服务错误: {e.status_code}')
+        except requests.exceptions.Timeout:
+            raise RuntimeError('音频生成超时，请稍后重试')
+        except Exception as e:
+            raise RuntimeError(f'音频生成失败: {str(e)}')
 
-        # 检查文本长度，决定是否需要分段处理（增加40%冗余）
-        MAX_CHARS = 2200  # 更保守的字符限制
-        segments_count = 1
+    return job_accepted(jobs.submit('generate_article_audio', run, article_id=article_id))
 
-        if len(text) <= MAX_CHARS:
-            # 文本较短，直接生成
-            url = "https://api.deerapi.com/v1/audio/speech"
-            payload = json.dumps({
-                "model": "tts-1",
-                "input": text,
-                "voice": "nova"
-            })
-            headers = {
-                'Authorization': f"Bearer {os.getenv('DEER_API_KEY')}",
-                'Content-Type': 'application/json'
-            }
+def build_article_audio(article_id, text):
+    """生成文章音频（长文本分段合成后合并），返回音频地址等信息"""
+    # 创建文章音频目录
+    article_audio_dir = os.path.join(VOCAB_AUDIO_DIR, 'articles', article_id)
+    os.makedirs(article_audio_dir, exist_ok=True)
 
-            response = requests.post(url, headers=headers, data=payload, timeout=30)
+    # 生成最终音频文件名
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    filename = f"article_{timestamp}_{str(uuid.uuid4())[:8]}.mp3"
+    final_audio_path = os.path.join(article_audio_dir, filename)
 
-            if response.status_code == 200:
-                with open(final_audio_path, 'wb') as f:
-                    f.write(response.content)
-            else:
-                return jsonify({'error': f'TTS服务错误: {response.status_code}'}), 500
-        else:
-            # 文本较长，需要分段处理（增加40%冗余）
-            base_segments = max(2, min(8, len(text) // 1800))  # 基础分段数（更小的基础单位）
-            target_segments = int(base_segments * 1.4)  # 增加40%冗余
-            target_segments = max(3, min(12, target_segments))  # 3-12段之间
-            segments = split_text_intelligently(text, target_segments, MAX_CHARS)
-            segments_count = len(segments)
+    # 检查文本长度，决定是否需要分段处理（增加40%冗余）
+    MAX_CHARS = 2200  # 更保守的字符限制
+    segments_count = 1
 
-            # 创建临时目录存储分段音频
-            temp_dir = os.path.join(article_audio_dir, f"temp_{timestamp}")
-            os.makedirs(temp_dir, exist_ok=True)
+    if len(text) <= MAX_CHARS:
+        # 文本较短，直接生成
+        cache_path = get_cached_tts(text, timeout=30)
+        link_tts_alias(cache_path, final_audio_path)
+    else:
+        # 文本较长，需要分段处理（增加40%冗余）
+        base_segments = max(2, min(8, len(text) // 1800))  # 基础分段数（更小的基础单位）
+        target_segments = int(base_segments * 1.4)  # 增加40%冗余
+        target_segments = max(3, min(12, target_segments))  # 3-12段之间
+        segments = split_text_intelligently(text, target_segments, MAX_CHARS)
+        segments_count = len(segments)
 
-            try:
-                # 生成每个分段的音频
-                segment_paths = []
-                for i, segment in enumerate(segments):
-                    segment_path = generate_tts_segment(segment, temp_dir, i)
-                    segment_paths.append(segment_path)
+        # 创建临时目录存储分段音频
+        temp_dir = os.path.join(article_audio_dir, f"temp_{timestamp}")
+        os.makedirs(temp_dir, exist_ok=True)
 
-                # 使用pydub合并音频
-                combined_audio = None
-                silence = AudioSegment.silent(duration=800)  # 800ms静音间隔
+        try:
+            # 生成每个分段的音频
+            segment_paths = []
+            for i, segment in enumerate(segments):
+                segment_path = generate_tts_segment(segment, temp_dir, i)
+                segment_paths.append(segment_path)
 
-                for segment_path in segment_paths:
-                    audio_segment = AudioSegment.from_mp3(segment_path)
+            # 按帧拼接分段音频，段间800ms静音
+            concat_audio_files(segment_paths, final_audio_path, gap_ms=800)
 
-                    if combined_audio is None:
-                        combined_audio = audio_segment
-                    else:
-                        combined_audio = combined_audio + silence + audio_segment
+        finally:
+            # 保留临时文件以支持断点续传，只在成功生成最终音频后清理
+            # 临时文件会在后续的清理任务中自动删除
+            pass
 
-                # 导出合并后的音频
-                combined_audio.export(final_audio_path, format="mp3")
+    # 保存对应的文本文件
+    txt_path = final_audio_path.replace('.mp3', '.txt')
+    with open(txt_path, 'w', encoding='utf-8') as f:
+        f.write(text)
 
-            finally:
-                # 保留临时文件以支持断点续传，只在成功生成最终音频后清理
-                # 临时文件会在后续的清理任务中自动删除
-                pass
+    # 返回音频访问URL
+    audio_url = f"/vocab_audio/articles/{article_id}/{filename}"
 
-        # 保存对应的文本文件
-        txt_path = final_audio_path.replace('.mp3', '.txt')
-        with open(txt_path, 'w', encoding='utf-8') as f:
-            f.write(text)
-
-        # 返回音频访问URL
-        audio_url = f"/vocab_audio/articles/{article_id}/{filename}"
-
-        return jsonify({
-            'success': True,
-            'audio_url': audio_url,
-            'filename': filename,
-            'text_length': len(text),
-            'segments_count': segments_count
-        })
-
-    except requests.exceptions.Timeout:
-        return jsonify({'error': '音频生成超时，请稍后重试'}), 500
-    except Exception as e:
-        return jsonify({'error': f'音频生成失败: {str(e)}'}), 500
+    return {
+        'audio_url': audio_url,
+        'filename': filename,
+        'text_length': len(text),
+        'segments_count': segments_count
+    }
 
 @intensive_reading_bp.route('/prepare_article_audio', methods=['POST'])
 def prepare_article_audio():
@@ -995,25 +930,13 @@ def combine_audio_segments():
             else:
                 return jsonify({'error': f'分段文件缺失: {segment_file}'}), 404
 
-        # 合并音频
-        combined_audio = None
-        silence = AudioSegment.silent(duration=800)  # 800ms静音间隔
-
-        for segment_path in segment_paths:
-            audio_segment = AudioSegment.from_mp3(segment_path)
-
-            if combined_audio is None:
-                combined_audio = audio_segment
-            else:
-                combined_audio = combined_audio + silence + audio_segment
-
         # 生成最终文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"article_{timestamp}.mp3"
+        filename = f"article_{timestamp}_{str(uuid.uuid4())[:8]}.mp3"
         final_audio_path = os.path.join(article_audio_dir, filename)
 
-        # 导出合并后的音频
-        combined_audio.export(final_audio_path, format="mp3")
+        # 按帧拼接分段音频，段间800ms静音
+        concat_audio_files(segment_paths, final_audio_path, gap_ms=800)
 
         # 保存对应的文本文件
         txt_path = final_audio_path.replace('.mp3', '.txt')
@@ -0,0 +1,47 @@
+from flask import Blueprint, jsonify, Response
+import json
+
+from utils import jobs
+
+jobs_bp = Blueprint('jobs', __name__)
+
+SSE_KEEPALIVE_SECONDS = 15
+
+
+def job_accepted(job_id, **extra):
+    """202 响应：任务已排队，进度通过 /api/jobs/<job_id> 查询"""
+    return jsonify({'success': True, 'job_id': job_id, 'status_url': f'/api/jobs/{job_id}', **extra}), 202
+
+
+@jobs_bp.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    """查询后台任务进度（总数、已完成、失败及每一项的状态）"""
+    job = jobs.get_job(job_id)
+    if job is None:
+        return jsonify({'error': '任务不存在'}), 404
+    return jsonify(job)
+
+
+@jobs_bp.route('/api/jobs/<job_id>/events', methods=['GET'])
+def job_events(job_id):
+    """以 SSE 推送任务进度：每次状态变化发送一条 data，任务结束后关闭连接"""
+    if jobs.get_job(job_id) is None:
+        return jsonify({'error': '任务不存在'}), 404
+
+    def stream():
+        version = None
+        while True:
+            job = jobs.wait_for_update(job_id, version, timeout=SSE_KEEPALIVE_SECONDS)
+            if job is None:
+                yield 'event: error\ndata: {"error": "任务不存在"}\n\n'
+                return
+            if job['version'] == version:
+                yield ': keepalive\n\n'
+                continue
+            version = job['version']
+            yield f"data: {json.dumps(job, ensure_ascii=False)}\n\n"
+            if job['status'] in jobs.FINISHED:
+                return
+
+    headers = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    return Response(stream(), mimetype='text/event-stream', headers=headers)
@@ -8,7 +8,7 @@ from flask import Blueprint, Response, jsonify, request
 
 import core
 from core import require_auth
-from utils.json_store import load_json, save_json_atomic
+from utils.json_store import json_transaction, load_json
 
 
 learning_bp = Blueprint("learning", __name__)
@@ -55,7 +55,7 @@ def _score_value(value):
 def _all_vocab_words():
     words = []
     for category in CATEGORIES:
-        data = load_json(_category_path(category), None)
+        data = load_json(_category_path(category), None, cached=True)
         if not isinstance(data, dict):
             continue
         for subcategory_id, subcategory in data.get("subcategories", {}).items():
@@ -327,42 +327,46 @@ def learning_add_vocabulary():
         return jsonify({"success": False, "error": "单词不能为空"}), 400
 
     path = _category_path(category)
-    data_obj = load_json(path, None)
-    now = _now()
-    if not isinstance(data_obj, dict):
-        data_obj = {
-            "name": category.capitalize(),
-            "icon": {"listening": "🎧", "speaking": "🗣️", "reading": "📖", "writing": "✍️"}[category],
-            "subcategories": {},
-            "metadata": {"created_at": now, "last_updated": now},
+    # 与词汇本路由共用分类文件，读取-修改-保存在文件锁内完成
+    with json_transaction(path, None) as txn:
+        data_obj = txn.data
+        now = _now()
+        if not isinstance(data_obj, dict):
+            data_obj = {
+                "name": category.capitalize(),
+                "icon": {"listening": "🎧", "speaking": "🗣️", "reading": "📖", "writing": "✍️"}[category],
+                "subcategories": {},
+                "metadata": {"created_at": now, "last_updated": now},
+            }
+            txn.data = data_obj
+
+        target_id = None
+        for sub_id, subcategory in data_obj.setdefault("subcategories", {}).items():
+            if subcategory.get("name") == subcategory_name:
+                target_id = sub_id
+                break
+        if target_id is None:
+            target_id = str(uuid.uuid4())
+            data_obj["subcategories"][target_id] = {"name": subcategory_name, "created_at": now, "words": []}
+
+        words = data_obj["subcategories"][target_id].setdefault("words", [])
+        if any(str(existing.get("word", "")).lower() == word.lower() for existing in words):
+            txn.abort()
+            return jsonify({"success": False, "error": "单词已存在"}), 409
+
+        word_obj = {
+            "id": str(uuid.uuid4()),
+            "word": word,
+            "meaning": meaning,
+            "created_at": now,
+            "audio_generated": False,
+            "is_favorited": False,
+            "source": source,
+            "source_detail": data.get("source_detail", ""),
         }
+        words.append(word_obj)
+        data_obj.setdefault("metadata", {})["last_updated"] = now
 
-    target_id = None
-    for sub_id, subcategory in data_obj.setdefault("subcategories", {}).items():
-        if subcategory.get("name") == subcategory_name:
-            target_id = sub_id
-            break
-    if target_id is None:
-        target_id = str(uuid.uuid4())
-        data_obj["subcategories"][target_id] = {"name": subcategory_name, "created_at": now, "words": []}
-
-    words = data_obj["subcategories"][target_id].setdefault("words", [])
-    if any(str(existing.get("word", "")).lower() == word.lower() for existing in words):
-        return jsonify({"success": False, "error": "单词已存在"}), 409
-
-    word_obj = {
-        "id": str(uuid.uuid4()),
-        "word": word,
-        "meaning": meaning,
-        "created_at": now,
-        "audio_generated": False,
-        "is_favorited": False,
-        "source": source,
-        "source_detail": data.get("source_detail", ""),
-    }
-    words.append(word_obj)
-    data_obj.setdefault("metadata", {})["last_updated"] = now
-    save_json_atomic(path, data_obj)
     return jsonify({"success": True, "data": word_obj})
 
 
@@ -1,10 +1,13 @@
 from flask import Blueprint, request, jsonify, send_file
 import os, json, re, uuid, threading, shutil, requests, time
 from datetime import datetime
-from openai import OpenAI
+from utils import http_client
+from utils.governor import CircuitOpenError, backoff_delay, get_governor
+from utils.json_store import load_json, save_json_atomic, json_transaction
+from utils.media import send_media
 from core import (
-    LISTENING_REVIEW_DIR, is_token_valid, load_tokens, get_proxies,
-    get_openai_http_client, load_prompt, is_safe_path_segment,
+    LISTENING_REVIEW_DIR, get_request_token, verify_token_get_username,
+    load_prompt, render_prompt, get_prompt_version, is_safe_path_segment, open_collection,
 )
 
 listening_review_bp = Blueprint('listening_review', __name__)
@@ -20,19 +23,12 @@ ERROR_TAG_KEYS = ('liaison', 'synonym', 'vocab', 'spelling', 'attention')
 def _user_projects_path(username):
     return os.path.join(LISTENING_REVIEW_DIR, f'{username}_projects.json')
 
-def _load_user_projects(username):
-    path = _user_projects_path(username)
-    if os.path.exists(path):
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return []
-    return []
+def _user_projects(username):
+    """The user's project collection (json or sqlite backend)."""
+    return open_collection(f'listening_projects/{username}', _user_projects_path(username))
 
-def _save_user_projects(username, projects):
-    with open(_user_projects_path(username), 'w', encoding='utf-8') as f:
-        json.dump(projects, f, ensure_ascii=False, indent=2)
+def _load_user_projects(username):
+    return _user_projects(username).all()
 
 def _project_dir(project_id):
     return os.path.join(LISTENING_REVIEW_DIR, project_id)
@@ -41,39 +37,26 @@ def _project_data_path(project_id):
     return os.path.join(_project_dir(project_id), 'data.json')
 
 def _load_project_data(project_id):
-    path = _project_data_path(project_id)
-    if os.path.exists(path):
-        try:
-            with open(path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except:
-            return None
-    return None
+    return load_json(_project_data_path(project_id), None)
 
 def _save_project_data(project_id, data):
-    with open(_project_data_path(project_id), 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(_project_data_path(project_id), data)
+
+def _project_data_transaction(project_id):
+    """Lock + load data.json; txn.data is None when the project has no data yet."""
+    return json_transaction(_project_data_path(project_id), None)
 
 def _generate_project_id():
     return f"lr_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{str(uuid.uuid4())[:8]}"
 
 def _get_auth_username():
     """Extract and validate token, return username or None."""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not token:
-        token = request.args.get('token', '')
-    if not token or not is_token_valid(token):
-        return None
-    tokens = load_tokens()
-    return tokens.get(token, {}).get('username')
-
-def _find_user_project(username, project_id):
-    """Find a project by id in user's project list. Returns (projects, index) or (projects, -1)."""
-    projects = _load_user_projects(username)
-    for i, p in enumerate(projects):
-        if p['id'] == project_id:
-            return projects, i
-    return projects, -1
+    token = get_request_token() or request.args.get('token', '')
+    return verify_token_get_username(token)
+
+def _get_user_project(username, project_id):
+    """Find a project by id in the user's projects. Returns the project or None."""
+    return _user_projects(username).get(project_id)
 
 
 def _normalize_error_tags(raw):
@@ -116,7 +99,7 @@ def _parse_transcription_response(result, provider_label):
     return {'segments': segments, 'duration': duration}, None
 
 
-def _post_audio_transcription(url, api_key, model, audio_file_path, proxies, max_retries, provider_label):
+def _post_audio_transcription(url, api_key, model, audio_file_path, provider, max_retries, provider_label):
     """通用 OpenAI 兼容 audio/transcriptions 调用（verbose_json + segment）。"""
     for attempt in range(max_retries):
         try:
@@ -131,9 +114,9 @@ def _post_audio_transcription(url, api_key, model, audio_file_path, proxies, max
                 headers = {'Authorization': f'Bearer {api_key}'}
                 # 连接/上传/读回：tuple 的第一项也会约束 body 写出时间。
                 # 8MB+ 音频在弱网上 (10, 300) 会触发 write timeout，故放宽到 60s 连接/上传、10min 读。
-                response = requests.post(
-                    url, headers=headers, files=files, data=data,
-                    timeout=(60, 600), proxies=proxies,
+                response = http_client.post(
+                    provider, url, headers=headers, files=files, data=data,
+                    timeout=(60, 600),
                 )
 
                 if response.status_code == 200:
@@ -152,19 +135,22 @@ def _post_audio_transcription(url, api_key, model, audio_file_path, proxies, max
                     return None, error_msg
                 if attempt == max_retries - 1:
                     return None, error_msg
+                time.sleep(backoff_delay(attempt))
 
+        except CircuitOpenError as e:
+            return None, str(e)
         except requests.exceptions.Timeout:
             if attempt == max_retries - 1:
                 return None, '请求超时'
-            time.sleep(2 ** attempt)
+            time.sleep(backoff_delay(attempt))
         except requests.exceptions.ConnectionError as e:
             if attempt == max_retries - 1:
                 return None, f'连接错误: {e}'
-            time.sleep(2 ** attempt)
+            time.sleep(backoff_delay(attempt))
         except Exception as e:
             if attempt == max_retries - 1:
                 return None, str(e)
-            time.sleep(2 ** attempt)
+            time.sleep(backoff_delay(attempt))
 
     return None, f'转录失败，已重试 {max_retries} 次'
 
@@ -180,7 +166,7 @@ def _call_groq_transcription(audio_file_path, max_retries=3):
         api_key=api_key,
         model='whisper-large-v3-turbo',
         audio_file_path=audio_file_path,
-        proxies=get_proxies(),
+        provider='groq',  # 经 PROXY_URL 出站
         max_retries=max_retries,
         provider_label='Groq',
     )
@@ -198,7 +184,7 @@ def _call_wildapi_transcription(audio_file_path, max_retries=3):
         api_key=api_key,
         model=os.getenv('LISTENING_ASR_MODEL') or 'whisper-1',
         audio_file_path=audio_file_path,
-        proxies=None,  # WildAPI 实测国内直连可用
+        provider='wildapi',  # WildAPI 实测国内直连可用
         max_retries=max_retries,
         provider_label='WildAPI',
     )
@@ -230,11 +216,10 @@ def _parse_polish_result(content, model_name):
     return None, f'Unexpected {model_name} response structure'
 
 
-def _polish_and_translate_with_client(client, segments, model_name, temperature, response_format):
-    """用给定 OpenAI 兼容 client 执行润色+翻译。"""
-    cfg = load_prompt('listening_polish_translate')
+def _polish_and_translate_with_client(client, segments, cfg, model_name, channel):
+    """用给定 OpenAI 兼容 client 执行润色+翻译（cfg 由调用方加载，避免重复读取 prompt；channel 为限流调度器名）。"""
     segments_json = json.dumps(segments, ensure_ascii=False)
-    user_prompt = cfg['user_prompt'].format(segments_json=segments_json)
+    user_prompt = render_prompt('listening_polish_translate', 'user_prompt', segments_json=segments_json)
 
     try:
         kwargs = {
@@ -243,12 +228,12 @@ def _polish_and_translate_with_client(client, segments, model_name, temperature,
                 {'role': 'system', 'content': cfg['system_prompt']},
                 {'role': 'user', 'content': user_prompt}
             ],
-            'temperature': temperature,
+            'temperature': cfg['temperature'],
         }
-        if response_format:
-            kwargs['response_format'] = {'type': response_format}
+        if cfg.get('response_format'):
+            kwargs['response_format'] = {'type': cfg['response_format']}
 
-        response = client.chat.completions.create(**kwargs)
+        response = get_governor(channel).call(lambda: client.chat.completions.create(**kwargs))
         content = (response.choices[0].message.content or '')
         return _parse_polish_result(content, model_name)
     except Exception as e:
@@ -265,16 +250,12 @@ def _polish_and_translate_deerapi(segments):
         return None, 'DEER_API_KEY not configured'
 
     cfg = load_prompt('listening_polish_translate')
-    # 经 PROXY_URL 出站，避免 DeerAPI 区限制
-    client = OpenAI(
-        base_url='https://api.deerapi.com/v1',
-        api_key=api_key,
-        http_client=get_openai_http_client(),
+    # 经 PROXY_URL 出站，避免 DeerAPI 区限制；client 按 key 复用连接池
+    client = http_client.get_openai_client(
+        'deerapi', 'https://api.deerapi.com/v1', api_key, use_proxy=True,
     )
     model_name = os.getenv('LISTENING_LLM_MODEL') or cfg['model']
-    return _polish_and_translate_with_client(
-        client, segments, model_name, cfg['temperature'], cfg.get('response_format'),
-    )
+    return _polish_and_translate_with_client(client, segments, cfg, model_name, 'deerapi_chat')
 
 
 def _polish_and_translate_wildapi(segments):
@@ -285,12 +266,10 @@ def _polish_and_translate_wildapi(segments):
 
     cfg = load_prompt('listening_polish_translate')
     base = (os.getenv('WILDAPI_BASE_URL') or 'https://api.gptsapi.net/v1').rstrip('/')
-    client = OpenAI(base_url=base, api_key=api_key, max_retries=0)
+    client = http_client.get_openai_client('wildapi', base, api_key, max_retries=0)
     # 默认 gemini-3-flash-preview（实测可用）；开通后可改 LISTENING_LLM_MODEL / YAML
     model_name = os.getenv('LISTENING_LLM_MODEL') or cfg['model']
-    return _polish_and_translate_with_client(
-        client, segments, model_name, cfg['temperature'], cfg.get('response_format'),
-    )
+    return _polish_and_translate_with_client(client, segments, cfg, model_name, 'wildapi')
 
 
 def _polish_and_translate(segments):
@@ -334,12 +313,9 @@ def _download_audio_from_url(url_str, save_path):
 
 def _update_project_status(username, project_id, **fields):
     """Update a project's fields in the user projects list and save."""
-    projects = _load_user_projects(username)
-    for i, p in enumerate(projects):
-        if p['id'] == project_id:
-            projects[i].update(fields, updated_at=datetime.now().isoformat())
-            break
-    _save_user_projects(username, projects)
+    _user_projects(username).update(
+        project_id, lambda p: p.update(fields, updated_at=datetime.now().isoformat())
+    )
 
 
 def _transcribe_async(project_id, audio_path, username):
@@ -355,6 +331,8 @@ def _transcribe_async(project_id, audio_path, username):
         _update_project_status(username, project_id, status='translating', duration=result['duration'])
 
         # Phase 2: LLM polish + translate（默认 WildAPI，可 LISTENING_LLM_PROVIDER=deerapi 回切）
+        # 记录所用 prompt 版本，prompt 修改后可据此找出需要重新润色的项目
+        prompt_version = get_prompt_version('listening_polish_translate')
         polished_segments, translate_error = _polish_and_translate(result['segments'])
         if not polished_segments:
             _update_project_status(username, project_id, status='error', error=translate_error or 'Translation failed')
@@ -374,9 +352,10 @@ def _transcribe_async(project_id, audio_path, username):
             'vocab_annotations': [],
             'notes': [],
             'error_tags': {},
+            'polish_prompt_version': prompt_version,
         })
         _update_project_status(username, project_id, status='completed')
-        print(f"Listening review done: {project_id}")
+        print(f"Listening review done: {project_id} (prompt {prompt_version})")
 
     except Exception as e:
         print(f"Listening review failed: {e}")
@@ -442,11 +421,9 @@ def upload_audio():
         'error': None
     }
 
-    projects = _load_user_projects(username)
-    projects.append(project_record)
-    _save_user_projects(username, projects)
+    _user_projects(username).insert(project_record)
 
-    thread = threading.Thread(target=_transcribe_async, args=(project_id, audio_path, username), daemon=True)
+    thread = threading.Thread(target=_transcribe_async, args=(project_id, audio_path, username), name=f'transcribe-listening-{project_id}', daemon=True)
     thread.start()
 
     return jsonify({'success': True, 'project_id': project_id, 'message': '音频上传成功，正在转录中...'})
@@ -502,11 +479,9 @@ def download_url_audio():
         'error': None
     }
 
-    projects = _load_user_projects(username)
-    projects.append(project_record)
-    _save_user_projects(username, projects)
+    _user_projects(username).insert(project_record)
 
-    thread = threading.Thread(target=_transcribe_async, args=(project_id, audio_path, username), daemon=True)
+    thread = threading.Thread(target=_transcribe_async, args=(project_id, audio_path, username), name=f'transcribe-listening-{project_id}', daemon=True)
     thread.start()
 
     return jsonify({'success': True, 'project_id': project_id, 'message': '音频下载成功，正在转录中...'})
@@ -606,11 +581,10 @@ def get_project(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
-    project = projects[idx]
     data = _load_project_data(project_id)
 
     return jsonify({
@@ -626,8 +600,8 @@ def delete_project(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
     # Remove project directory
@@ -635,8 +609,7 @@ def delete_project(project_id):
     if os.path.exists(proj_dir):
         shutil.rmtree(proj_dir)
 
-    projects.pop(idx)
-    _save_user_projects(username, projects)
+    _user_projects(username).delete(project_id)
 
     return jsonify({'success': True, 'message': '项目已删除'})
 
@@ -647,11 +620,10 @@ def retry_transcription(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
-    project = projects[idx]
     if project['status'] != 'error':
         return jsonify({'error': '只能重试失败的项目'}), 400
 
@@ -659,12 +631,9 @@ def retry_transcription(project_id):
     if not os.path.exists(audio_path):
         return jsonify({'error': '原始音频文件不存在'}), 404
 
-    projects[idx]['status'] = 'processing'
-    projects[idx]['error'] = None
-    projects[idx]['updated_at'] = datetime.now().isoformat()
-    _save_user_projects(username, projects)
+    _update_project_status(username, project_id, status='processing', error=None)
 
-    thread = threading.Thread(target=_transcribe_async, args=(project_id, audio_path, username), daemon=True)
+    thread = threading.Thread(target=_transcribe_async, args=(project_id, audio_path, username), name=f'transcribe-listening-{project_id}', daemon=True)
     thread.start()
 
     return jsonify({'success': True, 'message': '重新转录已开始'})
@@ -676,15 +645,15 @@ def toggle_mastered(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
-        return jsonify({'error': '项目不存在'}), 404
+    def toggle(project):
+        project['mastered'] = not project.get('mastered', False)
+        project['updated_at'] = datetime.now().isoformat()
 
-    projects[idx]['mastered'] = not projects[idx].get('mastered', False)
-    projects[idx]['updated_at'] = datetime.now().isoformat()
-    _save_user_projects(username, projects)
+    project = _user_projects(username).update(project_id, toggle)
+    if project is None:
+        return jsonify({'error': '项目不存在'}), 404
 
-    return jsonify({'success': True, 'mastered': projects[idx]['mastered']})
+    return jsonify({'success': True, 'mastered': project['mastered']})
 
 
 @listening_review_bp.route('/api/listening_review/project/<project_id>/checkin', methods=['POST'])
@@ -693,15 +662,15 @@ def checkin_project(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
-        return jsonify({'error': '项目不存在'}), 404
+    def checkin(project):
+        project['checkin_count'] = project.get('checkin_count', 0) + 1
+        project['updated_at'] = datetime.now().isoformat()
 
-    projects[idx]['checkin_count'] = projects[idx].get('checkin_count', 0) + 1
-    projects[idx]['updated_at'] = datetime.now().isoformat()
-    _save_user_projects(username, projects)
+    project = _user_projects(username).update(project_id, checkin)
+    if project is None:
+        return jsonify({'error': '项目不存在'}), 404
 
-    return jsonify({'success': True, 'checkin_count': projects[idx]['checkin_count']})
+    return jsonify({'success': True, 'checkin_count': project['checkin_count']})
 
 
 @listening_review_bp.route('/api/listening_review/project/<project_id>/star', methods=['PUT'])
@@ -710,8 +679,8 @@ def toggle_star(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
     body = request.get_json(silent=True) or {}
@@ -719,17 +688,18 @@ def toggle_star(project_id):
     if segment_id is None:
         return jsonify({'error': '缺少 segment_id'}), 400
 
-    data = _load_project_data(project_id)
-    if not data:
-        return jsonify({'error': '项目数据不存在'}), 404
+    with _project_data_transaction(project_id) as txn:
+        data = txn.data
+        if not data:
+            txn.abort()
+            return jsonify({'error': '项目数据不存在'}), 404
 
-    starred = data.get('starred_segments', [])
-    if segment_id in starred:
-        starred.remove(segment_id)
-    else:
-        starred.append(segment_id)
-    data['starred_segments'] = starred
-    _save_project_data(project_id, data)
+        starred = data.get('starred_segments', [])
+        if segment_id in starred:
+            starred.remove(segment_id)
+        else:
+            starred.append(segment_id)
+        data['starred_segments'] = starred
 
     return jsonify({'success': True, 'starred_segments': starred})
 
@@ -744,8 +714,8 @@ def toggle_error_tag(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
     body = request.get_json(silent=True) or {}
@@ -756,27 +726,29 @@ def toggle_error_tag(project_id):
     if tag not in ERROR_TAG_KEYS:
         return jsonify({'error': '无效的错误分类'}), 400
 
-    data = _load_project_data(project_id)
-    if not data:
-        return jsonify({'error': '项目数据不存在'}), 404
-    if not _segment_exists(data, segment_id):
-        return jsonify({'error': '句子不存在'}), 404
-
-    error_tags = _normalize_error_tags(data.get('error_tags', {}))
-    key = str(segment_id)
-    current = set(error_tags.get(key, []))
-    if tag in current:
-        current.remove(tag)
-    else:
-        current.add(tag)
-    ordered = [item for item in ERROR_TAG_KEYS if item in current]
-    if ordered:
-        error_tags[key] = ordered
-    else:
-        error_tags.pop(key, None)
-
-    data['error_tags'] = error_tags
-    _save_project_data(project_id, data)
+    with _project_data_transaction(project_id) as txn:
+        data = txn.data
+        if not data:
+            txn.abort()
+            return jsonify({'error': '项目数据不存在'}), 404
+        if not _segment_exists(data, segment_id):
+            txn.abort()
+            return jsonify({'error': '句子不存在'}), 404
+
+        error_tags = _normalize_error_tags(data.get('error_tags', {}))
+        key = str(segment_id)
+        current = set(error_tags.get(key, []))
+        if tag in current:
+            current.remove(tag)
+        else:
+            current.add(tag)
+        ordered = [item for item in ERROR_TAG_KEYS if item in current]
+        if ordered:
+            error_tags[key] = ordered
+        else:
+            error_tags.pop(key, None)
+
+        data['error_tags'] = error_tags
 
     return jsonify({
         'success': True,
@@ -792,8 +764,8 @@ def add_vocab(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
     body = request.get_json(silent=True) or {}
@@ -806,32 +778,33 @@ def add_vocab(project_id):
     if segment_id is None or not word or not meaning or start_offset is None or end_offset is None:
         return jsonify({'error': '缺少必要参数'}), 400
 
-    data = _load_project_data(project_id)
-    if not data:
-        return jsonify({'error': '项目数据不存在'}), 404
-
-    annotations = data.get('vocab_annotations', [])
-
-    # Check if same word at same position already exists, update it
-    existing_id = body.get('id')
-    if existing_id:
-        for ann in annotations:
-            if ann['id'] == existing_id:
-                ann['meaning'] = meaning
-                break
-    else:
-        annotation = {
-            'id': f"v_{str(uuid.uuid4())[:6]}",
-            'segment_id': segment_id,
-            'word': word,
-            'meaning': meaning,
-            'start_offset': start_offset,
-            'end_offset': end_offset
-        }
-        annotations.append(annotation)
-
-    data['vocab_annotations'] = annotations
-    _save_project_data(project_id, data)
+    with _project_data_transaction(project_id) as txn:
+        data = txn.data
+        if not data:
+            txn.abort()
+            return jsonify({'error': '项目数据不存在'}), 404
+
+        annotations = data.get('vocab_annotations', [])
+
+        # Check if same word at same position already exists, update it
+        existing_id = body.get('id')
+        if existing_id:
+            for ann in annotations:
+                if ann['id'] == existing_id:
+                    ann['meaning'] = meaning
+                    break
+        else:
+            annotation = {
+                'id': f"v_{str(uuid.uuid4())[:6]}",
+                'segment_id': segment_id,
+                'word': word,
+                'meaning': meaning,
+                'start_offset': start_offset,
+                'end_offset': end_offset
+            }
+            annotations.append(annotation)
+
+        data['vocab_annotations'] = annotations
 
     return jsonify({'success': True, 'data': data})
 
@@ -842,17 +815,18 @@ def delete_vocab(project_id, word_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
-    data = _load_project_data(project_id)
-    if not data:
-        return jsonify({'error': '项目数据不存在'}), 404
+    with _project_data_transaction(project_id) as txn:
+        data = txn.data
+        if not data:
+            txn.abort()
+            return jsonify({'error': '项目数据不存在'}), 404
 
-    annotations = data.get('vocab_annotations', [])
-    data['vocab_annotations'] = [a for a in annotations if a['id'] != word_id]
-    _save_project_data(project_id, data)
+        annotations = data.get('vocab_annotations', [])
+        data['vocab_annotations'] = [a for a in annotations if a['id'] != word_id]
 
     return jsonify({'success': True, 'data': data})
 
@@ -864,53 +838,57 @@ def add_note(project_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
     body = request.get_json(silent=True) or {}
     note_text = (body.get('note') or '').strip()
     existing_id = body.get('id')
 
-    data = _load_project_data(project_id)
-    if not data:
-        return jsonify({'error': '项目数据不存在'}), 404
-
-    notes = data.get('notes', [])
-
-    if existing_id:
-        # Update an existing note's body
-        if not note_text:
-            return jsonify({'error': '笔记内容不能为空'}), 400
-        found = False
-        for n in notes:
-            if n['id'] == existing_id:
-                n['note'] = note_text
-                n['updated_at'] = datetime.now().isoformat()
-                found = True
-                break
-        if not found:
-            return jsonify({'error': '笔记不存在'}), 404
-    else:
-        # Create a new note anchored to a span within a segment
-        segment_id = body.get('segment_id')
-        quote = (body.get('quote') or '').strip()
-        start_offset = body.get('start_offset')
-        end_offset = body.get('end_offset')
-        if segment_id is None or not quote or not note_text or start_offset is None or end_offset is None:
-            return jsonify({'error': '缺少必要参数'}), 400
-        notes.append({
-            'id': f"n_{str(uuid.uuid4())[:6]}",
-            'segment_id': segment_id,
-            'quote': quote,
-            'note': note_text,
-            'start_offset': start_offset,
-            'end_offset': end_offset,
-            'created_at': datetime.now().isoformat()
-        })
+    with _project_data_transaction(project_id) as txn:
+        data = txn.data
+        if not data:
+            txn.abort()
+            return jsonify({'error': '项目数据不存在'}), 404
+
+        notes = data.get('notes', [])
+
+        if existing_id:
+            # Update an existing note's body
+            if not note_text:
+                txn.abort()
+                return jsonify({'error': '笔记内容不能为空'}), 400
+            found = False
+            for n in notes:
+                if n['id'] == existing_id:
+                    n['note'] = note_text
+                    n['updated_at'] = datetime.now().isoformat()
+                    found = True
+                    break
+            if not found:
+                txn.abort()
+                return jsonify({'error': '笔记不存在'}), 404
+        else:
+            # Create a new note anchored to a span within a segment
+            segment_id = body.get('segment_id')
+            quote = (body.get('quote') or '').strip()
+            start_offset = body.get('start_offset')
+            end_offset = body.get('end_offset')
+            if segment_id is None or not quote or not note_text or start_offset is None or end_offset is None:
+                txn.abort()
+                return jsonify({'error': '缺少必要参数'}), 400
+            notes.append({
+                'id': f"n_{str(uuid.uuid4())[:6]}",
+                'segment_id': segment_id,
+                'quote': quote,
+                'note': note_text,
+                'start_offset': start_offset,
+                'end_offset': end_offset,
+                'created_at': datetime.now().isoformat()
+            })
 
-    data['notes'] = notes
-    _save_project_data(project_id, data)
+        data['notes'] = notes
 
     return jsonify({'success': True, 'data': data})
 
@@ -921,17 +899,18 @@ def delete_note(project_id, note_id):
     if not username:
         return jsonify({'error': '未登录或token无效'}), 401
 
-    projects, idx = _find_user_project(username, project_id)
-    if idx == -1:
+    project = _get_user_project(username, project_id)
+    if project is None:
         return jsonify({'error': '项目不存在'}), 404
 
-    data = _load_project_data(project_id)
-    if not data:
-        return jsonify({'error': '项目数据不存在'}), 404
+    with _project_data_transaction(project_id) as txn:
+        data = txn.data
+        if not data:
+            txn.abort()
+            return jsonify({'error': '项目数据不存在'}), 404
 
-    notes = data.get('notes', [])
-    data['notes'] = [n for n in notes if n['id'] != note_id]
-    _save_project_data(project_id, data)
+        notes = data.get('notes', [])
+        data['notes'] = [n for n in notes if n['id'] != note_id]
 
     return jsonify({'success': True, 'data': data})
 
@@ -951,4 +930,4 @@ def serve_audio(project_id, filename):
     if not os.path.exists(file_path):
         return jsonify({'error': '文件不存在'}), 404
 
-    return send_file(file_path)
+    return send_media(file_path)
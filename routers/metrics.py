@@ -0,0 +1,57 @@
+from flask import Blueprint, request, jsonify, Response
+import threading
+
+from utils import metrics
+from utils.governor import snapshot_all
+from routers import vocabulary
+
+metrics_bp = Blueprint('metrics', __name__)
+
+LOCAL_ADDRESSES = {'127.0.0.1', '::1', 'localhost'}
+TRANSCRIBE_THREAD_PREFIXES = {
+    'asr': 'transcribe-asr-',
+    'listening': 'transcribe-listening-',
+}
+GOVERNOR_STATES = {'closed': 0, 'half_open': 1, 'open': 2}
+
+
+# ==================== 后台子系统 Gauges ====================
+
+def _audio_task_queue_depth():
+    """词汇音频任务队列深度：与后台处理使用同一查询（待处理、可重试和遗留的任务），
+    不计已达最大重试次数的任务，且适用于所有存储后端"""
+    return len(vocabulary.get_pending_audio_tasks())
+
+def _running_transcriptions():
+    """按线程名统计正在运行的转录线程"""
+    names = [thread.name for thread in threading.enumerate()]
+    return [
+        ({'kind': kind}, sum(1 for name in names if name.startswith(prefix)))
+        for kind, prefix in TRANSCRIBE_THREAD_PREFIXES.items()
+    ]
+
+def _governor_gauge(field):
+    def collect():
+        values = []
+        for channel, snapshot in sorted(snapshot_all().items()):
+            value = snapshot[field]
+            values.append(({'channel': channel}, GOVERNOR_STATES.get(value, value)))
+        return values
+    return collect
+
+metrics.register_gauge('audio_task_queue_depth', 'Pending vocabulary audio tasks', _audio_task_queue_depth)
+metrics.register_gauge('transcription_threads_running', 'Running transcription threads', _running_transcriptions)
+metrics.register_gauge('cache_hit_ratio', 'Hit ratio of in-process caches', metrics.cache_hit_ratios)
+metrics.register_gauge('outbound_concurrency_limit', 'Adaptive concurrency limit per provider channel', _governor_gauge('limit'))
+metrics.register_gauge('outbound_in_flight', 'In-flight outbound calls per provider channel', _governor_gauge('in_flight'))
+metrics.register_gauge('outbound_circuit_state', 'Circuit breaker state (0=closed, 1=half_open, 2=open)', _governor_gauge('state'))
+
+
+# ==================== 路由 ====================
+
+@metrics_bp.route('/metrics')
+def prometheus_metrics():
+    """Prometheus 文本格式指标，仅允许本机直连访问（经反向代理转发的请求一律拒绝）"""
+    if request.remote_addr not in LOCAL_ADDRESSES or request.headers.get('X-Forwarded-For'):
+        return jsonify({'error': 'Forbidden'}), 403
+    return Response(metrics.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -1,56 +1,74 @@
 from flask import Blueprint, request, jsonify, send_file, send_from_directory
-import os, json, re
+import os, json, re, hashlib, threading
 from werkzeug.wrappers import Response
 from werkzeug.utils import safe_join
 
 from core import READING_DIR
+from utils import metrics
 
 reading_bp = Blueprint('reading', __name__)
 
 
+# 排序规则：1.名称前数字；2.高频优先；3.次高频；4.其余
+_LEADING_NUMBER = re.compile(r"\s*(\d+)")
+
+
+def parse_leading_number(s):
+    m = _LEADING_NUMBER.match(s)
+    return int(m.group(1)) if m else 999999
+
+
+def category_sort_key(name):
+    # 高频分组优先
+    priority = 2
+    if '高频' in name and '次高频' not in name:
+        priority = 0
+    elif '次高频' in name:
+        priority = 1
+    return (priority, parse_leading_number(name), name)
+
+
+def _subdirs(path):
+    try:
+        return [d for d in os.listdir(path) if os.path.isdir(os.path.join(path, d)) and not d.startswith('.')]
+    except Exception:
+        return []
+
+
+def _mtime(path):
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
 def build_reading_index():
-    """扫描 READING_DIR 目录，返回 P1/P2/P3 分类下的层级与文件信息。"""
+    """扫描 READING_DIR 目录，返回 (P1/P2/P3 分类下的层级与文件信息, [(扫描过的目录, 列目录前的 mtime)])。
+
+    mtime 在列目录之前读取：扫描期间发生的改动会在下次校验时触发重扫，而不会被缓存掩盖。
+    """
     result = {'P1': [], 'P2': [], 'P3': []}
+    scanned = [(READING_DIR, _mtime(READING_DIR))]
     if not os.path.exists(READING_DIR):
-        return result
+        return result, scanned
 
     for part in ['P1', 'P2', 'P3']:
         part_dir = os.path.join(READING_DIR, part)
         if not os.path.isdir(part_dir):
             continue
-        try:
-            categories = [d for d in os.listdir(part_dir) if os.path.isdir(os.path.join(part_dir, d)) and not d.startswith('.')]
-        except Exception:
-            categories = []
-        # 排序规则：1.名称前数字；2.高频优先；3.次高频；4.其余
-        import re
-        def parse_leading_number(s):
-            m = re.match(r"\s*(\d+)", s)
-            return int(m.group(1)) if m else 999999
-        def category_sort_key(name):
-            n = name
-            # 高频分组优先
-            priority = 2
-            if '高频' in n and '次高频' not in n:
-                priority = 0
-            elif '次高频' in n:
-                priority = 1
-            return (priority, parse_leading_number(n), n)
+        scanned.append((part_dir, _mtime(part_dir)))
+        categories = _subdirs(part_dir)
         categories.sort(key=category_sort_key)
         for category in categories:
             cat_dir = os.path.join(part_dir, category)
-            try:
-                items = [d for d in os.listdir(cat_dir) if os.path.isdir(os.path.join(cat_dir, d)) and not d.startswith('.')]
-            except Exception:
-                items = []
+            scanned.append((cat_dir, _mtime(cat_dir)))
+            items = _subdirs(cat_dir)
             # 题目排序：按名称前导数字升序，其次按名称
-            try:
-                items.sort(key=lambda nm: (parse_leading_number(nm), nm))
-            except Exception:
-                pass
+            items.sort(key=lambda nm: (parse_leading_number(nm), nm))
             item_objs = []
             for item in items:
                 item_dir = os.path.join(cat_dir, item)
+                scanned.append((item_dir, _mtime(item_dir)))
                 try:
                     files = [f for f in os.listdir(item_dir) if os.path.isfile(os.path.join(item_dir, f))]
                 except Exception:
@@ -64,14 +82,49 @@ def build_reading_index():
                     'pdf': pdf_files
                 })
             result[part].append({'category': category, 'items': item_objs})
-    return result
+    return result, scanned
+
+
+# ==================== 目录索引缓存 ====================
+# 题库只在放入新的真题文件夹时变化。索引构建一次后缓存，并记录扫描过的每个目录的 mtime：
+# 增删条目都会改变其所在目录的 mtime，新目录也会体现在父目录上，因此校验只需对这些目录各 stat 一次。
+
+_index_cache = {'root': None, 'dirs': (), 'signature': None, 'body': None, 'etag': None}
+_index_lock = threading.Lock()
+
+
+def _dirs_signature(dirs):
+    return tuple(_mtime(path) for path in dirs)
+
+
+def get_reading_index():
+    """返回 (索引 JSON 字节, ETag)；目录没有变化时直接使用缓存"""
+    root = os.path.abspath(READING_DIR)
+    with _index_lock:
+        cached = dict(_index_cache)
+    if cached['root'] == root and _dirs_signature(cached['dirs']) == cached['signature']:
+        metrics.record_cache('reading_index', True)
+        return cached['body'], cached['etag']
+
+    metrics.record_cache('reading_index', False)
+    index, scanned = build_reading_index()
+    dirs = tuple(path for path, _ in scanned)
+    signature = tuple(mtime for _, mtime in scanned)
+    body = json.dumps(index, ensure_ascii=False).encode('utf-8')
+    etag = hashlib.sha256(body).hexdigest()[:32]
+    with _index_lock:
+        _index_cache.update(root=root, dirs=dirs, signature=signature, body=body, etag=etag)
+    return body, etag
 
 
 @reading_bp.route('/list_reading', methods=['GET'])
 def list_reading():
-    """返回阅读真题目录结构与可用文件（HTML/PDF）。"""
-    data = build_reading_index()
-    return jsonify(data)
+    """返回阅读真题目录结构与可用文件（HTML/PDF）；支持 If-None-Match 返回 304。"""
+    body, etag = get_reading_index()
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
 
 
 @reading_bp.route('/reading_exam/<path:subpath>')
@@ -1,16 +1,31 @@
-from flask import Blueprint, request, jsonify, send_file, send_from_directory
+from flask import Blueprint, request, jsonify, send_file, Response
 import os, json, shutil
-from core import MOTHER_DIR, generate_tts, is_safe_path_segment
+from core import MOTHER_DIR, generate_tts, generate_tts_batch, stream_tts, is_safe_path_segment
+from utils import audio_catalog, audio_manifest, jobs
+from utils.media import send_media_from
+from routers.jobs import job_accepted
 
 speaking_bp = Blueprint('speaking', __name__)
 
+BATCH_MAX_TEXTS = 50  # 单次批量生成的最大条数
+
+def _write_part2_question(folder, question):
+    """PART2 生成时写入 question.txt"""
+    folder_path = os.path.join(MOTHER_DIR, folder)
+    os.makedirs(folder_path, exist_ok=True)
+    question_file = os.path.join(folder_path, 'question.txt')
+    with open(question_file, 'w', encoding='utf-8') as f:
+        f.write(question.strip())
+    audio_catalog.folder_changed(MOTHER_DIR, folder)
+
 @speaking_bp.route('/speaking')
 def speaking_page():
     return send_file('templates/speaking.html')
 
 @speaking_bp.route('/generate_audio', methods=['POST'])
 def generate_audio():
-    data = request.json
+    """排队生成一条音频，任务结果为 {'folder', 'filename'}"""
+    data = request.json or {}
     text = data.get('text')
     folder = data.get('folder')
     question = data.get('question')
@@ -18,18 +33,74 @@ def generate_audio():
         return jsonify({'error': 'Missing text or folder'}), 400
     if not is_safe_path_segment(folder):
         return jsonify({'error': 'Invalid folder name'}), 400
-    # PART2 生成时写入 question.txt
     if folder.startswith('P2') and question:
-        folder_path = os.path.join(MOTHER_DIR, folder)
-        os.makedirs(folder_path, exist_ok=True)
-        question_file = os.path.join(folder_path, 'question.txt')
-        with open(question_file, 'w', encoding='utf-8') as f:
-            f.write(question.strip())
+        _write_part2_question(folder, question)
+
+    def run(job_id):
+        _, filename = generate_tts(text, folder)
+        return {'folder': folder, 'filename': filename}
+
+    return job_accepted(jobs.submit('generate_audio', run, folder=folder))
+
+@speaking_bp.route('/generate_audio_stream', methods=['POST'])
+def generate_audio_stream():
+    """流式生成音频：边合成边返回 MP3，同时保存到文件夹；文件名在响应头 X-Audio-Filename 中"""
+    data = request.json or {}
+    text = data.get('text')
+    folder = data.get('folder')
+    question = data.get('question')
+    if not text or not folder:
+        return jsonify({'error': 'Missing text or folder'}), 400
+    if not is_safe_path_segment(folder):
+        return jsonify({'error': 'Invalid folder name'}), 400
+    if folder.startswith('P2') and question:
+        _write_part2_question(folder, question)
     try:
-        folder, filename = generate_tts(text, folder)
+        filename, chunks = stream_tts(text, folder)
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-    return jsonify({'folder': folder, 'filename': filename})
+    headers = {
+        'X-Audio-Folder': folder,
+        'X-Audio-Filename': filename,
+        'Cache-Control': 'no-store',
+    }
+    return Response(chunks, mimetype='audio/mpeg', headers=headers, direct_passthrough=True)
+
+def _run_audio_batch(job_id, folder, texts):
+    """并发合成并按序写入，逐条更新任务进度"""
+    def on_item(index, filename, error):
+        if error:
+            jobs.update_item(job_id, index, status='failed', error=error)
+        else:
+            jobs.update_item(job_id, index, status='done', filename=filename)
+
+    return generate_tts_batch(folder, texts, job_id[:8], on_item=on_item)
+
+@speaking_bp.route('/generate_audio_batch', methods=['POST'])
+def generate_audio_batch():
+    """批量生成一个文件夹的音频：立即返回任务 id，进度通过 /api/jobs/<job_id> 查询"""
+    data = request.json or {}
+    folder = data.get('folder')
+    texts = data.get('texts')
+    question = data.get('question')
+    if not folder or not isinstance(texts, list) or not texts:
+        return jsonify({'error': 'Missing folder or texts'}), 400
+    if not is_safe_path_segment(folder):
+        return jsonify({'error': 'Invalid folder name'}), 400
+    if len(texts) > BATCH_MAX_TEXTS:
+        return jsonify({'error': f'Too many texts (max {BATCH_MAX_TEXTS})'}), 400
+    if not all(isinstance(text, str) and text.strip() for text in texts):
+        return jsonify({'error': 'Texts must be non-empty strings'}), 400
+    if folder.startswith('P2') and question:
+        _write_part2_question(folder, question)
+
+    job_id = jobs.submit(
+        'generate_audio_batch',
+        lambda job_id: _run_audio_batch(job_id, folder, texts),
+        [{'filename': None, 'error': None} for _ in texts],
+        folder=folder,
+    )
+    return job_accepted(job_id, total=len(texts))
 
 @speaking_bp.route('/list_audio', methods=['GET'])
 def list_audio():
@@ -40,51 +111,27 @@ def list_audio():
         'Part3': [],
         '其他': []
     }
-    for folder in os.listdir(MOTHER_DIR):
-        folder_path = os.path.join(MOTHER_DIR, folder)
-        if os.path.isdir(folder_path) and not folder.startswith('.'):
-            files = [f for f in os.listdir(folder_path) if f.endswith('.mp3')]
-            if files:
-                files_info = []
-                for f in files:
-                    path = os.path.join(folder_path, f)
-                    ctime = os.path.getctime(path)
-                    # 读取 question（第一行）
-                    txt_path = os.path.join(folder_path, f.replace('.mp3', '.txt'))
-                    question = None
-                    if os.path.exists(txt_path):
-                        try:
-                            with open(txt_path, 'r', encoding='utf-8') as tf:
-                                question = tf.readline().strip()
-                        except Exception:
-                            question = None
-                    files_info.append({'name': f, 'ctime': ctime, 'question': question})
-                files_info.sort(key=lambda x: x['ctime'])
-                folder_time = files_info[0]['ctime']
-                folder_obj = {
-                    'folder': folder,
-                    'ctime': folder_time,
-                    'files': files_info
-                }
-                # 分类
-                if folder.startswith('P1'):
-                    categories['Part1'].append(folder_obj)
-                elif folder.startswith('P2'):
-                    # PART2 读取 question.txt
-                    question_file = os.path.join(folder_path, 'question.txt')
-                    question = None
-                    if os.path.exists(question_file):
-                        try:
-                            with open(question_file, 'r', encoding='utf-8') as qf:
-                                question = qf.read().strip()
-                        except Exception:
-                            question = None
-                    folder_obj['question'] = question
-                    categories['Part2'].append(folder_obj)
-                elif folder.startswith('P3'):
-                    categories['Part3'].append(folder_obj)
-                else:
-                    categories['其他'].append(folder_obj)
+    # 文件夹/音频信息来自内存目录索引，只在目录变化时重新扫描
+    for entry in audio_catalog.folders(MOTHER_DIR):
+        files_info = entry['files']
+        if files_info:
+            folder = entry['folder']
+            folder_obj = {
+                'folder': folder,
+                'ctime': files_info[0]['ctime'],
+                'files': files_info
+            }
+            # 分类
+            if folder.startswith('P1'):
+                categories['Part1'].append(folder_obj)
+            elif folder.startswith('P2'):
+                # PART2 附带 question.txt
+                folder_obj['question'] = entry['question']
+                categories['Part2'].append(folder_obj)
+            elif folder.startswith('P3'):
+                categories['Part3'].append(folder_obj)
+            else:
+                categories['其他'].append(folder_obj)
     # 各分类内按时间排序（最新在前）
     for cat in categories:
         categories[cat].sort(key=lambda x: x['ctime'], reverse=True)
@@ -92,22 +139,17 @@ def list_audio():
 
 @speaking_bp.route('/list_folders', methods=['GET'])
 def list_folders():
-    folders = []
-    for folder in os.listdir(MOTHER_DIR):
-        folder_path = os.path.join(MOTHER_DIR, folder)
-        if os.path.isdir(folder_path) and not folder.startswith('.'):
-            ctime = os.path.getctime(folder_path)
-            folders.append({'name': folder, 'ctime': ctime})
-    # 按创建时间升序排列
+    folders = audio_catalog.folders(MOTHER_DIR)
+    # 按创建时间排列（最新在前）
     folders.sort(key=lambda x: x['ctime'], reverse=True)
-    folder_names = [f['name'] for f in folders]
+    folder_names = [f['folder'] for f in folders]
     return jsonify({'folders': folder_names})
 
 @speaking_bp.route('/audio/<folder>/<filename>')
 def serve_audio(folder, filename):
     if not is_safe_path_segment(folder):
         return jsonify({'error': 'Invalid folder name'}), 400
-    return send_from_directory(os.path.join(MOTHER_DIR, folder), filename)
+    return send_media_from(os.path.join(MOTHER_DIR, folder), filename)
 
 @speaking_bp.route('/text/<folder>/<filename>')
 def get_text(folder, filename):
@@ -134,6 +176,7 @@ def delete_folder():
         return jsonify({'error': 'Folder not found'}), 404
     try:
         shutil.rmtree(folder_path)
+        audio_catalog.folder_changed(MOTHER_DIR, folder)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -156,6 +199,8 @@ def delete_audio():
         os.remove(audio_path)
         if os.path.exists(txt_path):
             os.remove(txt_path)
+        audio_manifest.remove_clip(folder_path, filename)
+        audio_catalog.folder_changed(MOTHER_DIR, folder)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -176,6 +221,7 @@ def set_part2_question():
     try:
         with open(question_file, 'w', encoding='utf-8') as f:
             f.write(question.strip())
+        audio_catalog.folder_changed(MOTHER_DIR, folder)
         return jsonify({'success': True})
     except Exception as e:
         return jsonify({'error': str(e)}), 500
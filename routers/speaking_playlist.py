@@ -1,30 +1,79 @@
-from flask import Blueprint, request, jsonify, send_file, send_from_directory
-import os, json
-from pydub import AudioSegment
-from core import MOTHER_DIR, COMBINED_DIR, is_safe_path_segment
+from flask import Blueprint, request, jsonify, send_file, Response
+import os, json, math, time, random, secrets, multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from core import MOTHER_DIR, COMBINED_DIR, concat_audio_files, is_safe_path_segment, require_auth, get_user_profile
+from utils import audio_catalog, audio_manifest, mp3
+from utils.json_store import file_lock, load_json, save_json_atomic
+from utils.media import send_media_from
+from utils import jobs
+from routers.jobs import job_accepted
 
 speaking_playlist_bp = Blueprint('speaking_playlist', __name__)
 
+COMBINED_GAP_SECONDS = 1.0  # 合集中段间静音
+
+def _combined_path(folder):
+    return os.path.join(COMBINED_DIR, f"{folder}.mp3")
+
+def _subtitles_path(folder):
+    return os.path.join(COMBINED_DIR, f"{folder}_subtitles.json")
+
+def _clip_fingerprint(clip):
+    """音频只会整体新增或删除，名称 + 大小 + 生成时间足以识别"""
+    return {'name': clip['name'], 'size': clip.get('size'), 'created': clip.get('created')}
+
+def playlist_status(folder, clips):
+    """合集相对文件夹当前音频的状态，返回 (状态, 现有字幕数据)。
+
+    missing：没有合集；fresh：与当前音频一致；appendable：只在末尾新增了音频，可追加到现有合集；
+    stale：有删除、重排或改动（或旧版合集没有来源记录），需要整体重建
+    """
+    if not os.path.exists(_combined_path(folder)):
+        return 'missing', None
+    data = load_json(_subtitles_path(folder), None)
+    sources = data.get('sources') if isinstance(data, dict) else None
+    if sources is None:
+        return 'stale', data
+    # 记录的帧数与文件不一致，或文件长度与 Info 帧记录的字节数不一致，
+    # 说明合集在上次记录后被改动过（如追加中途失败留下了孤立的帧）
+    frames = data.get('frames')
+    output_path = _combined_path(folder)
+    info = mp3.read_info(output_path)
+    if frames is not None and (info is None or info[1] != frames or os.path.getsize(output_path) != info[2]):
+        return 'stale', data
+    current = [_clip_fingerprint(clip) for clip in clips]
+    if current == sources:
+        return 'fresh', data
+    if frames is not None and len(current) > len(sources) and current[:len(sources)] == sources:
+        return 'appendable', data
+    return 'stale', data
+
 @speaking_playlist_bp.route('/combined')
 def combined_page():
     return send_file('templates/combined.html')
 
 @speaking_playlist_bp.route('/check_combined_audio')
 def check_combined_audio():
-    """检查哪些文件夹已经有合集音频"""
+    """检查哪些文件夹已经有合集音频，以及每个合集是否过期（status: fresh / appendable / stale）"""
     existing_folders = []
     if os.path.exists(COMBINED_DIR):
         for file in os.listdir(COMBINED_DIR):
             if file.endswith('.mp3'):
                 folder_name = file.replace('.mp3', '')
                 existing_folders.append(folder_name)
-    return jsonify({'folders': existing_folders})
+    statuses = {}
+    for folder in existing_folders:
+        clips = audio_manifest.folder_clips(os.path.join(MOTHER_DIR, folder))
+        statuses[folder], _ = playlist_status(folder, clips)
+    stale = [folder for folder, status in statuses.items() if status != 'fresh']
+    return jsonify({'folders': existing_folders, 'status': statuses, 'stale': stale})
 
 @speaking_playlist_bp.route('/generate_combined_audio', methods=['POST'])
 def generate_combined_audio():
-    """生成文件夹的合集音频"""
-    data = request.json
+    """排队生成文件夹的合集音频（合并在后台任务中进行）；force 为真时忽略现有合集整体重建"""
+    data = request.json or {}
     folder = data.get('folder')
+    force = bool(data.get('force'))
     if not folder:
         return jsonify({'error': 'Missing folder'}), 400
     if not is_safe_path_segment(folder):
@@ -34,94 +83,118 @@ def generate_combined_audio():
     if not os.path.exists(folder_path):
         return jsonify({'error': 'Folder not found'}), 404
 
-    # 获取文件夹中的所有mp3文件，按创建时间排序
-    mp3_files = [f for f in os.listdir(folder_path) if f.endswith('.mp3')]
-    if not mp3_files:
+    # 这里只用于尽早返回 404；任务执行时会在锁内重新读取片段列表
+    if not audio_manifest.folder_clips(folder_path):
         return jsonify({'error': 'No audio files found'}), 404
 
-    # 按创建时间排序
-    mp3_files.sort(key=lambda x: os.path.getctime(os.path.join(folder_path, x)))
+    job_id = jobs.submit(
+        'generate_combined_audio', lambda job_id: build_combined_audio(folder, force=force), folder=folder
+    )
+    return job_accepted(job_id)
 
-    try:
-        # 合并音频文件
-        combined_audio = None
-        silence = AudioSegment.silent(duration=1000)  # 1秒静音间隔
+def build_combined_audio(folder, force=False):
+    """合并文件夹内的音频为合集并生成字幕数据。
 
-        for mp3_file in mp3_files:
-            file_path = os.path.join(folder_path, mp3_file)
-            audio = AudioSegment.from_mp3(file_path)
+    片段列表在持有合集文件锁后才读取（按 manifest 记录的生成顺序，不依赖复制/恢复后会变的 ctime），
+    排队期间新增或删除的音频都会被计入。合集已是最新时不做任何事；只在末尾新增了音频时
+    把新音频追加到现有合集和字幕时间轴上；其余情况整体重建。返回值中 mode 为 unchanged / append / rebuild
+    """
+    folder_path = os.path.join(MOTHER_DIR, folder)
+    output_path = _combined_path(folder)
+    with file_lock(output_path):
+        clips = audio_manifest.folder_clips(folder_path)
+        if not clips:
+            raise ValueError('No audio files found')
+        status, existing = ('stale', None) if force else playlist_status(folder, clips)
+        if status == 'fresh':
+            return {'folder': folder, 'mode': 'unchanged'}
 
-            if combined_audio is None:
-                combined_audio = audio
+        if status == 'appendable':
+            new_clips = clips[len(existing['sources']):]
+            paths = [os.path.join(folder_path, clip['name']) for clip in new_clips]
+            try:
+                durations, gap = mp3.append_files(output_path, paths, gap=COMBINED_GAP_SECONDS)
+            except mp3.ConcatError as e:
+                print(f"合集 {folder} 无法追加，整体重建: {e}")
             else:
-                combined_audio = combined_audio + silence + audio
+                audio_catalog.combined_changed(COMBINED_DIR)
+                generate_subtitles_data(folder, clips, durations, gap, existing=existing)
+                return {'folder': folder, 'mode': 'append', 'appended': len(new_clips)}
 
-        # 保存合集音频
-        output_path = os.path.join(COMBINED_DIR, f"{folder}.mp3")
-        combined_audio.export(output_path, format="mp3")
+        paths = [os.path.join(folder_path, clip['name']) for clip in clips]
+        # 合并时顺带得到每段时长和实际静音间隔（按帧取整），字幕生成不再重复解码
+        durations, gap = concat_audio_files(paths, output_path, gap_ms=int(COMBINED_GAP_SECONDS * 1000))
+        audio_catalog.combined_changed(COMBINED_DIR)
 
         # 生成字幕数据文件
-        generate_subtitles_data(folder, mp3_files, combined_audio)
+        generate_subtitles_data(folder, clips, durations, gap)
+        return {'folder': folder, 'mode': 'rebuild'}
 
-        return jsonify({'success': True})
+def _folder_type(folder):
+    """判断文件夹类型"""
+    if folder.startswith('P1'):
+        return 'part1'
+    if folder.startswith('P2'):
+        return 'part2'
+    if folder.startswith('P3'):
+        return 'part3'
+    return 'other'
 
-    except Exception as e:
-        return jsonify({'error': str(e)}), 500
+def _clip_subtitle(folder_path, folder_type, mp3_file, start_time, duration):
+    """单个音频的字幕条目：文本取自同名 .txt"""
+    txt_file = mp3_file.replace('.mp3', '.txt')
+    txt_path = os.path.join(folder_path, txt_file)
+    text_content = ''
+    question_content = ''
 
-def generate_subtitles_data(folder, mp3_files, combined_audio):
-    """生成字幕数据"""
-    folder_path = os.path.join(MOTHER_DIR, folder)
-    subtitles = []
-    current_time = 0
+    if os.path.exists(txt_path):
+        with open(txt_path, 'r', encoding='utf-8') as f:
+            content = f.read().strip()
+            if folder_type in ['part1', 'part3']:
+                # Part1和Part3，第一行是问题，剩余是答案
+                lines = content.split('\n', 1)
+                if len(lines) >= 2:
+                    question_content = lines[0].strip()
+                    text_content = lines[1].strip()
+                else:
+                    text_content = content
+            else:
+                # Part2，整个内容都是答案
+                text_content = content
 
-    # 判断文件夹类型
-    folder_type = 'other'
-    if folder.startswith('P1'):
-        folder_type = 'part1'
-    elif folder.startswith('P2'):
-        folder_type = 'part2'
-    elif folder.startswith('P3'):
-        folder_type = 'part3'
+    subtitle_item = {
+        'startTime': start_time,
+        'endTime': start_time + duration,
+        'duration': duration,
+        'text': text_content,
+        'filename': mp3_file
+    }
+
+    if folder_type in ['part1', 'part3'] and question_content:
+        subtitle_item['question'] = question_content
+    return subtitle_item
 
-    silence_duration = 1  # 1秒静音间隔
+def generate_subtitles_data(folder, clips, durations=None, silence_duration=1, existing=None):
+    """生成字幕数据；时长优先用合并时得到的 durations，其次取 manifest（写入时解析 MP3 帧头），都缺失时才解码音频。
+    silence_duration 为段间静音秒数。existing 为追加前的字幕数据：只为其后新增的 clips 生成字幕并接在时间轴末尾，
+    此时 durations 只对应新增部分。同时记录来源音频指纹和合集帧数，用于判断合集是否过期"""
+    folder_path = os.path.join(MOTHER_DIR, folder)
+    subtitles = list(existing['subtitles']) if existing else []
+    start = len(subtitles)
+    current_time = subtitles[-1]['endTime'] + silence_duration if subtitles else 0
+    folder_type = _folder_type(folder)
 
-    for i, mp3_file in enumerate(mp3_files):
+    for i, clip in enumerate(clips[start:], start):
+        mp3_file = clip['name']
         # 获取音频时长
-        audio_path = os.path.join(folder_path, mp3_file)
-        audio = AudioSegment.from_mp3(audio_path)
-        duration = len(audio) / 1000.0  # 转换为秒
+        duration = durations[i - start] if durations else clip.get('duration')
+        if duration is None:
+            from pydub import AudioSegment
+            audio = AudioSegment.from_mp3(os.path.join(folder_path, mp3_file))
+            duration = len(audio) / 1000.0  # 转换为秒
 
         # 获取对应的文本内容
-        txt_file = mp3_file.replace('.mp3', '.txt')
-        txt_path = os.path.join(folder_path, txt_file)
-        text_content = ''
-        question_content = ''
-
-        if os.path.exists(txt_path):
-            with open(txt_path, 'r', encoding='utf-8') as f:
-                content = f.read().strip()
-                if folder_type in ['part1', 'part3']:
-                    # Part1和Part3，第一行是问题，剩余是答案
-                    lines = content.split('\n', 1)
-                    if len(lines) >= 2:
-                        question_content = lines[0].strip()
-                        text_content = lines[1].strip()
-                    else:
-                        text_content = content
-                else:
-                    # Part2，整个内容都是答案
-                    text_content = content
-
-        subtitle_item = {
-            'startTime': current_time,
-            'endTime': current_time + duration,
-            'duration': duration,
-            'text': text_content,
-            'filename': mp3_file
-        }
-
-        if folder_type in ['part1', 'part3'] and question_content:
-            subtitle_item['question'] = question_content
+        subtitle_item = _clip_subtitle(folder_path, folder_type, mp3_file, current_time, duration)
 
         # Part2需要添加问题
         if folder_type == 'part2' and i == 0:
@@ -135,20 +208,272 @@ def generate_subtitles_data(folder, mp3_files, combined_audio):
         current_time += duration + silence_duration
 
     # 保存字幕数据
+    info = mp3.read_info(_combined_path(folder))
     subtitles_data = {
         'type': folder_type,
         'folder': folder,
-        'subtitles': subtitles
+        'subtitles': subtitles,
+        'sources': [_clip_fingerprint(clip) for clip in clips],
+        'frames': info[1] if info else None
     }
+    save_json_atomic(_subtitles_path(folder), subtitles_data)
 
-    subtitles_path = os.path.join(COMBINED_DIR, f"{folder}_subtitles.json")
-    with open(subtitles_path, 'w', encoding='utf-8') as f:
-        json.dump(subtitles_data, f, ensure_ascii=False, indent=2)
+# ==================== 批量重建合集 ====================
+
+def _init_rebuild_worker(mother_dir, combined_dir):
+    """子进程初始化：沿用主进程的目录配置（spawn 方式启动的子进程会重新导入模块）"""
+    global MOTHER_DIR, COMBINED_DIR
+    MOTHER_DIR, COMBINED_DIR = mother_dir, combined_dir
+
+def rebuild_folder(folder, force=False):
+    """重建单个文件夹的合集（在子进程中执行），失败时返回 error 而不抛出"""
+    started = time.perf_counter()
+    try:
+        result = build_combined_audio(folder, force=force)
+    except Exception as e:
+        result = {'folder': folder, 'error': str(e)}
+    result['seconds'] = round(time.perf_counter() - started, 3)
+    return result
+
+def playlist_folders():
+    """所有含音频的口语文件夹"""
+    if not os.path.isdir(MOTHER_DIR):
+        return []
+    return sorted(
+        name for name in os.listdir(MOTHER_DIR)
+        if not name.startswith('.') and os.path.isdir(os.path.join(MOTHER_DIR, name))
+        and any(f.endswith('.mp3') for f in os.listdir(os.path.join(MOTHER_DIR, name)))
+    )
+
+def rebuild_playlists(folders=None, force=False, workers=None, on_result=None):
+    """用进程池并行重建多个文件夹的合集，已是最新的文件夹直接跳过。
+
+    每完成一个文件夹回调 on_result(folder, result)；返回汇总
+    {'total', 'rebuilt', 'appended', 'skipped', 'failed', 'errors', 'seconds', 'folders_per_second'}
+    """
+    started = time.perf_counter()
+    folders = playlist_folders() if folders is None else list(folders)
+    os.makedirs(COMBINED_DIR, exist_ok=True)
+    summary = {'total': len(folders), 'rebuilt': 0, 'appended': 0, 'skipped': 0, 'failed': 0, 'errors': {}}
+
+    def record(folder, result):
+        if 'error' in result:
+            summary['failed'] += 1
+            summary['errors'][folder] = result['error']
+        else:
+            key = {'rebuild': 'rebuilt', 'append': 'appended'}.get(result['mode'], 'skipped')
+            summary[key] += 1
+        if on_result:
+            on_result(folder, result)
+
+    # 先在主进程里筛掉已是最新的文件夹，不为它们启动任务
+    pending = []
+    for folder in folders:
+        clips = audio_manifest.folder_clips(os.path.join(MOTHER_DIR, folder))
+        if not force and clips and playlist_status(folder, clips)[0] == 'fresh':
+            record(folder, {'folder': folder, 'mode': 'unchanged', 'seconds': 0.0})
+        else:
+            pending.append(folder)
+
+    if pending:
+        workers = max(1, min(workers or os.cpu_count() or 1, len(pending)))
+        # spawn：web 进程里有其他线程，fork 不安全
+        with ProcessPoolExecutor(
+            max_workers=workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_rebuild_worker, initargs=(MOTHER_DIR, COMBINED_DIR)
+        ) as pool:
+            futures = {pool.submit(rebuild_folder, folder, force): folder for folder in pending}
+            for future in as_completed(futures):
+                folder = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:  # 子进程异常退出
+                    result = {'folder': folder, 'error': str(e)}
+                record(folder, result)
+        audio_catalog.combined_changed(COMBINED_DIR)
+
+    summary['seconds'] = round(time.perf_counter() - started, 3)
+    summary['folders_per_second'] = round(len(folders) / summary['seconds'], 2) if summary['seconds'] else None
+    return summary
+
+@speaking_playlist_bp.route('/api/admin/rebuild_playlists', methods=['POST'])
+@require_auth
+def rebuild_playlists_job():
+    """管理员：后台并行重建合集（folders 缺省为全部文件夹，force 为真时全部重建）"""
+    profile = get_user_profile(request.username) or {}
+    if profile.get('role') != 'admin':
+        return jsonify({'error': '需要管理员权限'}), 403
+    data = request.json or {}
+    folders = data.get('folders')
+    if folders is None:
+        folders = playlist_folders()
+    elif not isinstance(folders, list) or not all(isinstance(f, str) and is_safe_path_segment(f) for f in folders):
+        return jsonify({'error': 'Invalid folder name'}), 400
+    folders = list(dict.fromkeys(folders))
+    force = bool(data.get('force'))
+    workers = data.get('workers')
+    if workers is not None and (not isinstance(workers, int) or workers < 1):
+        return jsonify({'error': 'Invalid workers'}), 400
+
+    def run(job_id):
+        index = {folder: i for i, folder in enumerate(folders)}
+
+        def on_result(folder, result):
+            if 'error' in result:
+                jobs.update_item(job_id, index[folder], status='failed', error=result['error'])
+            else:
+                jobs.update_item(job_id, index[folder], status='done', mode=result['mode'], seconds=result['seconds'])
+
+        return rebuild_playlists(folders, force=force, workers=workers, on_result=on_result)
+
+    job_id = jobs.submit('rebuild_playlists', run, [{'folder': folder} for folder in folders])
+    return job_accepted(job_id, total=len(folders))
+
+# ==================== 虚拟播放列表 ====================
+# 不落盘的临时播放列表：按条件从音频目录选出片段，边读边按帧拼接输出；
+# 字幕时间轴由 manifest 中记录的时长计算，不解码音频。
+
+VIRTUAL_PLAYLIST_MAX_CLIPS = 500
+VIRTUAL_PLAYLIST_MAX_GAP = 5.0
+
+def _split_param(value):
+    return [item.strip() for item in (value or '').split(',') if item.strip()]
+
+def _selected_clip(entry, clip):
+    return {
+        'folder': entry['folder'], 'name': clip['name'], 'duration': clip['duration'],
+        'created': clip['ctime'], 'folder_question': entry['question'],
+    }
+
+def _select_clips(args):
+    """根据查询参数选出片段，返回 ([{folder, name, duration, created, folder_question}], 打乱用的 seed)，
+    参数不合法时抛出 ValueError。
+
+    clips=文件夹/文件名,...  按给定顺序；否则按 part（P1/P2/P3）、folders、since（最近几天）筛选全部片段；
+    shuffle=1 时按 seed 打乱（同一 seed 的音频流和字幕顺序一致），未给 seed 时随机生成一个并返回，
+    不打乱时 seed 为 None；limit 限制条数
+    """
+    catalog = {entry['folder']: entry for entry in audio_catalog.folders(MOTHER_DIR)}
+    refs = _split_param(args.get('clips'))
+    if refs:
+        selected = []
+        for ref in refs:
+            folder, _, name = ref.partition('/')
+            if not is_safe_path_segment(folder) or not is_safe_path_segment(name):
+                raise ValueError(f'Invalid clip: {ref}')
+            clip = next((f for f in catalog.get(folder, {}).get('files', []) if f['name'] == name), None)
+            if clip is None:
+                raise ValueError(f'Clip not found: {ref}')
+            selected.append(_selected_clip(catalog[folder], clip))
+    else:
+        part = args.get('part')
+        folders = set(_split_param(args.get('folders')))
+        since = None
+        if args.get('since'):
+            try:
+                days = float(args['since'])
+            except ValueError:
+                raise ValueError('Invalid since')
+            if not math.isfinite(days) or days < 0:
+                raise ValueError('Invalid since')
+            since = time.time() - days * 86400
+        selected = []
+        for folder in sorted(catalog):
+            if part and not folder.startswith(part):
+                continue
+            if folders and folder not in folders:
+                continue
+            for clip in catalog[folder]['files']:
+                if since is None or clip['ctime'] >= since:
+                    selected.append(_selected_clip(catalog[folder], clip))
+
+    seed = None
+    if args.get('shuffle') in ('1', 'true'):
+        seed = args.get('seed') or secrets.token_hex(4)
+        random.Random(seed).shuffle(selected)
+    limit = VIRTUAL_PLAYLIST_MAX_CLIPS
+    if args.get('limit'):
+        try:
+            limit = int(args['limit'])
+        except ValueError:
+            raise ValueError('Invalid limit')
+        if limit < 1:
+            raise ValueError('limit must be at least 1')
+    return selected[:min(limit, VIRTUAL_PLAYLIST_MAX_CLIPS)], seed
+
+def virtual_playlist(args):
+    """解析查询参数，返回 (可拼接的片段列表, 实际静音秒数, 打乱用的 seed)。
+
+    没有记录时长或格式与第一个片段不同的片段无法按帧拼接，音频流和字幕中都会跳过
+    """
+    try:
+        gap = float(args.get('gap', 1))
+    except ValueError:
+        raise ValueError('Invalid gap')
+    if not 0 <= gap <= VIRTUAL_PLAYLIST_MAX_GAP:
+        raise ValueError(f'gap must be between 0 and {VIRTUAL_PLAYLIST_MAX_GAP}')
+
+    playable = []
+    first_header = None
+    selected, seed = _select_clips(args)
+    for clip in selected:
+        if clip['duration'] is None:
+            continue
+        clip['path'] = os.path.join(MOTHER_DIR, clip['folder'], clip['name'])
+        header = mp3.probe(clip['path'])
+        if header is None:
+            continue
+        if first_header is None:
+            first_header = header
+        elif not mp3.same_format(header, first_header):
+            continue
+        playable.append(clip)
+    return playable, (mp3.gap_seconds(first_header, gap) if first_header else gap), seed
+
+@speaking_playlist_bp.route('/playlist/stream')
+def stream_playlist():
+    """按查询条件即时拼接并流式输出 MP3（不生成合集文件）；打乱时在 X-Playlist-Seed 中返回 seed，
+    用同一 seed 请求 /playlist/subtitles 即可得到对应的时间轴"""
+    try:
+        clips, gap, seed = virtual_playlist(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not clips:
+        return jsonify({'error': 'No audio files found'}), 404
+    chunks = mp3.iter_concat([clip['path'] for clip in clips], gap=gap)
+    headers = {'Cache-Control': 'no-store'}
+    if seed is not None:
+        headers['X-Playlist-Seed'] = seed
+    return Response(chunks, mimetype='audio/mpeg', headers=headers)
+
+@speaking_playlist_bp.route('/playlist/subtitles')
+def playlist_subtitles():
+    """与 /playlist/stream 相同查询条件对应的字幕时间轴（打乱时附带所用 seed）"""
+    try:
+        clips, gap, seed = virtual_playlist(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    subtitles = []
+    current_time = 0
+    previous_folder = None
+    for clip in clips:
+        folder_path = os.path.join(MOTHER_DIR, clip['folder'])
+        folder_type = _folder_type(clip['folder'])
+        item = _clip_subtitle(folder_path, folder_type, clip['name'], current_time, clip['duration'])
+        item['folder'] = clip['folder']
+        # Part2 在每段连续的同一话题开头显示问题
+        if folder_type == 'part2' and clip['folder'] != previous_folder and clip['folder_question']:
+            item['question'] = clip['folder_question']
+        subtitles.append(item)
+        previous_folder = clip['folder']
+        current_time += clip['duration'] + gap
+    return jsonify({'success': True, 'type': 'playlist', 'gap': gap, 'seed': seed, 'subtitles': subtitles})
 
 @speaking_playlist_bp.route('/combined_audio/<folder>')
 def serve_combined_audio(folder):
-    """提供合集音频文件"""
-    return send_from_directory(COMBINED_DIR, f"{folder}.mp3")
+    """提供合集音频文件（支持 Range 拖动进度）"""
+    return send_media_from(COMBINED_DIR, f"{folder}.mp3")
 
 @speaking_playlist_bp.route('/get_subtitles/<folder>')
 def get_subtitles(folder):
@@ -3,13 +3,21 @@ import os, json, uuid
 from datetime import datetime
 
 from core import STUDY_TECHNIQUES_DIR, STUDY_TECHNIQUES_DATA_DIR, STUDY_TECHNIQUES_AUDIO_DIR, verify_token_from_request
+from utils.json_store import file_lock, save_json_atomic
 
 study_tips_bp = Blueprint('study_tips', __name__)
 
 
+def _study_data_path(category, data_type):
+    return os.path.join(STUDY_TECHNIQUES_DATA_DIR, f'{category}_{data_type}.json')
+
+def study_data_lock(category, data_type):
+    """学习技巧数据的文件锁；读取-修改-保存必须在锁内完成（多进程安全）"""
+    return file_lock(_study_data_path(category, data_type))
+
 def load_study_data(category, data_type):
     """加载学习技巧数据"""
-    file_path = os.path.join(STUDY_TECHNIQUES_DATA_DIR, f'{category}_{data_type}.json')
+    file_path = _study_data_path(category, data_type)
     if os.path.exists(file_path):
         try:
             with open(file_path, 'r', encoding='utf-8') as f:
@@ -21,10 +29,9 @@ def load_study_data(category, data_type):
 
 def save_study_data(category, data_type, data):
     """保存学习技巧数据"""
-    file_path = os.path.join(STUDY_TECHNIQUES_DATA_DIR, f'{category}_{data_type}.json')
+    file_path = _study_data_path(category, data_type)
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        save_json_atomic(file_path, data)
         return True
     except Exception as e:
         print(f"Error saving {file_path}: {e}")
@@ -58,31 +65,32 @@ def update_synonym(category, item_id):
         if not synonyms:
             return jsonify({'error': 'At least one synonym is required'}), 400
 
-        # 加载现有数据
-        existing_data = load_study_data(category, 'synonyms')
-
-        # 查找并更新条目
-        updated = False
-        for item in existing_data:
-            if item.get('id') == item_id:
-                item['synonyms'] = synonyms
-                if title is not None:
-                    if title:
-                        item['title'] = title
-                    elif 'title' in item:
-                        del item['title']
-                item['updated_at'] = datetime.now().isoformat()
-                updated = True
-                break
-
-        if not updated:
-            return jsonify({'error': 'Item not found'}), 404
-
-        # 保存数据
-        if save_study_data(category, 'synonyms', existing_data):
-            return jsonify({'success': True})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+        with study_data_lock(category, 'synonyms'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'synonyms')
+
+            # 查找并更新条目
+            updated = False
+            for item in existing_data:
+                if item.get('id') == item_id:
+                    item['synonyms'] = synonyms
+                    if title is not None:
+                        if title:
+                            item['title'] = title
+                        elif 'title' in item:
+                            del item['title']
+                    item['updated_at'] = datetime.now().isoformat()
+                    updated = True
+                    break
+
+            if not updated:
+                return jsonify({'error': 'Item not found'}), 404
+
+            # 保存数据
+            if save_study_data(category, 'synonyms', existing_data):
+                return jsonify({'success': True})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error updating synonym: {e}")
@@ -102,23 +110,24 @@ def delete_synonym(category, item_id):
         return jsonify({'error': 'Invalid category'}), 400
 
     try:
-        # 加载现有数据
-        existing_data = load_study_data(category, 'synonyms')
-        print(f"Loaded {len(existing_data)} synonyms for category {category}")  # 添加调试信息
+        with study_data_lock(category, 'synonyms'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'synonyms')
+            print(f"Loaded {len(existing_data)} synonyms for category {category}")  # 添加调试信息
 
-        # 查找并删除条目
-        updated_data = [item for item in existing_data if item.get('id') != item_id]
+            # 查找并删除条目
+            updated_data = [item for item in existing_data if item.get('id') != item_id]
 
-        if len(updated_data) == len(existing_data):
-            print(f"Item not found for DELETE: {item_id}")  # 添加调试信息
-            return jsonify({'error': 'Item not found'}), 404
+            if len(updated_data) == len(existing_data):
+                print(f"Item not found for DELETE: {item_id}")  # 添加调试信息
+                return jsonify({'error': 'Item not found'}), 404
 
-        # 保存数据
-        if save_study_data(category, 'synonyms', updated_data):
-            print(f"Successfully deleted synonym: {item_id}")  # 添加调试信息
-            return jsonify({'success': True})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+            # 保存数据
+            if save_study_data(category, 'synonyms', updated_data):
+                print(f"Successfully deleted synonym: {item_id}")  # 添加调试信息
+                return jsonify({'success': True})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error deleting synonym: {e}")
@@ -153,27 +162,28 @@ def add_synonym(category):
         if not synonyms:
             return jsonify({'error': 'At least one synonym is required'}), 400
 
-        # 加载现有数据
-        existing_data = load_study_data(category, 'synonyms')
+        with study_data_lock(category, 'synonyms'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'synonyms')
 
-        # 创建新条目
-        new_entry = {
-            'id': generate_id(),
-            'synonyms': synonyms,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
+            # 创建新条目
+            new_entry = {
+                'id': generate_id(),
+                'synonyms': synonyms,
+                'created_at': datetime.now().isoformat(),
+                'updated_at': datetime.now().isoformat()
+            }
 
-        if title:
-            new_entry['title'] = title
+            if title:
+                new_entry['title'] = title
 
-        existing_data.append(new_entry)
+            existing_data.append(new_entry)
 
-        # 保存数据
-        if save_study_data(category, 'synonyms', existing_data):
-            return jsonify({'success': True, 'id': new_entry['id']})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+            # 保存数据
+            if save_study_data(category, 'synonyms', existing_data):
+                return jsonify({'success': True, 'id': new_entry['id']})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error adding synonym: {e}")
@@ -198,32 +208,33 @@ def update_hypernym(category, item_id):
         if not upper_words and not lower_words:
             return jsonify({'error': 'At least one upper or lower word is required'}), 400
 
-        # 加载现有数据
-        existing_data = load_study_data(category, 'hypernyms')
-
-        # 查找并更新条目
-        updated = False
-        for item in existing_data:
-            if item.get('id') == item_id:
-                item['upper_words'] = upper_words
-                item['lower_words'] = lower_words
-                if title is not None:
-                    if title:
-                        item['title'] = title
-                    elif 'title' in item:
-                        del item['title']
-                item['updated_at'] = datetime.now().isoformat()
-                updated = True
-                break
-
-        if not updated:
-            return jsonify({'error': 'Item not found'}), 404
-
-        # 保存数据
-        if save_study_data(category, 'hypernyms', existing_data):
-            return jsonify({'success': True})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+        with study_data_lock(category, 'hypernyms'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'hypernyms')
+
+            # 查找并更新条目
+            updated = False
+            for item in existing_data:
+                if item.get('id') == item_id:
+                    item['upper_words'] = upper_words
+                    item['lower_words'] = lower_words
+                    if title is not None:
+                        if title:
+                            item['title'] = title
+                        elif 'title' in item:
+                            del item['title']
+                    item['updated_at'] = datetime.now().isoformat()
+                    updated = True
+                    break
+
+            if not updated:
+                return jsonify({'error': 'Item not found'}), 404
+
+            # 保存数据
+            if save_study_data(category, 'hypernyms', existing_data):
+                return jsonify({'success': True})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error updating hypernym: {e}")
@@ -243,23 +254,24 @@ def delete_hypernym(category, item_id):
         return jsonify({'error': 'Invalid category'}), 400
 
     try:
-        # 加载现有数据
-        existing_data = load_study_data(category, 'hypernyms')
-        print(f"Loaded {len(existing_data)} hypernyms for category {category}")  # 添加调试信息
+        with study_data_lock(category, 'hypernyms'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'hypernyms')
+            print(f"Loaded {len(existing_data)} hypernyms for category {category}")  # 添加调试信息
 
-        # 查找并删除条目
-        updated_data = [item for item in existing_data if item.get('id') != item_id]
+            # 查找并删除条目
+            updated_data = [item for item in existing_data if item.get('id') != item_id]
 
-        if len(updated_data) == len(existing_data):
-            print(f"Item not found for DELETE: {item_id}")  # 添加调试信息
-            return jsonify({'error': 'Item not found'}), 404
+            if len(updated_data) == len(existing_data):
+                print(f"Item not found for DELETE: {item_id}")  # 添加调试信息
+                return jsonify({'error': 'Item not found'}), 404
 
-        # 保存数据
-        if save_study_data(category, 'hypernyms', updated_data):
-            print(f"Successfully deleted hypernym: {item_id}")  # 添加调试信息
-            return jsonify({'success': True})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+            # 保存数据
+            if save_study_data(category, 'hypernyms', updated_data):
+                print(f"Successfully deleted hypernym: {item_id}")  # 添加调试信息
+                return jsonify({'success': True})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error deleting hypernym: {e}")
@@ -295,28 +307,29 @@ def add_hypernym(category):
         if not upper_words and not lower_words:
             return jsonify({'error': 'At least one upper or lower word is required'}), 400
 
-        # 加载现有数据
-        existing_data = load_study_data(category, 'hypernyms')
+        with study_data_lock(category, 'hypernyms'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'hypernyms')
 
-        # 创建新条目
-        new_entry = {
-            'id': generate_id(),
-            'upper_words': upper_words,
-            'lower_words': lower_words,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
+            # 创建新条目
+            new_entry = {
+                'id': generate_id(),
+                'upper_words': upper_words,
+                'lower_words': lower_words,
+                'created_at': datetime.now().isoformat(),
+                'updated_at': datetime.now().isoformat()
+            }
 
-        if title:
-            new_entry['title'] = title
+            if title:
+                new_entry['title'] = title
 
-        existing_data.append(new_entry)
+            existing_data.append(new_entry)
 
-        # 保存数据
-        if save_study_data(category, 'hypernyms', existing_data):
-            return jsonify({'success': True, 'id': new_entry['id']})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+            # 保存数据
+            if save_study_data(category, 'hypernyms', existing_data):
+                return jsonify({'success': True, 'id': new_entry['id']})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error adding hypernym: {e}")
@@ -340,27 +353,28 @@ def update_technique(category, item_id):
         if not title or not content:
             return jsonify({'error': 'Title and content are required'}), 400
 
-        # 加载现有数据
-        existing_data = load_study_data(category, 'techniques')
-
-        # 查找并更新条目
-        updated = False
-        for item in existing_data:
-            if item.get('id') == item_id:
-                item['title'] = title
-                item['content'] = content
-                item['updated_at'] = datetime.now().isoformat()
-                updated = True
-                break
-
-        if not updated:
-            return jsonify({'error': 'Item not found'}), 404
-
-        # 保存数据
-        if save_study_data(category, 'techniques', existing_data):
-            return jsonify({'success': True})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+        with study_data_lock(category, 'techniques'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'techniques')
+
+            # 查找并更新条目
+            updated = False
+            for item in existing_data:
+                if item.get('id') == item_id:
+                    item['title'] = title
+                    item['content'] = content
+                    item['updated_at'] = datetime.now().isoformat()
+                    updated = True
+                    break
+
+            if not updated:
+                return jsonify({'error': 'Item not found'}), 404
+
+            # 保存数据
+            if save_study_data(category, 'techniques', existing_data):
+                return jsonify({'success': True})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error updating technique: {e}")
@@ -380,23 +394,24 @@ def delete_technique(category, item_id):
         return jsonify({'error': 'Invalid category'}), 400
 
     try:
-        # 加载现有数据
-        existing_data = load_study_data(category, 'techniques')
-        print(f"Loaded {len(existing_data)} techniques for category {category}")  # 添加调试信息
+        with study_data_lock(category, 'techniques'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'techniques')
+            print(f"Loaded {len(existing_data)} techniques for category {category}")  # 添加调试信息
 
-        # 查找并删除条目
-        updated_data = [item for item in existing_data if item.get('id') != item_id]
+            # 查找并删除条目
+            updated_data = [item for item in existing_data if item.get('id') != item_id]
 
-        if len(updated_data) == len(existing_data):
-            print(f"Item not found for DELETE: {item_id}")  # 添加调试信息
-            return jsonify({'error': 'Item not found'}), 404
+            if len(updated_data) == len(existing_data):
+                print(f"Item not found for DELETE: {item_id}")  # 添加调试信息
+                return jsonify({'error': 'Item not found'}), 404
 
-        # 保存数据
-        if save_study_data(category, 'techniques', updated_data):
-            print(f"Successfully deleted technique: {item_id}")  # 添加调试信息
-            return jsonify({'success': True})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+            # 保存数据
+            if save_study_data(category, 'techniques', updated_data):
+                print(f"Successfully deleted technique: {item_id}")  # 添加调试信息
+                return jsonify({'success': True})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error deleting technique: {e}")
@@ -431,25 +446,26 @@ def add_technique(category):
         if not title or not content:
             return jsonify({'error': 'Title and content are required'}), 400
 
-        # 加载现有数据
-        existing_data = load_study_data(category, 'techniques')
-
-        # 创建新条目
-        new_entry = {
-            'id': generate_id(),
-            'title': title,
-            'content': content,
-            'created_at': datetime.now().isoformat(),
-            'updated_at': datetime.now().isoformat()
-        }
-
-        existing_data.append(new_entry)
-
-        # 保存数据
-        if save_study_data(category, 'techniques', existing_data):
-            return jsonify({'success': True, 'id': new_entry['id']})
-        else:
-            return jsonify({'error': 'Failed to save data'}), 500
+        with study_data_lock(category, 'techniques'):
+            # 加载现有数据
+            existing_data = load_study_data(category, 'techniques')
+
+            # 创建新条目
+            new_entry = {
+                'id': generate_id(),
+                'title': title,
+                'content': content,
+                'created_at': datetime.now().isoformat(),
+                'updated_at': datetime.now().isoformat()
+            }
+
+            existing_data.append(new_entry)
+
+            # 保存数据
+            if save_study_data(category, 'techniques', existing_data):
+                return jsonify({'success': True, 'id': new_entry['id']})
+            else:
+                return jsonify({'error': 'Failed to save data'}), 500
 
     except Exception as e:
         print(f"Error adding technique: {e}")
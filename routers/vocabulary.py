@@ -1,12 +1,16 @@
 from flask import Blueprint, request, jsonify, send_file, send_from_directory
-import os, json, uuid, threading, time, requests
+import os, json, uuid, threading, time
+from contextlib import contextmanager
 from datetime import datetime
 from werkzeug.utils import secure_filename
 
 from core import (
     VOCABULARY_BOOK_DIR, VOCABULARY_CATEGORIES_DIR, VOCABULARY_AUDIO_DIR,
-    VOCABULARY_TASKS_DIR, VOCABULARY_CHALLENGE_DIR, generate_tts
+    VOCABULARY_TASKS_DIR, VOCABULARY_CHALLENGE_DIR, generate_tts,
+    link_tts_alias, synthesize_many, open_collection
 )
+from utils.json_store import JsonTransaction, file_lock, load_json, save_json_atomic, try_lock
+from utils.media import send_media_from
 
 vocabulary_bp = Blueprint('vocabulary', __name__)
 
@@ -15,26 +19,24 @@ vocabulary_bp = Blueprint('vocabulary', __name__)
 def load_category_data(category):
     """加载单个分类的数据"""
     category_file = os.path.join(VOCABULARY_CATEGORIES_DIR, f'{category}.json')
-    if os.path.exists(category_file):
+    # 读缓存返回的是副本，调用方可以直接修改
+    data = load_json(category_file, None, cached=True)
+    if isinstance(data, dict):
         try:
-            with open(category_file, 'r', encoding='utf-8') as f:
-                data = json.load(f)
-
-                # 数据迁移：为现有单词添加 is_favorited 字段
-                updated = False
-                for subcategory_id in data['subcategories']:
-                    for word in data['subcategories'][subcategory_id]['words']:
-                        if 'is_favorited' not in word:
-                            word['is_favorited'] = False
-                            updated = True
-
-                # 如果有更新，直接保存数据（避免递归调用）
-                if updated:
-                    data['metadata']['last_updated'] = datetime.now().isoformat()
-                    with open(category_file, 'w', encoding='utf-8') as f:
-                        json.dump(data, f, ensure_ascii=False, indent=2)
-
-                return data
+            # 数据迁移：为现有单词添加 is_favorited 字段
+            updated = False
+            for subcategory_id in data['subcategories']:
+                for word in data['subcategories'][subcategory_id]['words']:
+                    if 'is_favorited' not in word:
+                        word['is_favorited'] = False
+                        updated = True
+
+            # 如果有更新，直接保存数据（避免递归调用）
+            if updated:
+                data['metadata']['last_updated'] = datetime.now().isoformat()
+                save_json_atomic(category_file, data)
+
+            return data
         except:
             pass
 
@@ -60,8 +62,17 @@ def save_category_data(category, data):
     """保存单个分类的数据"""
     category_file = os.path.join(VOCABULARY_CATEGORIES_DIR, f'{category}.json')
     data['metadata']['last_updated'] = datetime.now().isoformat()
-    with open(category_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(category_file, data)
+
+@contextmanager
+def category_transaction(category):
+    """在文件锁内加载分类数据，正常退出时保存（多进程安全）；调用 txn.abort() 放弃写入"""
+    category_file = os.path.join(VOCABULARY_CATEGORIES_DIR, f'{category}.json')
+    with file_lock(category_file):
+        txn = JsonTransaction(category_file, load_category_data(category))
+        yield txn
+        if not txn.aborted:
+            save_category_data(category, txn.data)
 
 def load_vocabulary_data():
     """加载完整的词汇数据（兼容旧接口）"""
@@ -83,6 +94,10 @@ def save_vocabulary_data(vocab_data):
     for category, data in vocab_data['categories'].items():
         save_category_data(category, data)
 
+def audio_tasks_collection():
+    """音频生成任务队列（json 后端为每任务一个文件）"""
+    return open_collection('vocabulary_tasks', VOCABULARY_TASKS_DIR, layout='dir')
+
 def add_audio_task(word_id, word, category, subcategory_id):
     """添加音频生成任务到持久化队列"""
     task = {
@@ -97,9 +112,7 @@ def add_audio_task(word_id, word, category, subcategory_id):
         'max_attempts': 3
     }
 
-    task_file = os.path.join(VOCABULARY_TASKS_DIR, f'{task["id"]}.json')
-    with open(task_file, 'w', encoding='utf-8') as f:
-        json.dump(task, f, ensure_ascii=False, indent=2)
+    audio_tasks_collection().insert(task)
 
     return task['id']
 
@@ -108,21 +121,11 @@ def get_pending_audio_tasks():
     除 pending 外，也回收 failed（未达最大重试次数，等待重试）
     和 processing（进程崩溃/重启遗留的孤儿任务）状态的任务，
     否则失败任务永远不会被重试。"""
-    tasks = []
-    if not os.path.exists(VOCABULARY_TASKS_DIR):
-        return tasks
-
     RETRYABLE_STATUSES = {'pending', 'failed', 'processing'}
-    for filename in os.listdir(VOCABULARY_TASKS_DIR):
-        if filename.endswith('.json'):
-            try:
-                task_file = os.path.join(VOCABULARY_TASKS_DIR, filename)
-                with open(task_file, 'r', encoding='utf-8') as f:
-                    task = json.load(f)
-                    if task['status'] in RETRYABLE_STATUSES and task['attempts'] < task['max_attempts']:
-                        tasks.append(task)
-            except:
-                continue
+    tasks = [
+        task for task in audio_tasks_collection().all()
+        if task.get('status') in RETRYABLE_STATUSES and task.get('attempts', 0) < task.get('max_attempts', 3)
+    ]
 
     # 按创建时间排序
     tasks.sort(key=lambda x: x['created_at'])
@@ -130,117 +133,119 @@ def get_pending_audio_tasks():
 
 def update_audio_task_status(task_id, status, error_msg=None):
     """更新音频任务状态"""
-    task_file = os.path.join(VOCABULARY_TASKS_DIR, f'{task_id}.json')
-    if os.path.exists(task_file):
-        try:
-            with open(task_file, 'r', encoding='utf-8') as f:
-                task = json.load(f)
-
-            task['status'] = status
-            task['last_updated'] = datetime.now().isoformat()
-
-            if status == 'failed':
-                task['attempts'] += 1
-                task['error'] = error_msg
-                if task['attempts'] >= task['max_attempts']:
-                    task['status'] = 'max_attempts_reached'
+    def apply(task):
+        task['status'] = status
+        task['last_updated'] = datetime.now().isoformat()
 
-            with open(task_file, 'w', encoding='utf-8') as f:
-                json.dump(task, f, ensure_ascii=False, indent=2)
+        if status == 'failed':
+            task['attempts'] += 1
+            task['error'] = error_msg
+            if task['attempts'] >= task['max_attempts']:
+                task['status'] = 'max_attempts_reached'
 
-            # 如果任务完成或失败达到最大次数，删除任务文件
-            if status in ['completed', 'max_attempts_reached']:
-                os.remove(task_file)
-
-        except Exception as e:
-            print(f"更新任务状态失败: {e}")
-
-def generate_word_audio(word, word_id, category):
-    """为单词生成音频文件"""
     try:
-        # 使用现有的TTS API生成音频
-        api_key = os.getenv('DEER_API_KEY')
-        if not api_key:
-            return False
-
-        url = "https://api.deerapi.com/v1/audio/speech"
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": "tts-1",
-            "input": word,
-            "voice": "nova",
-            "response_format": "mp3"
-        }
+        tasks = audio_tasks_collection()
+        task = tasks.update(task_id, apply)
+
+        # 如果任务完成或失败达到最大次数，删除任务记录
+        if task is not None and status in ['completed', 'max_attempts_reached']:
+            tasks.delete(task_id)
 
-        response = requests.post(url, headers=headers, json=data)
-        if response.status_code == 200:
-            # 按分类存储音频文件
-            category_audio_dir = os.path.join(VOCABULARY_AUDIO_DIR, category)
-            audio_path = os.path.join(category_audio_dir, f"{word_id}.mp3")
-            with open(audio_path, 'wb') as f:
-                f.write(response.content)
-            return True
-        return False
     except Exception as e:
-        print(f"生成单词音频失败: {e}")
-        return False
+        print(f"更新任务状态失败: {e}")
+
+def word_audio_path(word_id, category):
+    """单词音频按分类存储：VOCABULARY_AUDIO_DIR/<category>/<word_id>.mp3"""
+    return os.path.join(VOCABULARY_AUDIO_DIR, category, f"{word_id}.mp3")
+
+AUDIO_TASK_BATCH_SIZE = 50  # 每轮最多处理的任务数
+
+def _mark_words_audio_generated(category, tasks):
+    """把一批已生成音频的单词在分类文件中标记为 audio_generated（每个分类只写一次）"""
+    with category_transaction(category) as txn:
+        category_data = txn.data
+        pending = {}
+        for task in tasks:
+            pending.setdefault(task['subcategory_id'], set()).add(task['word_id'])
+        for subcategory_id, word_ids in pending.items():
+            subcategory = category_data['subcategories'].get(subcategory_id)
+            if not subcategory:
+                continue
+            for word in subcategory['words']:
+                if word['id'] in word_ids:
+                    word['audio_generated'] = True
 
 def process_audio_tasks():
-    """处理音频生成任务队列"""
-    tasks = get_pending_audio_tasks()
+    """处理音频生成任务队列：整批交给 synthesize_many 并发合成，限速由批量引擎负责"""
+    tasks = get_pending_audio_tasks()[:AUDIO_TASK_BATCH_SIZE]
+    if not tasks:
+        return
 
-    for task in tasks[:5]:  # 每次最多处理5个任务
-        try:
-            # 更新任务状态为处理中
-            update_audio_task_status(task['id'], 'processing')
-
-            # 生成音频
-            success = generate_word_audio(task['word'], task['word_id'], task['category'])
-
-            if success:
-                # 更新数据库中的音频状态
-                category_data = load_category_data(task['category'])
-                if task['subcategory_id'] in category_data['subcategories']:
-                    for word in category_data['subcategories'][task['subcategory_id']]['words']:
-                        if word['id'] == task['word_id']:
-                            word['audio_generated'] = True
-                            break
-                    save_category_data(task['category'], category_data)
+    if not os.getenv('DEER_API_KEY'):
+        for task in tasks:
+            update_audio_task_status(task['id'], 'failed', '音频生成API调用失败')
+        return
 
-                # 标记任务完成
-                update_audio_task_status(task['id'], 'completed')
-                print(f"音频生成成功: {task['word']}")
-            else:
-                # 标记任务失败
-                update_audio_task_status(task['id'], 'failed', '音频生成API调用失败')
-                print(f"音频生成失败: {task['word']}")
+    for task in tasks:
+        # 更新任务状态为处理中
+        update_audio_task_status(task['id'], 'processing')
 
-            # 避免API限制
-            time.sleep(0.5)
+    results = synthesize_many([task['word'] for task in tasks])
 
+    completed = {}
+    for task, item in zip(tasks, results):
+        try:
+            if not item['ok']:
+                raise Exception(item['error'] or '音频生成API调用失败')
+            link_tts_alias(item['path'], word_audio_path(task['word_id'], task['category']))
+            completed.setdefault(task['category'], []).append(task)
         except Exception as e:
             update_audio_task_status(task['id'], 'failed', str(e))
-            print(f"处理音频任务失败: {e}")
+            print(f"音频生成失败: {task['word']}: {e}")
+
+    for category, category_tasks in completed.items():
+        try:
+            # 更新数据库中的音频状态
+            _mark_words_audio_generated(category, category_tasks)
+        except Exception as e:
+            print(f"更新单词音频状态失败: {e}")
+        for task in category_tasks:
+            # 标记任务完成
+            update_audio_task_status(task['id'], 'completed')
+            print(f"音频生成成功: {task['word']}")
 
 # 启动后台任务处理线程
-def start_audio_task_processor():
-    """启动音频任务处理器"""
-    def task_processor():
-        while True:
-            try:
-                process_audio_tasks()
-                time.sleep(10)  # 每10秒检查一次任务队列
-            except Exception as e:
-                print(f"音频任务处理器错误: {e}")
-                time.sleep(30)  # 发生错误时等待更长时间
+_processor_thread = None
+_processor_lock = threading.Lock()
 
-    processor_thread = threading.Thread(target=task_processor, daemon=True)
-    processor_thread.start()
+def start_audio_task_processor():
+    """启动音频任务处理器（幂等，每个进程只启动一个线程）"""
+    global _processor_thread
+    if _processor_thread is not None:
+        return
+    with _processor_lock:
+        if _processor_thread is not None:
+            return
+        _processor_thread = threading.Thread(target=_audio_task_loop, name='audio-task-processor', daemon=True)
+        _processor_thread.start()
     print("音频任务处理器已启动")
 
+def _audio_task_loop():
+    """后台循环处理音频任务队列。
+    多 worker 进程部署时每个进程都会启动该线程，但只有拿到处理锁的进程真正处理任务，
+    其余进程定期重试，持锁进程退出后自动接管。"""
+    owner = None
+    while True:
+        try:
+            if owner is None:
+                owner = try_lock(os.path.join(VOCABULARY_TASKS_DIR, '.processor.lock'))
+            if owner is not None:
+                process_audio_tasks()
+            time.sleep(10)  # 每10秒检查一次任务队列
+        except Exception as e:
+            print(f"音频任务处理器错误: {e}")
+            time.sleep(30)  # 发生错误时等待更长时间
+
 # ==================== 单词挑战相关 Helper Functions ====================
 
 def load_user_challenge_data(user_id):
@@ -272,8 +277,17 @@ def save_user_challenge_data(user_id, data):
     """保存用户的挑战数据"""
     user_file = os.path.join(VOCABULARY_CHALLENGE_DIR, f'{user_id}.json')
     data['metadata']['last_updated'] = datetime.now().isoformat()
-    with open(user_file, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(user_file, data)
+
+@contextmanager
+def user_challenge_transaction(user_id):
+    """在文件锁内加载用户挑战数据，正常退出时保存"""
+    user_file = os.path.join(VOCABULARY_CHALLENGE_DIR, f'{user_id}.json')
+    with file_lock(user_file):
+        txn = JsonTransaction(user_file, load_user_challenge_data(user_id))
+        yield txn
+        if not txn.aborted:
+            save_user_challenge_data(user_id, txn.data)
 
 def get_current_user_id():
     """获取当前用户ID从请求头中获取"""
@@ -356,24 +370,24 @@ def create_subcategory():
         if not name:
             return jsonify({'success': False, 'error': '子分类名称不能为空'}), 400
 
-        category_data = load_category_data(category)
-
-        # 检查子分类名称是否已存在
-        existing_names = [sub['name'] for sub in category_data['subcategories'].values()]
-        if name in existing_names:
-            return jsonify({'success': False, 'error': '子分类名称已存在'}), 400
+        with category_transaction(category) as txn:
+            category_data = txn.data
 
-        # 生成唯一ID
-        subcategory_id = str(uuid.uuid4())
+            # 检查子分类名称是否已存在
+            existing_names = [sub['name'] for sub in category_data['subcategories'].values()]
+            if name in existing_names:
+                txn.abort()
+                return jsonify({'success': False, 'error': '子分类名称已存在'}), 400
 
-        # 创建子分类
-        category_data['subcategories'][subcategory_id] = {
-            'name': name,
-            'created_at': datetime.now().isoformat(),
-            'words': []
-        }
+            # 生成唯一ID
+            subcategory_id = str(uuid.uuid4())
 
-        save_category_data(category, category_data)
+            # 创建子分类
+            category_data['subcategories'][subcategory_id] = {
+                'name': name,
+                'created_at': datetime.now().isoformat(),
+                'words': []
+            }
 
         return jsonify({
             'success': True,
@@ -400,19 +414,21 @@ def update_subcategory(category, subcategory_id):
         if not new_name:
             return jsonify({'success': False, 'error': '子分类名称不能为空'}), 400
 
-        category_data = load_category_data(category)
+        with category_transaction(category) as txn:
+            category_data = txn.data
 
-        if subcategory_id not in category_data['subcategories']:
-            return jsonify({'success': False, 'error': '子分类不存在'}), 404
+            if subcategory_id not in category_data['subcategories']:
+                txn.abort()
+                return jsonify({'success': False, 'error': '子分类不存在'}), 404
 
-        # 检查新名称是否与其他子分类重复
-        existing_names = [sub['name'] for sub_id, sub in category_data['subcategories'].items() if sub_id != subcategory_id]
-        if new_name in existing_names:
-            return jsonify({'success': False, 'error': '子分类名称已存在'}), 400
+            # 检查新名称是否与其他子分类重复
+            existing_names = [sub['name'] for sub_id, sub in category_data['subcategories'].items() if sub_id != subcategory_id]
+            if new_name in existing_names:
+                txn.abort()
+                return jsonify({'success': False, 'error': '子分类名称已存在'}), 400
 
-        # 更新名称
-        category_data['subcategories'][subcategory_id]['name'] = new_name
-        save_category_data(category, category_data)
+            # 更新名称
+            category_data['subcategories'][subcategory_id]['name'] = new_name
 
         return jsonify({'success': True, 'message': '子分类名称更新成功'})
     except Exception as e:
@@ -425,40 +441,33 @@ def delete_subcategory(category, subcategory_id):
         if category not in ['listening', 'speaking', 'reading', 'writing']:
             return jsonify({'success': False, 'error': '无效的分类'}), 400
 
-        category_data = load_category_data(category)
+        with category_transaction(category) as txn:
+            category_data = txn.data
 
-        if subcategory_id not in category_data['subcategories']:
-            return jsonify({'success': False, 'error': '子分类不存在'}), 404
+            if subcategory_id not in category_data['subcategories']:
+                txn.abort()
+                return jsonify({'success': False, 'error': '子分类不存在'}), 404
 
-        # 检查是否是最后一个子分类（至少保留一个）
-        if len(category_data['subcategories']) <= 1:
-            return jsonify({'success': False, 'error': '至少需要保留一个子分类'}), 400
+            # 检查是否是最后一个子分类（至少保留一个）
+            if len(category_data['subcategories']) <= 1:
+                txn.abort()
+                return jsonify({'success': False, 'error': '至少需要保留一个子分类'}), 400
 
-        # 删除子分类中所有单词的音频文件
-        words = category_data['subcategories'][subcategory_id]['words']
-        category_audio_dir = os.path.join(VOCABULARY_AUDIO_DIR, category)
+            # 删除子分类中所有单词的音频文件
+            words = category_data['subcategories'][subcategory_id]['words']
+            category_audio_dir = os.path.join(VOCABULARY_AUDIO_DIR, category)
 
-        for word in words:
-            # 删除音频文件
-            audio_path = os.path.join(category_audio_dir, f"{word['id']}.mp3")
-            if os.path.exists(audio_path):
-                os.remove(audio_path)
+            for word in words:
+                # 删除音频文件
+                audio_path = os.path.join(category_audio_dir, f"{word['id']}.mp3")
+                if os.path.exists(audio_path):
+                    os.remove(audio_path)
 
-            # 删除相关的音频生成任务
-            for task_file in os.listdir(VOCABULARY_TASKS_DIR):
-                if task_file.endswith('.json'):
-                    try:
-                        task_path = os.path.join(VOCABULARY_TASKS_DIR, task_file)
-                        with open(task_path, 'r', encoding='utf-8') as f:
-                            task = json.load(f)
-                        if task.get('word_id') == word['id']:
-                            os.remove(task_path)
-                    except:
-                        continue
+                # 删除相关的音频生成任务
+                audio_tasks_collection().delete_where('word_id', word['id'])
 
-        # 删除子分类
-        del category_data['subcategories'][subcategory_id]
-        save_category_data(category, category_data)
+            # 删除子分类
+            del category_data['subcategories'][subcategory_id]
 
         return jsonify({'success': True, 'message': '子分类删除成功'})
     except Exception as e:
@@ -480,34 +489,36 @@ def add_vocabulary_word():
         if not word:
             return jsonify({'success': False, 'error': '单词不能为空'}), 400
 
-        category_data = load_category_data(category)
-
-        # 检查子分类是否存在
-        if subcategory_id not in category_data['subcategories']:
-            return jsonify({'success': False, 'error': '子分类不存在'}), 400
-
-        # 检查是否已存在（仅在该子分类内判重）
-        subcategory_words = category_data['subcategories'][subcategory_id]['words']
-        for existing_word in subcategory_words:
-            if existing_word['word'].lower() == word.lower():
-                return jsonify({'success': False, 'error': '单词在该子分类中已存在'}), 400
-
-        # 生成唯一ID
-        word_id = str(uuid.uuid4())
-
-        # 创建单词对象
-        word_obj = {
-            'id': word_id,
-            'word': word,
-            'meaning': meaning,
-            'created_at': datetime.now().isoformat(),
-            'audio_generated': False,
-            'is_favorited': False  # 默认未收藏
-        }
+        with category_transaction(category) as txn:
+            category_data = txn.data
+
+            # 检查子分类是否存在
+            if subcategory_id not in category_data['subcategories']:
+                txn.abort()
+                return jsonify({'success': False, 'error': '子分类不存在'}), 400
+
+            # 检查是否已存在（仅在该子分类内判重）
+            subcategory_words = category_data['subcategories'][subcategory_id]['words']
+            for existing_word in subcategory_words:
+                if existing_word['word'].lower() == word.lower():
+                    txn.abort()
+                    return jsonify({'success': False, 'error': '单词在该子分类中已存在'}), 400
+
+            # 生成唯一ID
+            word_id = str(uuid.uuid4())
+
+            # 创建单词对象
+            word_obj = {
+                'id': word_id,
+                'word': word,
+                'meaning': meaning,
+                'created_at': datetime.now().isoformat(),
+                'audio_generated': False,
+                'is_favorited': False  # 默认未收藏
+            }
 
-        # 添加到对应子分类
-        category_data['subcategories'][subcategory_id]['words'].append(word_obj)
-        save_category_data(category, category_data)
+            # 添加到对应子分类
+            category_data['subcategories'][subcategory_id]['words'].append(word_obj)
 
         # 添加到音频生成任务队列
         add_audio_task(word_id, word, category, subcategory_id)
@@ -544,49 +555,49 @@ def upload_vocabulary_csv():
         content = file.read().decode('utf-8-sig')
         csv_reader = csv.reader(io.StringIO(content))
 
-        category_data = load_category_data(category)
-
-        # 检查子分类是否存在
-        if subcategory_id not in category_data['subcategories']:
-            return jsonify({'success': False, 'error': '子分类不存在'}), 400
+        with category_transaction(category) as txn:
+            category_data = txn.data
 
-        existing_words = {w['word'].lower() for w in category_data['subcategories'][subcategory_id]['words']}
+            # 检查子分类是否存在
+            if subcategory_id not in category_data['subcategories']:
+                txn.abort()
+                return jsonify({'success': False, 'error': '子分类不存在'}), 400
 
-        added_words = []
-        skipped_words = []
+            existing_words = {w['word'].lower() for w in category_data['subcategories'][subcategory_id]['words']}
 
-        for row in csv_reader:
-            if len(row) >= 2:
-                word = row[0].strip()
-                meaning = row[1].strip()
+            added_words = []
+            skipped_words = []
 
-                if not word:
-                    continue
+            for row in csv_reader:
+                if len(row) >= 2:
+                    word = row[0].strip()
+                    meaning = row[1].strip()
 
-                # 判重（仅在该子分类内）
-                if word.lower() in existing_words:
-                    skipped_words.append(word)
-                    continue
+                    if not word:
+                        continue
 
-                # 生成唯一ID
-                word_id = str(uuid.uuid4())
+                    # 判重（仅在该子分类内）
+                    if word.lower() in existing_words:
+                        skipped_words.append(word)
+                        continue
 
-                word_obj = {
-                    'id': word_id,
-                    'word': word,
-                    'meaning': meaning,
-                    'created_at': datetime.now().isoformat(),
-                    'audio_generated': False
-                }
+                    # 生成唯一ID
+                    word_id = str(uuid.uuid4())
 
-                category_data['subcategories'][subcategory_id]['words'].append(word_obj)
-                added_words.append(word_obj)
-                existing_words.add(word.lower())
+                    word_obj = {
+                        'id': word_id,
+                        'word': word,
+                        'meaning': meaning,
+                        'created_at': datetime.now().isoformat(),
+                        'audio_generated': False
+                    }
 
-                # 添加到音频生成任务队列
-                add_audio_task(word_id, word, category, subcategory_id)
+                    category_data['subcategories'][subcategory_id]['words'].append(word_obj)
+                    added_words.append(word_obj)
+                    existing_words.add(word.lower())
 
-        save_category_data(category, category_data)
+                    # 添加到音频生成任务队列
+                    add_audio_task(word_id, word, category, subcategory_id)
 
         return jsonify({
             'success': True,
@@ -604,22 +615,25 @@ def delete_vocabulary_word(word_id):
         deleted = False
         deleted_category = None
 
-        # 在所有分类和子分类中查找并删除
+        # 在所有分类和子分类中查找并删除（未找到的分类不写回）
         for category in ['listening', 'speaking', 'reading', 'writing']:
-            category_data = load_category_data(category)
+            with category_transaction(category) as txn:
+                category_data = txn.data
+
+                for subcategory_id in category_data['subcategories']:
+                    words = category_data['subcategories'][subcategory_id]['words']
+                    original_length = len(words)
+                    category_data['subcategories'][subcategory_id]['words'] = [
+                        w for w in words if w['id'] != word_id
+                    ]
+
+                    if len(category_data['subcategories'][subcategory_id]['words']) < original_length:
+                        deleted = True
+                        deleted_category = category
+                        break
 
-            for subcategory_id in category_data['subcategories']:
-                words = category_data['subcategories'][subcategory_id]['words']
-                original_length = len(words)
-                category_data['subcategories'][subcategory_id]['words'] = [
-                    w for w in words if w['id'] != word_id
-                ]
-
-                if len(category_data['subcategories'][subcategory_id]['words']) < original_length:
-                    deleted = True
-                    deleted_category = category
-                    save_category_data(category, category_data)
-                    break
+                if not deleted:
+                    txn.abort()
 
             if deleted:
                 break
@@ -635,17 +649,7 @@ def delete_vocabulary_word(word_id):
                 os.remove(audio_path)
 
         # 删除相关的音频生成任务
-        if os.path.exists(VOCABULARY_TASKS_DIR):
-            for task_file in os.listdir(VOCABULARY_TASKS_DIR):
-                if task_file.endswith('.json'):
-                    try:
-                        task_path = os.path.join(VOCABULARY_TASKS_DIR, task_file)
-                        with open(task_path, 'r', encoding='utf-8') as f:
-                            task = json.load(f)
-                        if task.get('word_id') == word_id:
-                            os.remove(task_path)
-                    except:
-                        continue
+        audio_tasks_collection().delete_where('word_id', word_id)
 
         return jsonify({'success': True})
     except Exception as e:
@@ -661,23 +665,26 @@ def toggle_word_favorite(word_id):
         found = False
         updated_word = None
 
-        # 在所有分类和子分类中查找并更新
+        # 在所有分类和子分类中查找并更新（未找到的分类不写回）
         for category in ['listening', 'speaking', 'reading', 'writing']:
-            category_data = load_category_data(category)
+            with category_transaction(category) as txn:
+                category_data = txn.data
 
-            for subcategory_id in category_data['subcategories']:
-                words = category_data['subcategories'][subcategory_id]['words']
-
-                for word in words:
-                    if word['id'] == word_id:
-                        word['is_favorited'] = is_favorited
-                        updated_word = word
-                        found = True
-                        save_category_data(category, category_data)
+                for subcategory_id in category_data['subcategories']:
+                    words = category_data['subcategories'][subcategory_id]['words']
+
+                    for word in words:
+                        if word['id'] == word_id:
+                            word['is_favorited'] = is_favorited
+                            updated_word = word
+                            found = True
+                            break
+
+                    if found:
                         break
 
-                if found:
-                    break
+                if not found:
+                    txn.abort()
 
             if found:
                 break
@@ -712,31 +719,28 @@ def record_challenge_result():
         category = data.get('category')
         subcategory_id = data.get('subcategory_id')
 
-        # 加载用户挑战数据
-        challenge_data = load_user_challenge_data(user_id)
-
-        # 更新单词覆盖率
-        for result in challenge_results:
-            word_id = result['word_id']
-            if word_id not in challenge_data['word_coverage']:
-                challenge_data['word_coverage'][word_id] = {
-                    'appear_count': 0,
-                    'last_appeared': None
-                }
-            challenge_data['word_coverage'][word_id]['appear_count'] += 1
-            challenge_data['word_coverage'][word_id]['last_appeared'] = datetime.now().isoformat()
-
-        # 更新挑战统计
-        total_questions = len(challenge_results)
-        correct_answers = sum(1 for r in challenge_results if r.get('is_correct', False))
-
-        challenge_data['challenge_stats']['total_challenges'] += 1
-        challenge_data['challenge_stats']['total_correct'] += correct_answers
-        challenge_data['challenge_stats']['total_questions'] += total_questions
-        challenge_data['challenge_stats']['last_challenge'] = datetime.now().isoformat()
-
-        # 保存数据
-        save_user_challenge_data(user_id, challenge_data)
+        # 在文件锁内加载并更新用户挑战数据
+        with user_challenge_transaction(user_id) as txn:
+            challenge_data = txn.data
+            # 更新单词覆盖率
+            for result in challenge_results:
+                word_id = result['word_id']
+                if word_id not in challenge_data['word_coverage']:
+                    challenge_data['word_coverage'][word_id] = {
+                        'appear_count': 0,
+                        'last_appeared': None
+                    }
+                challenge_data['word_coverage'][word_id]['appear_count'] += 1
+                challenge_data['word_coverage'][word_id]['last_appeared'] = datetime.now().isoformat()
+
+            # 更新挑战统计
+            total_questions = len(challenge_results)
+            correct_answers = sum(1 for r in challenge_results if r.get('is_correct', False))
+
+            challenge_data['challenge_stats']['total_challenges'] += 1
+            challenge_data['challenge_stats']['total_correct'] += correct_answers
+            challenge_data['challenge_stats']['total_questions'] += total_questions
+            challenge_data['challenge_stats']['last_challenge'] = datetime.now().isoformat()
 
         return jsonify({'success': True})
     except Exception as e:
@@ -751,7 +755,7 @@ def serve_vocabulary_audio(word_id):
             category_audio_dir = os.path.join(VOCABULARY_AUDIO_DIR, category)
             audio_path = os.path.join(category_audio_dir, f"{word_id}.mp3")
             if os.path.exists(audio_path):
-                return send_from_directory(category_audio_dir, f"{word_id}.mp3")
+                return send_media_from(category_audio_dir, f"{word_id}.mp3")
 
         return jsonify({'error': '音频文件不存在'}), 404
     except Exception as e:
@@ -6,10 +6,12 @@ import requests
 import uuid
 from datetime import datetime
 from flask import Blueprint, request, jsonify, send_file, send_from_directory
+from utils import http_client
+from utils.json_store import load_json, save_json_atomic, update_json, json_transaction
 from core import (
     WRITING_CORRECTION_DIR, WRITING_DATA_DIR, WRITING_MD_FILE,
     WRITING_SMALL_MD_FILE, WRITING_IMAGES_DIR, WRITING_CHAT_DIR,
-    is_token_valid, load_tokens, load_prompt
+    get_token_record, get_request_token, load_prompt, render_prompt, open_collection
 )
 
 writing_bp = Blueprint('writing', __name__)
@@ -20,6 +22,14 @@ writing_bp = Blueprint('writing', __name__)
 _writing_cache = None
 
 
+def _auth_username():
+    """校验 token 并返回用户名，未登录返回 None。"""
+    record = get_token_record(get_request_token())
+    if record is None:
+        return None
+    return record.get('username') or 'anonymous'
+
+
 def _parse_ai_json(content):
     """解析 AI 返回的 JSON，兼容常见异常格式。
 
@@ -400,18 +410,13 @@ def _parse_small_writing_md():
 _IMAGE_BINDINGS_FILE = os.path.join(WRITING_IMAGES_DIR, 'image_bindings.json')
 
 def _load_image_bindings():
-    if os.path.exists(_IMAGE_BINDINGS_FILE):
-        try:
-            with open(_IMAGE_BINDINGS_FILE, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except Exception:
-            return {}
-    return {}
+    return load_json(_IMAGE_BINDINGS_FILE, {})
 
 def _save_image_bindings(bindings):
-    os.makedirs(WRITING_IMAGES_DIR, exist_ok=True)
-    with open(_IMAGE_BINDINGS_FILE, 'w', encoding='utf-8') as f:
-        json.dump(bindings, f, ensure_ascii=False, indent=2)
+    save_json_atomic(_IMAGE_BINDINGS_FILE, bindings)
+
+def _update_image_bindings(fn):
+    return update_json(_IMAGE_BINDINGS_FILE, fn, {})
 
 
 # ===================== 小作文练习数据 =====================
@@ -419,16 +424,11 @@ def _save_image_bindings(bindings):
 def _small_practice_path(username):
     return os.path.join(WRITING_DATA_DIR, f'{username}_small_practice.json')
 
-def _load_small_practice(username):
-    p = _small_practice_path(username)
-    if os.path.exists(p):
-        with open(p, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+def _small_practice(username):
+    return open_collection(f'writing_small_practice/{username}', _small_practice_path(username))
 
-def _save_small_practice(username, data):
-    with open(_small_practice_path(username), 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def _load_small_practice(username):
+    return _small_practice(username).all()
 
 
 # ===================== 小作文 API 路由 =====================
@@ -482,8 +482,7 @@ def small_example_detail(type_idx, example_idx):
 
 @writing_bp.route('/api/writing/small/upload_image', methods=['POST'])
 def small_upload_image():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    if not _auth_username():
         return jsonify({'error': '未登录'}), 401
     if 'image' not in request.files:
         return jsonify({'error': '没有找到图片文件'}), 400
@@ -537,9 +536,7 @@ def small_upload_image():
     image_url = f'/api/writing/small/image/{question_id}/{save_name}'
 
     # 更新绑定
-    bindings = _load_image_bindings()
-    bindings[question_id] = image_url
-    _save_image_bindings(bindings)
+    _update_image_bindings(lambda bindings: bindings.update({question_id: image_url}))
 
     # 清除缓存使下次读取时能获取新图片路径
     global _small_writing_cache
@@ -566,7 +563,8 @@ def small_writing_correct():
         return jsonify({'error': '翻译内容不能为空'}), 400
 
     cfg = load_prompt('writing_small_correct')
-    user_prompt = cfg['user_prompt'].format(
+    user_prompt = render_prompt(
+        'writing_small_correct', 'user_prompt',
         question=question,
         target=target,
         reference=reference,
@@ -575,8 +573,8 @@ def small_writing_correct():
 
     try:
         api_key = os.getenv('DEER_API_KEY')
-        resp = requests.post(
-            cfg['api_url'],
+        resp = http_client.post(
+            'deerapi', cfg['api_url'], channel='deerapi_chat',
             headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
             json={
                 'model': cfg['model'],
@@ -602,15 +600,12 @@ def small_writing_correct():
 
 @writing_bp.route('/api/writing/small/save_practice', methods=['POST'])
 def small_save_practice():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     data = request.json or {}
     save_to_review = data.get('save_to_review', False)
 
-    records = _load_small_practice(username)
     record = {
         'id': str(uuid.uuid4()),
         'timestamp': datetime.now().isoformat(),
@@ -627,18 +622,15 @@ def small_save_practice():
         'native_version': data.get('native_version', ''),
         'in_review': save_to_review
     }
-    records.insert(0, record)
-    _save_small_practice(username, records)
+    _small_practice(username).insert(record, first=True)
     return jsonify({'success': True, 'id': record['id']})
 
 
 @writing_bp.route('/api/writing/small/practice_history', methods=['GET'])
 def small_practice_history():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     records = _load_small_practice(username)
 
     chart_type_filter = request.args.get('chart_type', '')
@@ -700,25 +692,19 @@ def small_practice_history():
 
 @writing_bp.route('/api/writing/small/delete_practice/<record_id>', methods=['POST'])
 def small_delete_practice(record_id):
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
-    records = _load_small_practice(username)
-    records = [r for r in records if r['id'] != record_id]
-    _save_small_practice(username, records)
+    _small_practice(username).delete(record_id)
     return jsonify({'success': True})
 
 
 @writing_bp.route('/api/writing/small/practice_progress', methods=['GET'])
 def small_practice_progress():
     """返回小作文各图表类型、各例题的句子级完成进度（含历史记录详情）"""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     records = _load_small_practice(username)
 
     # Collect full records per sentence (like big essay practice_progress)
@@ -816,7 +802,8 @@ def writing_correct():
         return jsonify({'error': '翻译内容不能为空'}), 400
 
     cfg = load_prompt('writing_correct')
-    user_prompt = cfg['user_prompt'].format(
+    user_prompt = render_prompt(
+        'writing_correct', 'user_prompt',
         question=question,
         target=target,
         reference=reference,
@@ -825,8 +812,8 @@ def writing_correct():
 
     try:
         api_key = os.getenv('DEER_API_KEY')
-        resp = requests.post(
-            cfg['api_url'],
+        resp = http_client.post(
+            'deerapi', cfg['api_url'], channel='deerapi_chat',
             headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
             json={
                 'model': cfg['model'],
@@ -854,16 +841,11 @@ def writing_correct():
 def _practice_path(username):
     return os.path.join(WRITING_DATA_DIR, f'{username}_practice.json')
 
-def _load_practice(username):
-    p = _practice_path(username)
-    if os.path.exists(p):
-        with open(p, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return []
+def _practice(username):
+    return open_collection(f'writing_practice/{username}', _practice_path(username))
 
-def _save_practice(username, data):
-    with open(_practice_path(username), 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+def _load_practice(username):
+    return _practice(username).all()
 
 
 # ===================== 学习页选词高亮 =====================
@@ -875,31 +857,20 @@ def _highlights_path(username):
 
 
 def _load_highlights(username):
-    p = _highlights_path(username)
-    if os.path.exists(p):
-        with open(p, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return {}
+    return load_json(_highlights_path(username), {})
 
 
 def _save_highlights(username, data):
-    os.makedirs(WRITING_DATA_DIR, exist_ok=True)
-    with open(_highlights_path(username), 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(_highlights_path(username), data)
 
 
-def _highlights_user():
-    """校验 token 并返回用户名，未登录返回 None。"""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
-        return None
-    tokens = load_tokens()
-    return tokens.get(token, {}).get('username', 'anonymous')
+def _highlights_transaction(username):
+    return json_transaction(_highlights_path(username), {})
 
 
 @writing_bp.route('/api/writing/highlights', methods=['GET'])
 def writing_highlights_get():
-    username = _highlights_user()
+    username = _auth_username()
     if not username:
         return jsonify({'error': '未登录'}), 401
     data = _load_highlights(username)
@@ -911,7 +882,7 @@ def writing_highlights_get():
 
 @writing_bp.route('/api/writing/highlights', methods=['POST'])
 def writing_highlights_add():
-    username = _highlights_user()
+    username = _auth_username()
     if not username:
         return jsonify({'error': '未登录'}), 401
     body = request.json or {}
@@ -925,49 +896,50 @@ def writing_highlights_add():
     if not key or not text or start < 0 or end <= start:
         return jsonify({'error': '参数错误'}), 400
 
-    data = _load_highlights(username)
-    items = data.setdefault(key, [])
-    # 相同区间已存在则直接复用，避免重复
-    for it in items:
-        if it.get('start') == start and it.get('end') == end:
-            return jsonify({'success': True, 'highlight': it, 'duplicate': True})
-    hl = {
-        'id': str(uuid.uuid4()),
-        'start': start,
-        'end': end,
-        'text': text,
-        'field': body.get('field', ''),
-        'created_at': datetime.now().isoformat(),
-    }
-    items.append(hl)
-    _save_highlights(username, data)
+    with _highlights_transaction(username) as txn:
+        items = txn.data.setdefault(key, [])
+        # 相同区间已存在则直接复用，避免重复
+        for it in items:
+            if it.get('start') == start and it.get('end') == end:
+                txn.abort()
+                return jsonify({'success': True, 'highlight': it, 'duplicate': True})
+        hl = {
+            'id': str(uuid.uuid4()),
+            'start': start,
+            'end': end,
+            'text': text,
+            'field': body.get('field', ''),
+            'created_at': datetime.now().isoformat(),
+        }
+        items.append(hl)
     return jsonify({'success': True, 'highlight': hl})
 
 
 @writing_bp.route('/api/writing/highlights/<hid>', methods=['DELETE'])
 def writing_highlights_delete(hid):
-    username = _highlights_user()
+    username = _auth_username()
     if not username:
         return jsonify({'error': '未登录'}), 401
-    data = _load_highlights(username)
-    changed = False
-    for key in list(data.keys()):
-        kept = [it for it in data[key] if it.get('id') != hid]
-        if len(kept) != len(data[key]):
-            changed = True
-        if kept:
-            data[key] = kept
-        else:
-            del data[key]
-    if changed:
-        _save_highlights(username, data)
+    with _highlights_transaction(username) as txn:
+        data = txn.data
+        changed = False
+        for key in list(data.keys()):
+            kept = [it for it in data[key] if it.get('id') != hid]
+            if len(kept) != len(data[key]):
+                changed = True
+            if kept:
+                data[key] = kept
+            else:
+                del data[key]
+        if not changed:
+            txn.abort()
     return jsonify({'success': True})
 
 
 # ===================== 练习速记（记事本） =====================
 # 数据结构：{ "tabs": [ {id,title,content(html),created_at,updated_at} ],
 #            "active_tab_id": "...", "updated_at": "..." }
-# 每用户一个文件，鉴权复用 _highlights_user()（Bearer token → 用户名）。
+# 每用户一个文件，鉴权复用 _auth_username()（Bearer token → 用户名）。
 
 NOTEBOOK_MAX_BYTES = 1024 * 1024   # 整本上限 1MB，防滥用
 NOTEBOOK_MAX_TABS = 50             # 最多 50 个标签页
@@ -979,17 +951,11 @@ def _notebook_path(username):
 
 
 def _load_notebook(username):
-    p = _notebook_path(username)
-    if os.path.exists(p):
-        with open(p, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+    return load_json(_notebook_path(username), None)
 
 
 def _save_notebook(username, data):
-    os.makedirs(WRITING_DATA_DIR, exist_ok=True)
-    with open(_notebook_path(username), 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(_notebook_path(username), data)
 
 
 def _default_notebook():
@@ -1006,7 +972,7 @@ def _default_notebook():
 
 @writing_bp.route('/api/writing/notebook', methods=['GET'])
 def writing_notebook_get():
-    username = _highlights_user()
+    username = _auth_username()
     if not username:
         return jsonify({'error': '未登录'}), 401
     doc = _load_notebook(username)
@@ -1017,7 +983,7 @@ def writing_notebook_get():
 
 @writing_bp.route('/api/writing/notebook', methods=['PUT'])
 def writing_notebook_save():
-    username = _highlights_user()
+    username = _auth_username()
     if not username:
         return jsonify({'error': '未登录'}), 401
 
@@ -1058,7 +1024,7 @@ def writing_notebook_save():
 @writing_bp.route('/api/writing/notebook', methods=['DELETE'])
 def writing_notebook_delete():
     """彻底删除该用户的整本速记：直接删文件，后端不再保留任何内容。"""
-    username = _highlights_user()
+    username = _auth_username()
     if not username:
         return jsonify({'error': '未登录'}), 401
     p = _notebook_path(username)
@@ -1069,17 +1035,14 @@ def writing_notebook_delete():
 
 @writing_bp.route('/api/writing/save_practice', methods=['POST'])
 def writing_save_practice():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     data = request.json or {}
 
     # save_to_review controls whether this record goes into the review center
     save_to_review = data.get('save_to_review', False)
 
-    records = _load_practice(username)
     record = {
         'id': str(uuid.uuid4()),
         'timestamp': datetime.now().isoformat(),
@@ -1093,18 +1056,15 @@ def writing_save_practice():
         'native_version': data.get('native_version', ''),
         'in_review': save_to_review
     }
-    records.insert(0, record)
-    _save_practice(username, records)
+    _practice(username).insert(record, first=True)
     return jsonify({'success': True, 'id': record['id']})
 
 
 @writing_bp.route('/api/writing/practice_history', methods=['GET'])
 def writing_practice_history():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     records = _load_practice(username)
 
     # Only show records marked for review in the review center
@@ -1138,11 +1098,9 @@ def writing_practice_history():
 @writing_bp.route('/api/writing/practice_progress', methods=['GET'])
 def writing_practice_progress():
     """Return per-subcategory sentence-level completion info for progress bars."""
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     records = _load_practice(username)
 
     # Only sentences with at least one in_review=true record count as completed.
@@ -1202,14 +1160,10 @@ def writing_practice_progress():
 
 @writing_bp.route('/api/writing/delete_practice/<record_id>', methods=['POST'])
 def writing_delete_practice(record_id):
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
-    records = _load_practice(username)
-    records = [r for r in records if r['id'] != record_id]
-    _save_practice(username, records)
+    _practice(username).delete(record_id)
     return jsonify({'success': True})
 
 
@@ -1220,17 +1174,14 @@ def _chat_dir(username):
     os.makedirs(d, exist_ok=True)
     return d
 
+def _chat_session_path(username, session_id):
+    return os.path.join(_chat_dir(username), f'{session_id}.json')
+
 def _load_chat_session(username, session_id):
-    p = os.path.join(_chat_dir(username), f'{session_id}.json')
-    if os.path.exists(p):
-        with open(p, 'r', encoding='utf-8') as f:
-            return json.load(f)
-    return None
+    return load_json(_chat_session_path(username, session_id), None)
 
 def _save_chat_session(username, session_id, data):
-    p = os.path.join(_chat_dir(username), f'{session_id}.json')
-    with open(p, 'w', encoding='utf-8') as f:
-        json.dump(data, f, ensure_ascii=False, indent=2)
+    save_json_atomic(_chat_session_path(username, session_id), data)
 
 def _list_chat_sessions(username):
     d = _chat_dir(username)
@@ -1276,8 +1227,8 @@ def _find_session_by_key(username, sentence_key):
 def _call_ai_chat(messages, cfg):
     """调用 AI 聊天接口，返回完整回复文本"""
     api_key = os.getenv('DEER_API_KEY')
-    resp = requests.post(
-        cfg['api_url'],
+    resp = http_client.post(
+        'deerapi', cfg['api_url'], channel='deerapi_chat',
         headers={'Authorization': f'Bearer {api_key}', 'Content-Type': 'application/json'},
         json={
             'model': cfg['model'],
@@ -1294,8 +1245,7 @@ def _call_ai_chat(messages, cfg):
 
 @writing_bp.route('/api/writing/ai_chat/global', methods=['POST'])
 def writing_ai_chat_global():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    if not _auth_username():
         return jsonify({'error': '未登录'}), 401
 
     data = request.json or {}
@@ -1307,7 +1257,8 @@ def writing_ai_chat_global():
         return jsonify({'error': '问题不能为空'}), 400
 
     cfg = load_prompt('writing_ai_chat_global')
-    system_content = cfg['system_prompt'].format(
+    system_content = render_prompt(
+        'writing_ai_chat_global', 'system_prompt',
         context_zh=context.get('zh', ''),
         context_en=context.get('en', ''),
         context_tags=', '.join(context.get('tags', []))
@@ -1330,8 +1281,7 @@ def writing_ai_chat_global():
 
 @writing_bp.route('/api/writing/ai_chat/practice', methods=['POST'])
 def writing_ai_chat_practice():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    if not _auth_username():
         return jsonify({'error': '未登录'}), 401
 
     data = request.json or {}
@@ -1342,7 +1292,8 @@ def writing_ai_chat_practice():
         return jsonify({'error': '问题不能为空'}), 400
 
     cfg = load_prompt('writing_ai_chat_practice')
-    system_content = cfg['system_prompt'].format(
+    system_content = render_prompt(
+        'writing_ai_chat_practice', 'system_prompt',
         target_chinese=context.get('target_chinese', ''),
         user_translation=context.get('user_translation', ''),
         ai_feedback_summary=context.get('ai_feedback_summary', ''),
@@ -1366,23 +1317,22 @@ def writing_ai_chat_practice():
 
 @writing_bp.route('/api/writing/chat_history/save', methods=['POST'])
 def writing_chat_save():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
 
     data = request.json or {}
     session_id = data.get('session_id')
     now = datetime.now().isoformat()
 
     if session_id:
-        existing = _load_chat_session(username, session_id)
-        if existing:
-            existing['messages'] = data.get('messages', existing['messages'])
-            existing['updated_at'] = now
-            _save_chat_session(username, session_id, existing)
-            return jsonify({'success': True, 'session_id': session_id})
+        with json_transaction(_chat_session_path(username, session_id), None) as txn:
+            existing = txn.data
+            if existing:
+                existing['messages'] = data.get('messages', existing['messages'])
+                existing['updated_at'] = now
+                return jsonify({'success': True, 'session_id': session_id})
+            txn.abort()
 
     session_id = str(uuid.uuid4())
     session_data = {
@@ -1403,21 +1353,17 @@ def writing_chat_save():
 
 @writing_bp.route('/api/writing/chat_history/list', methods=['GET'])
 def writing_chat_list():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     return jsonify(_list_chat_sessions(username))
 
 
 @writing_bp.route('/api/writing/chat_history/<session_id>', methods=['GET'])
 def writing_chat_get(session_id):
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     session = _load_chat_session(username, session_id)
     if not session:
         return jsonify({'error': '会话不存在'}), 404
@@ -1426,11 +1372,9 @@ def writing_chat_get(session_id):
 
 @writing_bp.route('/api/writing/chat_history/find', methods=['GET'])
 def writing_chat_find():
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     sentence_key = request.args.get('sentence_key', '')
     if not sentence_key:
         return jsonify({'error': '缺少 sentence_key'}), 400
@@ -1442,11 +1386,9 @@ def writing_chat_find():
 
 @writing_bp.route('/api/writing/chat_history/delete/<session_id>', methods=['POST'])
 def writing_chat_delete(session_id):
-    token = request.headers.get('Authorization', '').replace('Bearer ', '')
-    if not is_token_valid(token):
+    username = _auth_username()
+    if not username:
         return jsonify({'error': '未登录'}), 401
-    tokens = load_tokens()
-    username = tokens.get(token, {}).get('username', 'anonymous')
     p = os.path.join(_chat_dir(username), f'{session_id}.json')
     if os.path.exists(p):
         os.remove(p)
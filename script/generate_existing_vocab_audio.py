@@ -5,9 +5,12 @@
 """
 
 import os
+import sys
 import json
-import time
-from app import generate_and_save_vocab_audio, INTENSIVE_DIR
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core import INTENSIVE_DIR, get_vocab_audio_path, generate_vocab_audio_batch
 
 def main():
     print("开始为现有高亮词汇生成音频...")
@@ -45,6 +48,7 @@ def main():
             print(f"📄 处理文章 {article_id}: 发现 {len(highlights)} 个高亮词汇")
             total_highlights += len(highlights)
             
+            words = []
             for highlight in highlights:
                 word = highlight.get('text', '').strip()
                 if not word:
@@ -53,7 +57,6 @@ def main():
                     continue
                 
                 # 检查音频是否已存在
-                from app import get_vocab_audio_path
                 audio_path = get_vocab_audio_path(article_id, word)
                 
                 if os.path.exists(audio_path):
@@ -61,19 +64,18 @@ def main():
                     skipped_audio += 1
                     continue
                 
-                # 生成音频
-                print(f"  🎵 生成音频: {word}")
-                result = generate_and_save_vocab_audio(article_id, word)
-                
-                if result and os.path.exists(result):
-                    print(f"  ✅ 生成成功: {word}")
-                    generated_audio += 1
-                else:
-                    print(f"  ❌ 生成失败: {word}")
-                    failed_audio += 1
-                
-                # 避免API频率限制
-                time.sleep(0.5)
+                words.append(word)
+            
+            if not words:
+                continue
+            
+            # 整篇文章的词汇交给批量引擎并发生成（去重、限速由引擎负责）
+            print(f"  🎵 批量生成 {len(words)} 个词汇音频")
+            generated, failed = generate_vocab_audio_batch(article_id, words)
+            generated_audio += generated
+            failed_audio += len(failed)
+            for item in failed:
+                print(f"  ❌ 生成失败: {item['text']} ({item['error']})")
                 
         except Exception as e:
             print(f"❌ 处理文章 {article_id} 时出错: {e}")
@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+"""
+启动耗时预算报告：用 `python -X importtime` 在子进程中导入 app，统计导入耗时
+功能：
+  - 输出总导入耗时和累计耗时最高的模块
+  - 检查重依赖（pydub / openai / httpx / PIL / yaml）是否在启动时被提前导入
+  - 超出预算或导入了禁止的模块时以非零状态退出，可用于 CI 回归检查
+用法：
+  python3 script/import_budget.py                    # 输出报告
+  python3 script/import_budget.py --top 30           # 显示前 30 个模块
+  python3 script/import_budget.py --budget-ms 800    # 总耗时超过 800ms 时失败
+  python3 script/import_budget.py --forbid pydub,openai
+"""
+
+import argparse
+import os
+import re
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 这些依赖只在具体功能里用到，不应出现在启动路径上
+DEFAULT_FORBIDDEN = ['pydub', 'openai', 'httpx', 'PIL', 'yaml']
+
+IMPORTTIME_RE = re.compile(r'^import time:\s+(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)')
+
+
+def measure_imports(module='app'):
+    """在干净的子进程中导入 module，返回 [(模块名, 自身耗时us, 累计耗时us, 层级)]"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f'导入 {module} 失败:\n{result.stderr[-2000:]}')
+
+    rows = []
+    for line in result.stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            rows.append((name, int(self_us), int(cumulative_us), len(indent) // 2))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description='app 启动导入耗时预算报告')
+    parser.add_argument('--module', default='app', help='要导入的模块（默认 app）')
+    parser.add_argument('--top', type=int, default=20, help='显示累计耗时最高的前 N 个模块')
+    parser.add_argument('--budget-ms', type=float, default=None, help='总导入耗时预算（毫秒）')
+    parser.add_argument('--forbid', default=','.join(DEFAULT_FORBIDDEN),
+                        help='启动时不允许导入的顶层模块，逗号分隔；传空字符串关闭检查')
+    args = parser.parse_args()
+
+    rows = measure_imports(args.module)
+    total_ms = sum(self_us for _, self_us, _, _ in rows) / 1000
+
+    print(f'导入 {args.module} 总耗时: {total_ms:.1f} ms（含解释器启动时的 site 等模块）')
+    print(f'\n累计耗时最高的 {args.top} 个模块:')
+    for name, self_us, cumulative_us, _ in sorted(rows, key=lambda row: row[2], reverse=True)[:args.top]:
+        print(f'  {cumulative_us / 1000:8.1f} ms  (自身 {self_us / 1000:6.1f} ms)  {name}')
+
+    failed = False
+    forbidden = [name.strip() for name in args.forbid.split(',') if name.strip()]
+    loaded = sorted({name.split('.')[0] for name, _, _, _ in rows} & set(forbidden))
+    if loaded:
+        print(f'\n启动时导入了重依赖: {", ".join(loaded)}')
+        failed = True
+    elif forbidden:
+        print(f'\n重依赖均未在启动时导入: {", ".join(forbidden)}')
+
+    if args.budget_ms is not None and total_ms > args.budget_ms:
+        print(f'超出导入耗时预算: {total_ms:.1f} ms > {args.budget_ms:.1f} ms')
+        failed = True
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+存储迁移工具：在 JSON 文件布局和 SQLite（WAL）存储之间转换记录型数据
+功能：
+  - import：把现有数据目录中的留言、评论、转录记录、单词音频任务、写作练习记录、
+    听力精听项目导入 SQLite（同名集合整体替换，可重复执行）
+  - export：把 SQLite 中的集合写回原 JSON 文件布局（回滚或备份用）
+  - 迁移完成后设置环境变量 STORAGE_BACKEND=sqlite 并重启服务即可切换
+用法：
+  python3 script/migrate_storage.py import                 # JSON -> storage.sqlite3
+  python3 script/migrate_storage.py import --dry-run       # 只统计，不写入
+  python3 script/migrate_storage.py export                 # storage.sqlite3 -> JSON
+  python3 script/migrate_storage.py import --db /data/app.sqlite3
+"""
+
+import argparse
+import os
+import re
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+import core  # noqa: E402
+from utils.json_store import (  # noqa: E402
+    JsonDirCollection, JsonListCollection, SqliteCollection, sqlite_collection_names,
+)
+
+
+def collection_specs():
+    """[(集合名模板, 目录, 文件名模板, 布局)]；模板中的 {user} 对应每用户一个文件。
+    按顺序匹配，更具体的文件名（*_small_practice.json）需排在前面。"""
+    return [
+        ('messages', core.MESSAGE_BOARD_DIR, 'messages.json', 'list'),
+        ('comments', core.MESSAGE_BOARD_DIR, 'comments.json', 'list'),
+        ('transcriptions', core.AUDIO_TRANSCRIPTION_DIR, 'transcriptions.json', 'list'),
+        ('vocabulary_tasks', core.VOCABULARY_TASKS_DIR, None, 'dir'),
+        ('writing_small_practice/{user}', core.WRITING_DATA_DIR, '{user}_small_practice.json', 'list'),
+        ('writing_practice/{user}', core.WRITING_DATA_DIR, '{user}_practice.json', 'list'),
+        ('listening_projects/{user}', core.LISTENING_REVIEW_DIR, '{user}_projects.json', 'list'),
+    ]
+
+
+def _template_regex(template):
+    return re.compile('^' + re.escape(template).replace(re.escape('{user}'), '(?P<user>.+)') + '$')
+
+
+def discover_json_collections():
+    """扫描数据目录，返回 [(集合名, JSON 集合对象)]"""
+    found = []
+    claimed = set()
+    for name_template, directory, filename_template, layout in collection_specs():
+        if layout == 'dir':
+            if os.path.isdir(directory):
+                found.append((name_template, JsonDirCollection(name_template, directory)))
+            continue
+        if '{user}' not in filename_template:
+            path = os.path.join(directory, filename_template)
+            if os.path.exists(path):
+                found.append((name_template, JsonListCollection(name_template, path)))
+            continue
+        if not os.path.isdir(directory):
+            continue
+        pattern = _template_regex(filename_template)
+        for filename in sorted(os.listdir(directory)):
+            path = os.path.join(directory, filename)
+            match = pattern.match(filename)
+            if not match or path in claimed:
+                continue
+            claimed.add(path)
+            name = name_template.format(user=match.group('user'))
+            found.append((name, JsonListCollection(name, path)))
+    return found
+
+
+def json_collection_for(name):
+    """集合名 -> 原 JSON 布局下的集合对象，未知集合返回 None"""
+    for name_template, directory, filename_template, layout in collection_specs():
+        if layout == 'dir':
+            if name == name_template:
+                return JsonDirCollection(name, directory)
+            continue
+        match = _template_regex(name_template).match(name)
+        if match:
+            filename = filename_template.format(**match.groupdict())
+            return JsonListCollection(name, os.path.join(directory, filename))
+    return None
+
+
+def import_json_to_sqlite(db_path, dry_run=False):
+    """JSON -> SQLite，返回 [(集合名, 导入条数, 跳过条数)]"""
+    report = []
+    for name, source in discover_json_collections():
+        records = source.all()
+        if not isinstance(records, list):
+            print(f'跳过 {name}: 不是记录列表')
+            continue
+        valid = [r for r in records if isinstance(r, dict) and r.get('id') is not None]
+        if not dry_run:
+            target = SqliteCollection(name, db_path)
+            target.replace_all(valid)
+            if target.count() != len({str(r['id']) for r in valid}):
+                raise RuntimeError(f'{name}: 导入后条数不一致')
+        report.append((name, len(valid), len(records) - len(valid)))
+    return report
+
+
+def export_sqlite_to_json(db_path, dry_run=False):
+    """SQLite -> JSON，返回 [(集合名, 导出条数)]"""
+    report = []
+    for name in sqlite_collection_names(db_path):
+        target = json_collection_for(name)
+        if target is None:
+            print(f'跳过未知集合: {name}')
+            continue
+        records = SqliteCollection(name, db_path).all()
+        if not dry_run:
+            target.replace_all(records)
+        report.append((name, len(records)))
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description='JSON 与 SQLite 存储之间的迁移工具')
+    parser.add_argument('direction', choices=['import', 'export'],
+                        help='import: JSON -> SQLite；export: SQLite -> JSON')
+    parser.add_argument('--db', default=core.STORAGE_DB_FILE, help=f'SQLite 文件（默认 {core.STORAGE_DB_FILE}）')
+    parser.add_argument('--dry-run', action='store_true', help='只统计，不写入')
+    args = parser.parse_args()
+
+    # 数据目录是相对项目根目录的路径
+    args.db = os.path.abspath(args.db)
+    os.chdir(PROJECT_ROOT)
+    if args.direction == 'import':
+        report = import_json_to_sqlite(args.db, args.dry_run)
+        for name, count, skipped in report:
+            note = f'（跳过 {skipped} 条无 id 记录）' if skipped else ''
+            print(f'  {name}: {count} 条{note}')
+        print(f'{"将导入" if args.dry_run else "已导入"} {len(report)} 个集合 -> {args.db}')
+    else:
+        if not os.path.exists(args.db):
+            print(f'数据库不存在: {args.db}')
+            sys.exit(1)
+        report = export_sqlite_to_json(args.db, args.dry_run)
+        for name, count in report:
+            print(f'  {name}: {count} 条')
+        print(f'{"将导出" if args.dry_run else "已导出"} {len(report)} 个集合 <- {args.db}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+批量重建口语合集音频：用进程池（默认按 CPU 核数）并行处理各文件夹
+功能：
+  - 已是最新的合集直接跳过，只在末尾新增了音频的合集追加新音频，其余整体重建
+  - 重建和追加都先写临时文件再原子替换，播放端不会读到写了一半的 MP3
+  - 结束后汇总重建 / 追加 / 跳过 / 失败数量和吞吐量
+用法：
+  python3 script/rebuild_playlists.py                    # 所有文件夹
+  python3 script/rebuild_playlists.py P1_Food P2_Travel  # 指定文件夹
+  python3 script/rebuild_playlists.py --force            # 忽略现有合集全部重建（如更换 TTS 音色后）
+  python3 script/rebuild_playlists.py --workers 4
+"""
+
+import argparse
+import os
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, PROJECT_ROOT)
+
+from routers.speaking_playlist import rebuild_playlists  # noqa: E402
+
+MODE_LABELS = {'rebuild': '重建', 'append': '追加', 'unchanged': '跳过'}
+
+
+def print_result(folder, result):
+    if 'error' in result:
+        print(f'  ✗ {folder}: {result["error"]}')
+    else:
+        print(f'  ✓ {folder}: {MODE_LABELS.get(result["mode"], result["mode"])} ({result["seconds"]}s)')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='并行重建口语合集音频')
+    parser.add_argument('folders', nargs='*', help='要重建的文件夹（缺省为全部）')
+    parser.add_argument('--force', action='store_true', help='忽略现有合集，全部重建')
+    parser.add_argument('--workers', type=int, default=None, help='进程数（默认 CPU 核数）')
+    args = parser.parse_args()
+
+    # 数据目录是相对项目根目录的路径
+    os.chdir(PROJECT_ROOT)
+    summary = rebuild_playlists(args.folders or None, force=args.force, workers=args.workers,
+                                on_result=print_result)
+    print(f'共 {summary["total"]} 个文件夹：重建 {summary["rebuilt"]}，追加 {summary["appended"]}，'
+          f'跳过 {summary["skipped"]}，失败 {summary["failed"]}；'
+          f'耗时 {summary["seconds"]}s（{summary["folders_per_second"]} 个/秒）')
+    if summary['failed']:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
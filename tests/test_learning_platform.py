@@ -5,8 +5,13 @@ import json
 import os
 import shutil
 import tempfile
+import time
 import unittest
 
+# 一帧 MPEG1 Layer III（128 kbit/s, 44.1 kHz, 立体声），全零边信息解码为静音
+MP3_FRAME = b"\xff\xfb\x90\x00" + b"\x00" * 413
+MP3_FRAME_SECONDS = 1152 / 44100
+
 
 class LearningPlatformTestCase(unittest.TestCase):
     def setUp(self):
@@ -30,6 +35,9 @@ class LearningPlatformTestCase(unittest.TestCase):
         import routers.writing_logic as writing
         import routers.listening_review as listening
         import routers.community as community
+        import routers.speaking as speaking
+        import routers.speaking_playlist as speaking_playlist
+        import routers.reading as reading
 
         root = self.tmp
         path_map = {
@@ -54,9 +62,12 @@ class LearningPlatformTestCase(unittest.TestCase):
             "WRITING_IMAGES_DIR": os.path.join(root, "writing_correction", "images"),
             "WRITING_CHAT_DIR": os.path.join(root, "writing_correction", "data", "chat_history"),
             "LISTENING_REVIEW_DIR": os.path.join(root, "listening_review"),
+            "TTS_CACHE_DIR": os.path.join(root, "tts_cache"),
+            "STORAGE_DB_FILE": os.path.join(root, "storage.sqlite3"),
+            "READING_DIR": os.path.join(root, "reading_exam"),
         }
 
-        for module in (core, auth, vocabulary, intensive, writing, listening, community):
+        for module in (core, auth, vocabulary, intensive, writing, listening, community, speaking, speaking_playlist, reading):
             for name, value in path_map.items():
                 if hasattr(module, name):
                     setattr(module, name, value)
@@ -444,6 +455,954 @@ class LearningPlatformTestCase(unittest.TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTrue(response.get_json()["success"])
 
+    def test_token_index_serves_new_tokens_and_reloads_on_file_change(self):
+        import core
+
+        self.assertEqual(core.verify_token_get_username(self.token), "tester")
+        response = self.client.get("/get_current_user", headers=self.auth_headers())
+        self.assertEqual(response.get_json()["user"]["username"], "tester")
+
+        # 进程外改写 tokens.json（如另一个 worker 登录）后索引应自动重新加载
+        tokens = core.load_tokens()
+        tokens["external-token"] = {"created_time": "2026-05-01T08:00:00", "username": "tester"}
+        with open(self.paths["TOKEN_FILE"], "w", encoding="utf-8") as f:
+            json.dump(tokens, f, ensure_ascii=False)
+
+        self.assertTrue(core.is_token_valid("external-token"))
+        response = self.client.get(
+            "/api/user/info", headers={"Authorization": "Bearer not-a-token"}
+        )
+        self.assertEqual(response.status_code, 401)
+
+    def test_user_directory_cache_serves_profiles_and_picks_up_edits(self):
+        import core
+
+        profile = core.get_user_profile("tester")
+        self.assertEqual(profile["display_name"], "Test User")
+        self.assertNotIn("password", profile)
+
+        users = core.load_users()
+        users["tester"] = dict(users["tester"], display_name="Renamed User")
+        users["other"] = {"username": "other", "password": "pw", "role": "user"}
+        self.write_json(self.paths["USERS_FILE"], users)
+
+        response = self.client.get("/get_current_user", headers=self.auth_headers())
+        self.assertEqual(response.get_json()["user"]["display_name"], "Renamed User")
+        self.assertEqual(core.get_user_profile("other")["avatar"], core.DEFAULT_AVATAR)
+        self.assertIsNotNone(core.authenticate_user("other", "pw"))
+
+    def test_prompt_registry_renders_versions_and_hot_reloads(self):
+        import core
+
+        prompts_dir = os.path.join(self.tmp, "prompts")
+        os.makedirs(prompts_dir)
+        self.addCleanup(setattr, core, "PROMPTS_DIR", core.PROMPTS_DIR)
+        core.PROMPTS_DIR = prompts_dir
+        prompt_path = os.path.join(prompts_dir, "sample.yaml")
+        with open(prompt_path, "w", encoding="utf-8") as f:
+            f.write('# 变量: name\nmodel: m\nsystem_prompt: |\n  {"k": 1}\nuser_prompt: "Hi {name} {{x}}"\n')
+
+        self.assertEqual(core.render_prompt("sample", "user_prompt", name="Ann"), "Hi Ann {x}")
+        self.assertEqual(core.render_prompt("sample", "system_prompt"), '{"k": 1}\n')
+        with self.assertRaises(KeyError):
+            core.render_prompt("sample", "user_prompt")
+        version = core.get_prompt_version("sample")
+
+        with open(prompt_path, "w", encoding="utf-8") as f:
+            f.write('# 变量: name\nmodel: m2\nuser_prompt: "Hello {name}"\n')
+        self.assertEqual(core.load_prompt("sample")["model"], "m2")
+        self.assertNotEqual(core.get_prompt_version("sample"), version)
+
+        # 变量声明与模板不一致的新版本被拒绝，继续使用上一个可用版本
+        with open(prompt_path, "w", encoding="utf-8") as f:
+            f.write('# 变量: name\nmodel: broken\nuser_prompt: "Hello {nmae}"\n')
+        self.assertEqual(core.load_prompt("sample")["model"], "m2")
+
+    def test_listening_review_records_polish_prompt_version(self):
+        from unittest import mock
+        import core
+        from routers import listening_review
+
+        self.seed_listening()
+        segments = [{"id": 1, "start": 0.0, "end": 1.0, "text": "raw"}]
+        with mock.patch.object(listening_review, "_call_transcription", return_value=({"segments": segments, "duration": 1.0}, None)), \
+                mock.patch.object(listening_review, "_polish_and_translate", return_value=([{"id": 1, "text": "Raw.", "translation": "原文"}], None)):
+            listening_review._transcribe_async("lr-2", "unused.mp3", "tester")
+
+        with open(os.path.join(self.paths["LISTENING_REVIEW_DIR"], "lr-2", "data.json"), encoding="utf-8") as f:
+            data = json.load(f)
+        self.assertEqual(data["segments"][0]["text"], "Raw.")
+        self.assertEqual(data["polish_prompt_version"], core.get_prompt_version("listening_polish_translate"))
+
+    def test_http_client_pools_sessions_per_provider(self):
+        from unittest import mock
+        from utils import http_client
+
+        http_client.close_all()
+        self.addCleanup(http_client.close_all)
+        with mock.patch.dict(os.environ, {"PROXY_URL": "http://127.0.0.1:7890"}):
+            deer = http_client.get_session("deerapi")
+            groq = http_client.get_session("groq")
+
+        self.assertIs(http_client.get_session("deerapi"), deer)
+        self.assertEqual(deer.proxies, {})
+        self.assertEqual(groq.proxies["https"], "http://127.0.0.1:7890")
+
+        with mock.patch.object(deer, "request") as send:
+            http_client.post("deerapi", "https://example.invalid/x", json={})
+        self.assertEqual(send.call_args.kwargs["timeout"], http_client.DEFAULT_TIMEOUT)
+
+    def test_tts_cache_dedupes_synthesis_across_audio_paths(self):
+        from unittest import mock
+        import core
+
+        with mock.patch.object(core, "synthesize_speech", return_value=b"fake-mp3") as tts:
+            first = core.generate_and_save_vocab_audio("article-a", "erode")
+            second = core.generate_challenge_vocab_audio("c1", "erode")
+            folder, filename = core.generate_tts("  erode\n", "P1_cache")
+
+        self.assertEqual(tts.call_count, 1)
+        cache_path = core.tts_cache_path(core.tts_cache_key("erode"))
+        clip = os.path.join(self.paths["MOTHER_DIR"], folder, filename)
+        for alias in (first, second, clip):
+            self.assertTrue(os.path.samefile(alias, cache_path))
+
+        # 新文章首次请求单词音频时直接从缓存补建别名
+        response = self.client.get("/vocab_audio/article-b/erode")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data, b"fake-mp3")
+        # 文件名只由单词决定，更换音色后内容会变，不能标记为 immutable
+        self.assertIn("no-cache", response.headers["Cache-Control"])
+        self.assertNotIn("immutable", response.headers["Cache-Control"])
+
+    def test_synthesize_many_dedupes_and_reports_per_item(self):
+        from unittest import mock
+        import core
+
+        def fake_tts(text, timeout=None):
+            if text == "broken":
+                raise core.TTSError(500, "boom")
+            return f"audio:{text}".encode()
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=fake_tts) as tts:
+            results = core.synthesize_many(["alpha", "beta", "alpha", "broken"])
+            generated, failed = core.generate_challenge_vocab_audio_batch("c2", ["alpha", " ", "beta"])
+
+        self.assertEqual([r["ok"] for r in results], [True, True, True, False])
+        self.assertEqual(results[0]["path"], results[2]["path"])
+        self.assertIn("500", results[3]["error"])
+        self.assertEqual(tts.call_count, 3)
+        self.assertEqual((generated, failed), (2, []))
+        with open(core.get_vocab_audio_path("challenge_c2", "beta"), "rb") as f:
+            self.assertEqual(f.read(), b"audio:beta")
+
+    def test_provider_governor_backs_off_and_trips_breaker(self):
+        import time
+        from types import SimpleNamespace
+        from utils.governor import CircuitOpenError, ProviderGovernor
+
+        governor = ProviderGovernor(
+            "test", rate=1000, burst=1000, max_concurrency=8, initial_concurrency=8,
+            failure_threshold=2, cooldown=0.05,
+        )
+        ok = SimpleNamespace(status_code=200, headers={})
+        throttled = SimpleNamespace(status_code=429, headers={})
+        down = SimpleNamespace(status_code=503, headers={})
+
+        governor.call(lambda: throttled)
+        self.assertEqual(governor.limit, 4)
+        governor.call(lambda: ok)
+        self.assertGreater(governor.limit, 4)
+
+        governor.call(lambda: down)
+        governor.call(lambda: down)
+        self.assertEqual(governor.state, "open")
+        with self.assertRaises(CircuitOpenError):
+            governor.call(lambda: ok)
+
+        time.sleep(0.06)
+        governor.call(lambda: ok)  # 半开探测成功后恢复
+        self.assertEqual(governor.state, "closed")
+
+        # 熔断前放行的旧请求在半开期间结束，不能冒充探测请求
+        governor = ProviderGovernor("test", rate=1000, burst=1000, min_concurrency=8, failure_threshold=2, cooldown=0.05)
+        stale = governor.acquire()
+        governor.call(lambda: down)
+        governor.call(lambda: down)
+        time.sleep(0.06)
+        probe = governor.acquire()
+        self.assertEqual((stale, probe), (False, True))
+        governor.release(ok=True, probe=stale)
+        self.assertEqual(governor.state, "half_open")
+        with self.assertRaises(CircuitOpenError):
+            governor.acquire()
+        governor.release(ok=True, probe=probe)
+        self.assertEqual(governor.state, "closed")
+
+        # 流式响应在正文读完或关闭前一直占用并发名额；正文中途断开计为上游失败
+        import requests
+        from utils import metrics
+
+        class Body:
+            status_code = 200
+
+            def __init__(self, chunks, error=None):
+                self.chunks, self.error, self.closed = chunks, error, False
+
+            def iter_content(self, chunk_size=1, decode_unicode=False):
+                for chunk in self.chunks:
+                    time.sleep(0.01)
+                    yield chunk
+                if self.error:
+                    raise self.error
+
+            def close(self):
+                self.closed = True
+
+        governor = ProviderGovernor("stream", rate=1000, burst=1000, min_concurrency=8, failure_threshold=2, cooldown=30)
+        streamed = governor.call(lambda: Body([b"a", b"b", b"c"]), stream=True)
+        self.assertEqual(governor.in_flight, 1)
+        self.assertEqual(b"".join(streamed.iter_content(2)), b"abc")
+        self.assertEqual(governor.in_flight, 0)
+        streamed.close()
+        self.assertTrue(streamed.closed)
+        self.assertEqual(governor.in_flight, 0)
+        timed = metrics.summary_stats("outbound_request_duration_seconds", channel="stream")
+        self.assertEqual(timed["count"], 1)
+        self.assertGreaterEqual(timed["sum"], 0.03)  # 计时到正文结束，而非收到响应头
+
+        for _ in range(2):
+            broken = governor.call(lambda: Body([b"a"], requests.exceptions.ChunkedEncodingError("cut")), stream=True)
+            with self.assertRaises(requests.exceptions.ChunkedEncodingError):
+                list(broken.iter_content())
+        self.assertEqual((governor.in_flight, governor.state), (0, "open"))
+
+        abandoned = ProviderGovernor("stream2", rate=1000, burst=1000)
+        response = abandoned.call(lambda: Body([b"a", b"b"]), stream=True)
+        next(response.iter_content())
+        self.assertEqual(abandoned.in_flight, 1)
+        response.close()
+        self.assertEqual(abandoned.in_flight, 0)
+
+    def test_metrics_endpoint_reports_requests_and_gauges(self):
+        with open(os.path.join(self.tmp, "vocabulary_book", "tasks", "t1.json"), "w", encoding="utf-8") as f:
+            json.dump({"id": "t1", "status": "pending", "attempts": 0, "created_at": "2026-01-01T00:00:00"}, f)
+        # 达到最大重试次数的任务仍留在磁盘上，但不再排队
+        with open(os.path.join(self.tmp, "vocabulary_book", "tasks", "t2.json"), "w", encoding="utf-8") as f:
+            json.dump({"id": "t2", "status": "max_attempts_reached", "attempts": 3, "created_at": "2026-01-01T00:00:00"}, f)
+
+        self.client.get("/api/user/info", headers=self.auth_headers())
+        response = self.client.get("/metrics")
+        self.assertEqual(response.status_code, 200)
+        body = response.get_data(as_text=True)
+        self.assertIn('http_requests_total{endpoint="auth.get_user_info",method="GET",status="200"}', body)
+        self.assertIn('http_request_duration_seconds{endpoint="auth.get_user_info",quantile="0.99"}', body)
+        self.assertIn("audio_task_queue_depth 1", body)
+        self.assertIn('transcription_threads_running{kind="asr"} 0', body)
+        self.assertIn('cache_hit_ratio{cache="users"}', body)
+
+        # sqlite 后端没有任务文件，队列深度同样来自任务集合
+        from unittest import mock
+        from routers import vocabulary
+        with mock.patch.dict(os.environ, {"STORAGE_BACKEND": "sqlite"}):
+            vocabulary.add_audio_task("w1", "erode", "reading", "s1")
+            vocabulary.add_audio_task("w2", "abate", "reading", "s1")
+            self.assertIn("audio_task_queue_depth 2", self.client.get("/metrics").get_data(as_text=True))
+
+        remote = self.client.get("/metrics", environ_base={"REMOTE_ADDR": "10.0.0.8"})
+        self.assertEqual(remote.status_code, 403)
+
+    def test_app_import_defers_heavy_dependencies(self):
+        import subprocess
+        import sys
+
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        code = (
+            "import sys, threading, app\n"
+            "print(','.join(m for m in ('pydub', 'openai', 'httpx', 'PIL', 'yaml') if m in sys.modules))\n"
+            "print(any(t.name == 'audio-task-processor' for t in threading.enumerate()))\n"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code], cwd=self.tmp, capture_output=True, text=True,
+            env={**os.environ, "PYTHONPATH": project_root},
+        )
+        self.assertEqual(result.returncode, 0, result.stderr)
+        loaded, processor_started = result.stdout.splitlines()[-2:]
+        self.assertEqual(loaded, "")
+        self.assertEqual(processor_started, "False")
+
+    def test_update_json_serializes_concurrent_writers_across_processes(self):
+        import subprocess
+        import sys
+        from utils.json_store import load_json
+
+        project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        path = os.path.join(self.tmp, "counter.json")
+        code = (
+            "import sys\n"
+            "from utils.json_store import update_json\n"
+            "for _ in range(25):\n"
+            "    update_json(sys.argv[1], lambda d: d.update(count=d.get('count', 0) + 1), {})\n"
+        )
+        workers = [
+            subprocess.Popen([sys.executable, "-c", code, path], env={**os.environ, "PYTHONPATH": project_root})
+            for _ in range(4)
+        ]
+        for worker in workers:
+            self.assertEqual(worker.wait(timeout=30), 0)
+
+        self.assertEqual(load_json(path, {}), {"count": 100})
+
+    def test_message_board_posts_from_threads_are_not_lost(self):
+        from concurrent.futures import ThreadPoolExecutor
+
+        def post(i):
+            return self.client.post(
+                "/api/messages", headers=self.auth_headers(), json={"type": "text", "content": f"msg {i}"}
+            ).status_code
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            statuses = list(pool.map(post, range(16)))
+
+        self.assertEqual(statuses, [200] * 16)
+        messages = self.client.get("/api/messages", headers=self.auth_headers()).get_json()
+        contents = sorted(m["content"] for m in messages["messages"])
+        self.assertEqual(contents, sorted(f"msg {i}" for i in range(16)))
+
+    def test_sqlite_backend_serves_message_board_and_migrates_from_json(self):
+        import importlib.util
+        from unittest import mock
+        import core
+
+        headers = self.auth_headers()
+        # 先在默认 json 后端写入，再迁移到 sqlite
+        first = self.client.post("/api/messages", headers=headers, json={"type": "text", "content": "hello"})
+        post_id = first.get_json()["message"]["id"]
+        self.client.post("/api/comments", headers=headers, json={"post_id": post_id, "content": "c1"})
+        os.makedirs(self.paths["WRITING_DATA_DIR"], exist_ok=True)
+        for name in ("tester_practice.json", "tester_small_practice.json"):
+            with open(os.path.join(self.paths["WRITING_DATA_DIR"], name), "w", encoding="utf-8") as f:
+                json.dump([{"id": name, "score": "6"}], f)
+
+        spec = importlib.util.spec_from_file_location(
+            "migrate_storage",
+            os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "script", "migrate_storage.py"),
+        )
+        migrate = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(migrate)
+        report = {name: count for name, count, _ in migrate.import_json_to_sqlite(core.STORAGE_DB_FILE)}
+        self.assertEqual(report["messages"], 1)
+        self.assertEqual(report["comments"], 1)
+        self.assertEqual(report["writing_practice/tester"], 1)
+        self.assertEqual(report["writing_small_practice/tester"], 1)
+
+        with mock.patch.dict(os.environ, {"STORAGE_BACKEND": "sqlite"}):
+            second = self.client.post("/api/messages", headers=headers, json={"type": "text", "content": "world"})
+            self.assertEqual(second.status_code, 200)
+            listed = self.client.get("/api/messages", headers=headers).get_json()["messages"]
+            self.assertEqual([m["content"] for m in listed], ["world", "hello"])
+            comments = self.client.get(f"/api/comments/{post_id}", headers=headers).get_json()["comments"]
+            self.assertEqual([c["content"] for c in comments], ["c1"])
+            deleted = self.client.delete(f"/api/messages/{post_id}", headers=headers)
+            self.assertEqual(deleted.status_code, 200)
+            self.assertEqual(self.client.delete(f"/api/messages/{post_id}", headers=headers).status_code, 404)
+
+        # sqlite 中的改动可导出回原 JSON 布局
+        migrate.export_sqlite_to_json(core.STORAGE_DB_FILE)
+        with open(os.path.join(self.paths["MESSAGE_BOARD_DIR"], "messages.json"), encoding="utf-8") as f:
+            self.assertEqual([m["content"] for m in json.load(f)], ["world"])
+
+        # 各后端都按字符串比较 id：整数 id 与其字符串形式指向同一条记录
+        from utils.json_store import open_collection
+        for backend, layout in (("json", "list"), ("json", "dir"), ("sqlite", "list")):
+            json_path = os.path.join(self.tmp, f"ids_{layout}" + (".json" if layout == "list" else ""))
+            ids = open_collection(f"ids_{layout}", json_path, core.STORAGE_DB_FILE, layout=layout, backend=backend)
+            ids.insert({"id": 7, "n": 1})
+            self.assertEqual(ids.get("7")["n"], 1, backend + layout)
+            self.assertEqual(ids.update("7", lambda r: {**r, "n": 2})["n"], 2, backend + layout)
+            self.assertEqual(ids.get(7)["n"], 2, backend + layout)
+            self.assertIsNotNone(ids.delete("7"), backend + layout)
+            self.assertIsNone(ids.get(7), backend + layout)
+
+    def test_cached_load_json_returns_private_copies_and_sees_rewrites(self):
+        from utils.json_store import clear_json_cache, json_cache_stats, load_json, save_json_atomic
+
+        clear_json_cache()
+        path = os.path.join(self.tmp, "cached.json")
+        save_json_atomic(path, {"words": [{"word": "apple"}]})
+
+        first = load_json(path, None, cached=True)
+        first["words"].append({"word": "mutated"})
+        second = load_json(path, None, cached=True)
+        self.assertEqual(second, {"words": [{"word": "apple"}]})
+        self.assertEqual(json_cache_stats()["hits"], 1)
+
+        # 其他进程直接改写文件（不经过 save_json_atomic）也能被 stat 校验发现
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"words": [{"word": "banana"}, {"word": "cherry"}]}, f)
+        self.assertEqual(len(load_json(path, None, cached=True)["words"]), 2)
+        self.assertIsNone(load_json(os.path.join(self.tmp, "missing.json"), None, cached=True))
+
+    def test_token_store_appends_prunes_compacts_and_expires(self):
+        import core
+
+        log_file = self.paths["TOKEN_FILE"] + ".log"
+        snapshot_mtime = os.stat(self.paths["TOKEN_FILE"]).st_mtime_ns if os.path.exists(self.paths["TOKEN_FILE"]) else None
+        tokens = [core.create_token("tester") for _ in range(core.TOKEN_MAX_PER_USER + 2)]
+        # 登录只追加日志，不重写快照
+        snapshot_after = os.stat(self.paths["TOKEN_FILE"]).st_mtime_ns if os.path.exists(self.paths["TOKEN_FILE"]) else None
+        self.assertEqual(snapshot_mtime, snapshot_after)
+        self.assertTrue(os.path.getsize(log_file) > 0)
+        self.assertFalse(core.is_token_valid(tokens[0]))
+        self.assertTrue(core.is_token_valid(tokens[-1]))
+        user_tokens = [t for t, r in core.load_tokens().items() if r.get("username") == "tester"]
+        self.assertEqual(len(user_tokens), core.TOKEN_MAX_PER_USER)
+
+        # 其他 worker 追加的日志行会被增量加载
+        with open(log_file, "a", encoding="utf-8") as f:
+            f.write(json.dumps({"op": "add", "token": "from-peer", "created_time": "2026-01-01T00:00:00", "username": "tester"}) + "\n")
+        self.assertTrue(core.is_token_valid("from-peer"))
+
+        core.compact_tokens()
+        self.assertEqual(os.path.getsize(log_file), 0)
+        with open(self.paths["TOKEN_FILE"], encoding="utf-8") as f:
+            self.assertIn(tokens[-1], json.load(f))
+        self.assertTrue(core.is_token_valid(tokens[-1]))
+
+        original_ttl = core.TOKEN_TTL_DAYS
+        core.TOKEN_TTL_DAYS = 1e-9
+        try:
+            expired = core.create_token("tester")
+        finally:
+            core.TOKEN_TTL_DAYS = original_ttl
+        time.sleep(0.01)
+        self.assertFalse(core.is_token_valid(expired))
+        core.compact_tokens()
+        self.assertNotIn(expired, core.load_tokens())
+
+    def test_audio_catalog_serves_listings_and_tracks_changes(self):
+        mother = self.paths["MOTHER_DIR"]
+        folder_path = os.path.join(mother, "P2_travel")
+        os.makedirs(folder_path, exist_ok=True)
+        for name, text in (("P2_travel_1.mp3", "First question\nanswer"), ("P2_travel_2.mp3", "Second")):
+            with open(os.path.join(folder_path, name), "wb") as f:
+                f.write(b"ID3")
+            with open(os.path.join(folder_path, name.replace(".mp3", ".txt")), "w", encoding="utf-8") as f:
+                f.write(text)
+        os.makedirs(os.path.join(mother, "P1_empty"), exist_ok=True)
+
+        listing = self.client.get("/list_audio").get_json()
+        folder = listing["Part2"][0]
+        self.assertEqual(folder["folder"], "P2_travel")
+        self.assertEqual(sorted(f["question"] for f in folder["files"]), ["First question", "Second"])
+        self.assertIsNone(folder["question"])
+        self.assertEqual(sorted(self.client.get("/list_folders").get_json()["folders"]), ["P1_empty", "P2_travel"])
+
+        self.client.post("/set_part2_question", json={"folder": "P2_travel", "question": "Describe a trip"})
+        self.client.post("/delete_audio", json={"folder": "P2_travel", "filename": "P2_travel_2.mp3"})
+        # 进程外新增的文件通过目录 mtime 被发现
+        with open(os.path.join(mother, "P1_empty", "P1_empty_1.mp3"), "wb") as f:
+            f.write(b"ID3")
+
+        listing = self.client.get("/list_audio").get_json()
+        self.assertEqual(listing["Part2"][0]["question"], "Describe a trip")
+        self.assertEqual([f["name"] for f in listing["Part2"][0]["files"]], ["P2_travel_1.mp3"])
+        self.assertEqual(listing["Part1"][0]["folder"], "P1_empty")
+
+        shared = self.client.get("/api/get_audio_list", headers=self.auth_headers()).get_json()["categories"]
+        self.assertEqual(shared["Part2"][0]["file_count"], 1)
+        self.assertFalse(shared["Part2"][0]["has_combined"])
+
+    def test_folder_manifest_records_order_and_mp3_durations(self):
+        from unittest import mock
+        import core
+        from utils import audio_manifest, mp3
+
+        id3 = b"ID3\x03\x00\x00\x00\x00\x00\x05" + b"\x00" * 5
+        clip_bytes = {"one\nanswer": id3 + MP3_FRAME * 100, "two": MP3_FRAME * 50}
+        self.assertAlmostEqual(mp3.duration(clip_bytes["one\nanswer"]), 100 * MP3_FRAME_SECONDS, places=6)
+        self.assertIsNone(mp3.duration(b"not an mp3"))
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=lambda text, timeout=None: clip_bytes[text]):
+            _, first = core.generate_tts("one\nanswer", "P1_manifest")
+            with mock.patch.object(core, "datetime") as fake_now:
+                fake_now.now.return_value.strftime.return_value = "20990101_000000"
+                _, second = core.generate_tts("two", "P1_manifest")
+
+        folder_path = os.path.join(self.paths["MOTHER_DIR"], "P1_manifest")
+        clips = audio_manifest.folder_clips(folder_path)
+        self.assertEqual([c["name"] for c in clips], [first, second])
+        self.assertEqual(clips[0]["question"], "one")
+        self.assertAlmostEqual(clips[1]["duration"], 50 * MP3_FRAME_SECONDS, places=6)
+
+        listing = self.client.get("/list_audio").get_json()["Part1"][0]["files"]
+        self.assertEqual([f["name"] for f in listing], [first, second])
+        self.assertIsNotNone(listing[0]["duration"])
+
+        self.client.post("/delete_audio", json={"folder": "P1_manifest", "filename": first})
+        # 手工拷入的文件在下次读取时补进 manifest
+        with open(os.path.join(folder_path, "P1_manifest_copied.mp3"), "wb") as f:
+            f.write(MP3_FRAME * 10)
+        names = [c["name"] for c in audio_manifest.folder_clips(folder_path)]
+        self.assertEqual(names, [second, "P1_manifest_copied.mp3"])
+
+    def test_generate_audio_batch_reports_job_progress_in_order(self):
+        from unittest import mock
+        import core
+        from utils import audio_manifest
+
+        def fake_speech(text, timeout=None):
+            if text == "boom":
+                raise RuntimeError("tts down")
+            time.sleep(0.05 if text == "alpha" else 0)  # 先提交的最后合成完
+            return MP3_FRAME * (len(text) + 1)
+
+        self.assertEqual(self.client.post("/generate_audio_batch", json={"folder": "P1_batch", "texts": []}).status_code, 400)
+        self.assertEqual(self.client.post("/generate_audio_batch", json={"folder": "../x", "texts": ["a"]}).status_code, 400)
+        self.assertEqual(self.client.get("/api/jobs/missing").status_code, 404)
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=fake_speech):
+            response = self.client.post(
+                "/generate_audio_batch", json={"folder": "P1_batch", "texts": ["alpha", "boom", "gamma"]}
+            )
+            self.assertEqual(response.status_code, 202)
+            job_id = response.get_json()["job_id"]
+            deadline = time.time() + 10
+            while time.time() < deadline:
+                job = self.client.get(f"/api/jobs/{job_id}").get_json()
+                if job["status"] in ("completed", "failed"):
+                    break
+                time.sleep(0.02)
+
+        self.assertEqual(job["status"], "completed")
+        self.assertEqual((job["total"], job["done"], job["failed"]), (3, 2, 1))
+        self.assertEqual([item["status"] for item in job["items"]], ["done", "failed", "done"])
+        self.assertIn("tts down", job["items"][1]["error"])
+        self.assertTrue(job["items"][0]["filename"].endswith("_000.mp3"))
+        self.assertTrue(job["items"][2]["filename"].endswith("_002.mp3"))
+
+        clips = audio_manifest.folder_clips(os.path.join(self.paths["MOTHER_DIR"], "P1_batch"))
+        self.assertEqual([c["name"] for c in clips], [job["items"][0]["filename"], job["items"][2]["filename"]])
+
+    def test_generate_audio_stream_tees_chunks_to_disk(self):
+        from unittest import mock
+        import core
+        from utils import audio_manifest
+
+        calls = []
+
+        class FakeStream:
+            status_code = 200
+
+            def __init__(self, chunks):
+                self.chunks = chunks
+                self.closed = False
+
+            def iter_content(self, chunk_size=None):
+                for chunk in self.chunks:
+                    calls.append(chunk)
+                    yield chunk
+
+            def close(self):
+                self.closed = True
+
+        streams = []
+
+        def fake_post(*args, **kwargs):
+            self.assertTrue(kwargs.get("stream"))
+            streams.append(FakeStream([MP3_FRAME * 10, MP3_FRAME * 10, MP3_FRAME * 5]))
+            return streams[-1]
+
+        with mock.patch.object(core.http_client, "post", side_effect=fake_post):
+            response = self.client.post("/generate_audio_stream", json={"text": "long answer", "folder": "P2_stream"})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.mimetype, "audio/mpeg")
+            filename = response.headers["X-Audio-Filename"]
+            self.assertEqual(response.data, MP3_FRAME * 25)
+            self.assertTrue(streams[0].closed)
+
+            # 客户端只收到第一块就断开，剩余内容仍然落盘
+            response = self.client.post("/generate_audio_stream", json={"text": "cut off", "folder": "P2_cut"})
+            next(iter(response.response))
+            response.close()
+            cut_name = response.headers["X-Audio-Filename"]
+
+            # 缓存命中不再请求上游
+            response = self.client.post("/generate_audio_stream", json={"text": "long answer", "folder": "P1_stream"})
+            self.assertEqual(response.data, MP3_FRAME * 25)
+        self.assertEqual(len(streams), 2)
+
+        folder_path = os.path.join(self.paths["MOTHER_DIR"], "P2_stream")
+        with open(os.path.join(folder_path, filename), "rb") as f:
+            self.assertEqual(f.read(), MP3_FRAME * 25)
+        self.assertEqual(os.path.getsize(core.tts_cache_path(core.tts_cache_key("cut off"))), len(MP3_FRAME) * 25)
+        clip = {c["name"]: c for c in audio_manifest.folder_clips(folder_path)}[filename]
+        self.assertEqual(clip["question"], "long answer")
+        self.assertAlmostEqual(clip["duration"], 25 * MP3_FRAME_SECONDS, places=6)
+        self.assertIn(cut_name, os.listdir(os.path.join(self.paths["MOTHER_DIR"], "P2_cut")))
+        self.assertFalse([n for n in os.listdir(os.path.dirname(core.tts_cache_path(core.tts_cache_key("cut off")))) if n.endswith(".tmp")])
+
+    def test_audio_routes_support_ranges_etags_and_caching(self):
+        from utils import media
+
+        data = bytes(range(256)) * 40
+        os.makedirs(self.paths["COMBINED_DIR"], exist_ok=True)
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P1_mix.mp3"), "wb") as f:
+            f.write(data)
+
+        response = self.client.get("/combined_audio/P1_mix", headers={"Range": "bytes=100-199"})
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response.data, data[100:200])
+        self.assertEqual(response.headers["Content-Range"], f"bytes 100-199/{len(data)}")
+        self.assertEqual(response.mimetype, "audio/mpeg")
+
+        full = self.client.get("/combined_audio/P1_mix")
+        etag = full.headers["ETag"]
+        self.assertFalse(etag.startswith("W/"))
+        self.assertEqual(full.headers["Accept-Ranges"], "bytes")
+        self.assertIn("no-cache", full.headers["Cache-Control"])
+        self.assertEqual(self.client.get("/combined_audio/P1_mix", headers={"If-None-Match": etag}).status_code, 304)
+        self.assertEqual(self.client.get("/combined_audio/missing").status_code, 404)
+        self.assertEqual(self.client.get("/combined_audio/..%2Fsecret").status_code, 404)
+
+        article_dir = os.path.join(self.paths["VOCAB_AUDIO_DIR"], "articles", "a1")
+        os.makedirs(article_dir, exist_ok=True)
+        with open(os.path.join(article_dir, "article_1.mp3"), "wb") as f:
+            f.write(data)
+        response = self.client.get("/vocab_audio/articles/a1/article_1.mp3")
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("immutable", response.headers["Cache-Control"])
+        self.assertIn("max-age=31536000", response.headers["Cache-Control"])
+
+        # 同一秒内重新生成的文章音频也使用新的 URL
+        from unittest import mock
+        import core
+        from routers import intensive_reading
+        with mock.patch.object(core, "synthesize_speech", side_effect=[b"first", b"second"]):
+            first = intensive_reading.build_article_audio("a1", "first take")
+            second = intensive_reading.build_article_audio("a1", "second take")
+        self.assertNotEqual(first["audio_url"], second["audio_url"])
+        self.assertEqual(self.client.get(first["audio_url"]).data, b"first")
+        self.assertEqual(self.client.get(second["audio_url"]).data, b"second")
+
+        self.assertEqual(media.media_type("talk.M4A"), "audio/mp4")
+        self.assertEqual(media.media_type("talk.webm"), "audio/webm")
+        self.assertEqual(media.media_type("notes.bin"), "application/octet-stream")
+
+    def test_generate_audio_runs_as_job_with_sse_progress(self):
+        from unittest import mock
+        import core
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=lambda text, timeout=None: MP3_FRAME * 5):
+            response = self.client.post("/generate_audio", json={"text": "queued answer", "folder": "P1_jobs"})
+            self.assertEqual(response.status_code, 202)
+            body = response.get_json()
+            self.assertEqual(body["status_url"], f"/api/jobs/{body['job_id']}")
+
+            events = self.client.get(f"/api/jobs/{body['job_id']}/events")
+            self.assertEqual(events.mimetype, "text/event-stream")
+            payloads = [
+                json.loads(line[len("data: "):])
+                for line in events.get_data(as_text=True).splitlines()
+                if line.startswith("data: ")
+            ]
+
+        self.assertEqual(payloads[-1]["status"], "completed")
+        result = payloads[-1]["result"]
+        self.assertEqual(result["folder"], "P1_jobs")
+        self.assertTrue(os.path.exists(os.path.join(self.paths["MOTHER_DIR"], "P1_jobs", result["filename"])))
+        self.assertEqual(self.client.get(body["status_url"]).get_json()["result"], result)
+        self.assertEqual(self.client.get("/api/jobs/missing/events").status_code, 404)
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=RuntimeError("tts down")):
+            job_id = self.client.post("/generate_audio", json={"text": "other", "folder": "P1_jobs"}).get_json()["job_id"]
+            events = self.client.get(f"/api/jobs/{job_id}/events").get_data(as_text=True)
+        job = self.client.get(f"/api/jobs/{job_id}").get_json()
+        self.assertEqual(job["status"], "failed")
+        self.assertIn("tts down", job["error"])
+        self.assertIn('"status": "failed"', events)
+
+    def test_combined_audio_decodes_each_clip_once(self):
+        from unittest import mock
+        from pydub import AudioSegment
+
+        folder_path = os.path.join(self.paths["MOTHER_DIR"], "P1_once")
+        os.makedirs(folder_path, exist_ok=True)
+        for i, text in enumerate(("Q1\nA1", "Q2\nA2")):
+            # 不是合法 MP3：manifest 中没有时长，只能靠解码
+            with open(os.path.join(folder_path, f"P1_once_{i}.mp3"), "wb") as f:
+                f.write(b"ID3")
+            with open(os.path.join(folder_path, f"P1_once_{i}.txt"), "w", encoding="utf-8") as f:
+                f.write(text)
+        os.makedirs(self.paths["COMBINED_DIR"], exist_ok=True)
+
+        decoded = []
+
+        def fake_from_mp3(path, *args, **kwargs):
+            decoded.append(os.path.basename(path))
+            return AudioSegment.silent(duration=1500 if path.endswith("_0.mp3") else 2500)
+
+        def fake_export(segment, out_f, format=None, **kwargs):
+            with open(out_f, "wb") as f:
+                f.write(b"\x00" * len(segment))
+
+        with mock.patch.object(AudioSegment, "from_mp3", side_effect=fake_from_mp3), \
+                mock.patch.object(AudioSegment, "export", fake_export):
+            job_id = self.client.post("/generate_combined_audio", json={"folder": "P1_once"}).get_json()["job_id"]
+            self.client.get(f"/api/jobs/{job_id}/events").get_data()
+
+        self.assertEqual(self.client.get(f"/api/jobs/{job_id}").get_json()["status"], "completed")
+        self.assertEqual(sorted(decoded), ["P1_once_0.mp3", "P1_once_1.mp3"])
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P1_once_subtitles.json"), encoding="utf-8") as f:
+            subtitles = json.load(f)["subtitles"]
+        self.assertEqual([s["duration"] for s in subtitles], [1.5, 2.5])
+        self.assertEqual(subtitles[1]["startTime"], 2.5)
+        self.assertEqual(subtitles[0]["question"], "Q1")
+
+    def test_combined_audio_splices_mp3_frames_without_decoding(self):
+        from unittest import mock
+        import core
+        from pydub import AudioSegment
+        from utils import mp3
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=lambda text, timeout=None: MP3_FRAME * (len(text) * 10)):
+            core.generate_tts("Q1\nA", "P1_splice")
+            with mock.patch.object(core, "datetime") as fake_now:
+                fake_now.now.return_value.strftime.return_value = "20990101_000000"
+                core.generate_tts("Q2\nAB", "P1_splice")
+        os.makedirs(self.paths["COMBINED_DIR"], exist_ok=True)
+
+        with mock.patch.object(AudioSegment, "from_mp3", side_effect=AssertionError("decoded")):
+            job_id = self.client.post("/generate_combined_audio", json={"folder": "P1_splice"}).get_json()["job_id"]
+            self.client.get(f"/api/jobs/{job_id}/events").get_data()
+        self.assertEqual(self.client.get(f"/api/jobs/{job_id}").get_json()["status"], "completed")
+
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P1_splice.mp3"), "rb") as f:
+            combined = f.read()
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P1_splice_subtitles.json"), encoding="utf-8") as f:
+            subtitles = json.load(f)["subtitles"]
+        self.assertAlmostEqual(subtitles[0]["duration"], 40 * MP3_FRAME_SECONDS, places=6)
+        self.assertAlmostEqual(subtitles[1]["duration"], 50 * MP3_FRAME_SECONDS, places=6)
+        gap = subtitles[1]["startTime"] - subtitles[0]["endTime"]
+        self.assertAlmostEqual(gap, 38 * MP3_FRAME_SECONDS, places=6)  # 1 秒取整到整帧
+        self.assertAlmostEqual(mp3.duration(combined), subtitles[1]["endTime"], places=6)
+        # 首帧是 Info 头，其余为原始帧和静音帧，不经过重新编码
+        self.assertIn(MP3_FRAME * 40, combined)
+        self.assertIn(b"Info", combined[:100])
+
+        mono = b"\xff\xfb\x90\xc0" + b"\x00" * 413
+        mono_path = os.path.join(self.paths["COMBINED_DIR"], "mono.mp3")
+        with open(mono_path, "wb") as f:
+            f.write(mono * 3)
+        with self.assertRaises(mp3.ConcatError):
+            mp3.concat_files([os.path.join(self.paths["COMBINED_DIR"], "P1_splice.mp3"), mono_path],
+                             os.path.join(self.paths["COMBINED_DIR"], "bad.mp3"))
+        self.assertFalse(os.path.exists(os.path.join(self.paths["COMBINED_DIR"], "bad.mp3")))
+
+        # MPEG-2 8 kbit/s 单声道帧只有 24 字节，放不下 Info 标签
+        tiny_path = os.path.join(self.paths["COMBINED_DIR"], "tiny.mp3")
+        with open(tiny_path, "wb") as f:
+            f.write((b"\xff\xf3\x14\xc0" + b"\x00" * 20) * 3)
+        with self.assertRaises(mp3.ConcatError):
+            mp3.concat_files([tiny_path], os.path.join(self.paths["COMBINED_DIR"], "tiny_out.mp3"))
+        self.assertEqual([f for f in os.listdir(self.paths["COMBINED_DIR"]) if f.startswith("tiny_out")], [])
+
+    def test_combined_playlist_appends_new_clips_and_reports_staleness(self):
+        from unittest import mock
+        import core
+
+        os.makedirs(self.paths["COMBINED_DIR"], exist_ok=True)
+        stamps = iter(f"20990101_00000{i}" for i in range(10))
+
+        def add_clip(text):
+            with mock.patch.object(core, "synthesize_speech", side_effect=lambda t, timeout=None: MP3_FRAME * (len(t) * 10)), \
+                    mock.patch.object(core, "datetime") as fake_now:
+                fake_now.now.return_value.strftime.return_value = next(stamps)
+                return core.generate_tts(text, "P2_grow")[1]
+
+        def build(**extra):
+            job_id = self.client.post("/generate_combined_audio", json={"folder": "P2_grow", **extra}).get_json()["job_id"]
+            self.client.get(f"/api/jobs/{job_id}/events").get_data()
+            return self.client.get(f"/api/jobs/{job_id}").get_json()["result"]
+
+        def subtitles():
+            return self.client.get("/get_subtitles/P2_grow").get_json()["subtitles"]
+
+        first = add_clip("aa")
+        add_clip("bbb")
+        self.assertEqual(build()["mode"], "rebuild")
+        self.assertEqual(self.client.get("/check_combined_audio").get_json()["status"], {"P2_grow": "fresh"})
+        self.assertEqual(build()["mode"], "unchanged")
+
+        add_clip("cccc")
+        inode = os.stat(os.path.join(self.paths["COMBINED_DIR"], "P2_grow.mp3")).st_ino
+        check = self.client.get("/check_combined_audio").get_json()
+        self.assertEqual(check["status"]["P2_grow"], "appendable")
+        self.assertEqual(check["stale"], ["P2_grow"])
+        self.assertEqual(build(), {"folder": "P2_grow", "mode": "append", "appended": 1})
+        appended = subtitles()
+        # 追加在临时副本上完成后原子替换，正在播放的旧文件不会被改写
+        self.assertNotEqual(os.stat(os.path.join(self.paths["COMBINED_DIR"], "P2_grow.mp3")).st_ino, inode)
+        self.assertEqual([f for f in os.listdir(self.paths["COMBINED_DIR"]) if f.endswith(".tmp")], [])
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P2_grow.mp3"), "rb") as f:
+            appended_audio = f.read()
+
+        # 追加结果与整体重建完全一致
+        self.assertEqual(build(force=True)["mode"], "rebuild")
+        self.assertEqual(subtitles(), appended)
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P2_grow.mp3"), "rb") as f:
+            self.assertEqual(f.read(), appended_audio)
+        for item, frames in zip(appended, (20, 30, 40)):
+            self.assertAlmostEqual(item["duration"], frames * MP3_FRAME_SECONDS, places=6)
+
+        self.client.post("/delete_audio", json={"folder": "P2_grow", "filename": first})
+        self.assertEqual(self.client.get("/check_combined_audio").get_json()["status"]["P2_grow"], "stale")
+        self.assertEqual(build()["mode"], "rebuild")
+        self.assertEqual(len(subtitles()), 2)
+
+        # 追加中途失败：帧已写入但 Info 帧未更新，文件长度与记录的字节数不符
+        with open(os.path.join(self.paths["COMBINED_DIR"], "P2_grow.mp3"), "ab") as f:
+            f.write(MP3_FRAME * 5)
+        self.assertEqual(self.client.get("/check_combined_audio").get_json()["status"]["P2_grow"], "stale")
+        self.assertEqual(build()["mode"], "rebuild")
+        self.assertEqual(self.client.get("/check_combined_audio").get_json()["status"]["P2_grow"], "fresh")
+
+        # 任务排队期间删除和新增的音频都以执行时的片段列表为准
+        from routers import speaking_playlist
+        queued = []
+        with mock.patch.object(speaking_playlist.jobs, "submit", side_effect=lambda kind, fn, **meta: queued.append(fn) or "queued"):
+            self.assertEqual(self.client.post("/generate_combined_audio", json={"folder": "P2_grow"}).status_code, 202)
+        self.client.post("/delete_audio", json={"folder": "P2_grow", "filename": subtitles()[0]["filename"]})
+        added = add_clip("ddddd")
+        self.assertEqual(queued[0]("queued")["mode"], "rebuild")
+        self.assertEqual([s["filename"] for s in subtitles()][-1], added)
+        self.assertEqual(len(subtitles()), 2)
+
+    def test_admin_rebuilds_playlists_in_process_pool(self):
+        from unittest import mock
+        import core
+        from routers import speaking_playlist
+
+        with mock.patch.object(core, "synthesize_speech", side_effect=lambda t, timeout=None: MP3_FRAME * (len(t) * 10)):
+            for folder in ("P1_a", "P1_b", "P3_c"):
+                core.generate_tts(f"{folder} answer", folder)
+        broken = os.path.join(self.paths["MOTHER_DIR"], "P1_broken")
+        os.makedirs(broken)
+        with open(os.path.join(broken, "P1_broken_1.mp3"), "wb") as f:
+            f.write(b"not audio")
+        speaking_playlist.build_combined_audio("P1_a")
+
+        response = self.client.post("/api/admin/rebuild_playlists", json={"workers": 2}, headers=self.auth_headers())
+        self.assertEqual(response.status_code, 202)
+        job_id = response.get_json()["job_id"]
+        self.client.get(f"/api/jobs/{job_id}/events").get_data()
+        job = self.client.get(f"/api/jobs/{job_id}").get_json()
+
+        summary = job["result"]
+        self.assertEqual((summary["total"], summary["rebuilt"], summary["skipped"], summary["failed"]), (4, 2, 1, 1))
+        self.assertIn("P1_broken", summary["errors"])
+        items = {item["folder"]: item for item in job["items"]}
+        self.assertEqual(items["P1_a"]["mode"], "unchanged")
+        self.assertEqual(items["P1_broken"]["status"], "failed")
+        combined = sorted(os.listdir(self.paths["COMBINED_DIR"]))
+        for folder in ("P1_b", "P3_c"):
+            self.assertIn(f"{folder}.mp3", combined)
+            self.assertIn(f"{folder}_subtitles.json", combined)
+        self.assertFalse([name for name in combined if name.endswith(".tmp")])
+
+        self.assertEqual(self.client.post("/api/admin/rebuild_playlists", json={"folders": ["../x"]},
+                                          headers=self.auth_headers()).status_code, 400)
+        self.assertEqual(self.client.post("/api/admin/rebuild_playlists", json={}).status_code, 401)
+
+    def test_virtual_playlist_streams_spliced_clips_with_subtitles(self):
+        from unittest import mock
+        import core
+        from pydub import AudioSegment
+        from utils import mp3
+
+        stamps = iter(f"20990101_00000{i}" for i in range(10))
+        names = {}
+        with mock.patch.object(core, "synthesize_speech", side_effect=lambda t, timeout=None: MP3_FRAME * (len(t) * 10)):
+            for folder, text in (("P1_food", "Q food\nA"), ("P2_trip", "story"), ("P2_trip", "more"), ("P3_city", "Q\nAB")):
+                with mock.patch.object(core, "datetime") as fake_now:
+                    fake_now.now.return_value.strftime.return_value = next(stamps)
+                    names[text] = core.generate_tts(text, folder)[1]
+        self.client.post("/set_part2_question", json={"folder": "P2_trip", "question": "Describe a trip"})
+        with open(os.path.join(self.paths["MOTHER_DIR"], "P2_trip", "P2_trip_legacy.mp3"), "wb") as f:
+            f.write(b"not audio")  # 没有时长，无法拼接，跳过
+
+        with mock.patch.object(AudioSegment, "from_mp3", side_effect=AssertionError("decoded")):
+            response = self.client.get("/playlist/stream?part=P2&gap=1")
+            self.assertEqual(response.mimetype, "audio/mpeg")
+            audio = response.data
+            subtitles = self.client.get("/playlist/subtitles?part=P2&gap=1").get_json()
+
+        silence = mp3.silent_frame(MP3_FRAME[:4])
+        self.assertEqual(audio, MP3_FRAME * 50 + silence * 38 + MP3_FRAME * 40)
+        self.assertEqual([s["filename"] for s in subtitles["subtitles"]], [names["story"], names["more"]])
+        self.assertEqual(subtitles["subtitles"][0]["question"], "Describe a trip")
+        self.assertNotIn("question", subtitles["subtitles"][1])
+        self.assertAlmostEqual(subtitles["subtitles"][1]["startTime"], (50 + 38) * MP3_FRAME_SECONDS, places=6)
+
+        city_clip, food_clip = names["Q\nAB"], names["Q food\nA"]
+        refs = f"P3_city/{city_clip},P1_food/{food_clip}"
+        explicit = self.client.get(f"/playlist/subtitles?clips={refs}&gap=0").get_json()["subtitles"]
+        self.assertEqual([s["folder"] for s in explicit], ["P3_city", "P1_food"])
+        self.assertEqual(explicit[1]["question"], "Q food")
+        self.assertEqual(self.client.get(f"/playlist/stream?clips={refs}&gap=0").data, MP3_FRAME * (40 + 80))
+
+        shuffled = [s["filename"] for s in self.client.get("/playlist/subtitles?shuffle=1&seed=7").get_json()["subtitles"]]
+        self.assertEqual(sorted(shuffled), sorted(names.values()))
+        self.assertEqual(shuffled, [s["filename"] for s in self.client.get("/playlist/subtitles?shuffle=1&seed=7").get_json()["subtitles"]])
+        self.assertEqual(self.client.get("/playlist/stream?shuffle=1&seed=7").headers["X-Playlist-Seed"], "7")
+        self.assertNotIn("X-Playlist-Seed", self.client.get("/playlist/stream?part=P2").headers)
+
+        # 未指定 seed 时每次随机打乱，返回的 seed 可复现同一顺序
+        unseeded = [self.client.get("/playlist/subtitles?shuffle=1").get_json() for _ in range(10)]
+        self.assertGreater(len({tuple(s["filename"] for s in u["subtitles"]) for u in unseeded}), 1)
+        replay = self.client.get(f"/playlist/subtitles?shuffle=1&seed={unseeded[0]['seed']}").get_json()
+        self.assertEqual(replay["subtitles"], unseeded[0]["subtitles"])
+
+        self.assertEqual(self.client.get("/playlist/stream?clips=../x/y.mp3").status_code, 400)
+        self.assertEqual(self.client.get("/playlist/stream?clips=P1_food/missing.mp3").status_code, 400)
+        self.assertEqual(self.client.get("/playlist/stream?gap=60").status_code, 400)
+        self.assertEqual(self.client.get("/playlist/stream?part=P9").status_code, 404)
+        for limit in ("-5", "0", "two"):
+            self.assertEqual(self.client.get(f"/playlist/stream?limit={limit}").status_code, 400)
+        for since in ("nan", "inf", "-1", "soon"):
+            self.assertEqual(self.client.get(f"/playlist/stream?since={since}").status_code, 400)
+        self.assertEqual(len(self.client.get("/playlist/subtitles?since=1").get_json()["subtitles"]), 4)
+
+    def test_reading_index_is_cached_until_directories_change(self):
+        from unittest import mock
+
+        from routers import reading
+
+        item_dir = os.path.join(self.paths["READING_DIR"], "P1", "高频 2", "3 Bees")
+        os.makedirs(item_dir)
+        with open(os.path.join(item_dir, "bees.html"), "w", encoding="utf-8") as f:
+            f.write("<html></html>")
+        os.makedirs(os.path.join(self.paths["READING_DIR"], "P1", "1 其余"))
+
+        first = self.client.get("/list_reading")
+        self.assertEqual([c["category"] for c in first.get_json()["P1"]], ["高频 2", "1 其余"])
+        self.assertEqual(first.get_json()["P1"][0]["items"][0]["html"], ["bees.html"])
+        etag = first.headers["ETag"]
+        self.assertEqual(self.client.get("/list_reading", headers={"If-None-Match": etag}).status_code, 304)
+
+        with mock.patch.object(reading, "build_reading_index") as rebuild:
+            self.assertEqual(self.client.get("/list_reading").status_code, 200)
+            rebuild.assert_not_called()
+
+        # 新放入的文件让所在目录 mtime 变化，触发重扫并更新 ETag
+        with open(os.path.join(item_dir, "bees.pdf"), "wb") as f:
+            f.write(b"%PDF")
+        os.utime(item_dir, ns=(time.time_ns(), time.time_ns() + 10**9))
+        second = self.client.get("/list_reading", headers={"If-None-Match": etag})
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second.headers["ETag"], etag)
+        self.assertEqual(second.get_json()["P1"][0]["items"][0]["pdf"], ["bees.pdf"])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,149 @@
+"""In-memory catalog of the speaking audio library (``audio_files/<folder>/*.mp3``).
+
+Listing endpoints used to walk every folder, stat every clip and open every
+``.txt`` on each request. The catalog keeps one parsed entry per folder and
+revalidates it with a single ``os.stat`` of the folder directory (plus
+``question.txt`` for Part 2 folders), so an unchanged library costs one stat
+per folder. Out-of-band changes (files copied in by hand, scripts) show up
+through the directory mtime; in-app writers also call ``folder_changed`` /
+``combined_changed`` so coarse mtime resolution can never hide their edits.
+"""
+
+import os
+import threading
+
+from utils import audio_manifest, metrics
+
+_lock = threading.Lock()
+_roots = {}      # abspath(mother_dir) -> {"mtime": ns, "names": [...], "folders": {name: entry}}
+_combined = {}   # abspath(combined_dir) -> (mtime_ns, frozenset of folder names)
+
+
+def _read_question(path):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def _question_signature(folder_path, name):
+    if not name.startswith("P2"):
+        return None
+    try:
+        st = os.stat(os.path.join(folder_path, "question.txt"))
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+
+def _scan_folder(folder_path, name):
+    # clip order, first-line question and duration come from the folder manifest
+    files = [
+        {"name": c["name"], "ctime": c["created"], "question": c["question"], "duration": c["duration"]}
+        for c in audio_manifest.folder_clips(folder_path)
+    ]
+    question = None
+    if name.startswith("P2"):
+        question = _read_question(os.path.join(folder_path, "question.txt"))
+    return {"files": files, "question": question}
+
+
+def _combined_folders(combined_dir):
+    key = os.path.abspath(combined_dir)
+    try:
+        mtime = os.stat(key).st_mtime_ns
+    except OSError:
+        return frozenset()
+    with _lock:
+        cached = _combined.get(key)
+    if cached and cached[0] == mtime:
+        return cached[1]
+    names = frozenset(
+        f[:-len(".mp3")] for f in os.listdir(key) if f.endswith(".mp3")
+    )
+    with _lock:
+        _combined[key] = (mtime, names)
+    return names
+
+
+def folders(mother_dir, combined_dir=None):
+    """Return one dict per visible folder, in directory order.
+
+    Each dict has ``folder``, ``ctime`` (folder directory ctime), ``files``
+    (``[{name, ctime, question, duration}]`` in manifest order, ``ctime`` being
+    the recorded creation time), ``question`` (Part 2
+    ``question.txt``, else None) and ``has_combined``. The result is a fresh
+    copy that callers may modify.
+    """
+    root = os.path.abspath(mother_dir)
+    try:
+        root_mtime = os.stat(root).st_mtime_ns
+    except OSError:
+        return []
+
+    with _lock:
+        state = _roots.get(root)
+    if state is None or state["mtime"] != root_mtime:
+        names = [
+            name for name in os.listdir(root)
+            if not name.startswith(".") and os.path.isdir(os.path.join(root, name))
+        ]
+        previous = state["folders"] if state else {}
+        state = {"mtime": root_mtime, "names": names, "folders": {n: previous[n] for n in names if n in previous}}
+        with _lock:
+            _roots[root] = state
+
+    combined = _combined_folders(combined_dir) if combined_dir else frozenset()
+    result = []
+    rescanned = 0
+    for name in list(state["names"]):
+        folder_path = os.path.join(root, name)
+        try:
+            st = os.stat(folder_path)
+        except OSError:
+            continue
+        signature = (st.st_mtime_ns, _question_signature(folder_path, name))
+        with _lock:
+            entry = state["folders"].get(name)
+        if entry is None or entry["signature"] != signature:
+            try:
+                scanned = _scan_folder(folder_path, name)
+                # repairing the manifest touches the directory: sign the state after the scan
+                st = os.stat(folder_path)
+            except OSError:
+                continue
+            signature = (st.st_mtime_ns, _question_signature(folder_path, name))
+            entry = {"signature": signature, **scanned}
+            rescanned += 1
+            with _lock:
+                state["folders"][name] = entry
+        result.append({
+            "folder": name,
+            "ctime": st.st_ctime,
+            "files": [dict(f) for f in entry["files"]],
+            "question": entry["question"],
+            "has_combined": name in combined,
+        })
+    metrics.record_cache("audio_catalog", rescanned == 0)
+    return result
+
+
+def folder_changed(mother_dir, folder):
+    """Drop one folder's entry so the next read rescans it (and the folder list)."""
+    with _lock:
+        state = _roots.get(os.path.abspath(mother_dir))
+        if state is not None:
+            state["folders"].pop(folder, None)
+            state["mtime"] = None
+
+
+def combined_changed(combined_dir):
+    with _lock:
+        _combined.pop(os.path.abspath(combined_dir), None)
+
+
+def reset():
+    with _lock:
+        _roots.clear()
+        _combined.clear()
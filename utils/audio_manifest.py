@@ -0,0 +1,116 @@
+"""Per-folder ``manifest.json`` for the speaking audio library.
+
+Each ``audio_files/<folder>`` keeps an ordered list of its clips::
+
+    {"version": 1, "clips": [{"name", "question", "size", "duration", "created"}]}
+
+``created`` is a Unix timestamp taken when the clip was written, so ordering
+no longer depends on ``os.path.getctime`` (which copies and restores reset),
+and ``duration`` comes from the MP3 frame headers, so playlist and subtitle
+code never has to decode audio to learn clip lengths.
+
+Writers (``add_clip`` / ``remove_clip``) update the manifest under the file
+lock. Readers call ``folder_clips``, which repairs a missing or stale
+manifest (clips added or removed out of band) with one ``listdir``.
+"""
+
+import os
+import time
+
+from utils import mp3
+from utils.json_store import json_transaction, load_json
+
+MANIFEST_NAME = "manifest.json"
+MANIFEST_VERSION = 1
+
+
+def manifest_path(folder_path):
+    return os.path.join(folder_path, MANIFEST_NAME)
+
+
+def _first_line(text):
+    return text.split("\n", 1)[0].strip() if text else None
+
+
+def _clip_entry(folder_path, filename, text=None, data=None, created=None):
+    path = os.path.join(folder_path, filename)
+    if data is None:
+        with open(path, "rb") as f:
+            data = f.read()
+    if text is None:
+        txt_path = os.path.join(folder_path, filename[:-len(".mp3")] + ".txt")
+        try:
+            with open(txt_path, "r", encoding="utf-8") as f:
+                text = f.readline()
+        except OSError:
+            text = None
+    if created is None:
+        created = os.path.getctime(path)
+    return {
+        "name": filename,
+        "question": _first_line(text),
+        "size": len(data),
+        "duration": mp3.duration(data),
+        "created": created,
+    }
+
+
+def _empty():
+    return {"version": MANIFEST_VERSION, "clips": []}
+
+
+def add_clip(folder_path, filename, text=None, data=None):
+    """Append (or replace) ``filename`` in the folder manifest; return its entry.
+
+    ``data`` is the MP3 bytes when the caller already has them in memory.
+    """
+    entry = _clip_entry(folder_path, filename, text=text, data=data, created=time.time())
+    with json_transaction(manifest_path(folder_path), None) as txn:
+        manifest = txn.data if isinstance(txn.data, dict) else _empty()
+        manifest["clips"] = [c for c in manifest.get("clips", []) if c.get("name") != filename]
+        manifest["clips"].append(entry)
+        txn.data = manifest
+    return entry
+
+
+def remove_clip(folder_path, filename):
+    path = manifest_path(folder_path)
+    if not os.path.exists(path):
+        return
+    with json_transaction(path, None) as txn:
+        if not isinstance(txn.data, dict):
+            txn.abort()
+            return
+        txn.data["clips"] = [c for c in txn.data.get("clips", []) if c.get("name") != filename]
+
+
+def folder_clips(folder_path):
+    """Clips of one folder in playback order, repairing the manifest if needed.
+
+    Clips known to the manifest keep their recorded order; mp3 files it does
+    not list are appended by ctime with durations parsed from their headers.
+    """
+    path = manifest_path(folder_path)
+    manifest = load_json(path, None, cached=True)
+    clips = manifest.get("clips", []) if isinstance(manifest, dict) else []
+    try:
+        on_disk = {name for name in os.listdir(folder_path) if name.endswith(".mp3")}
+    except OSError:
+        return []
+    if {c.get("name") for c in clips} == on_disk:
+        return clips
+
+    with json_transaction(path, None) as txn:
+        manifest = txn.data if isinstance(txn.data, dict) else _empty()
+        known = [c for c in manifest.get("clips", []) if c.get("name") in on_disk]
+        missing = on_disk - {c["name"] for c in known}
+        added = []
+        for name in missing:
+            try:
+                added.append(_clip_entry(folder_path, name))
+            except OSError:
+                continue
+        added.sort(key=lambda c: c["created"])
+        manifest["clips"] = known + added
+        txn.data = manifest
+    return manifest["clips"]
@@ -0,0 +1,327 @@
+"""Per-provider traffic governor for outbound AI calls.
+
+Each provider channel (DeerAPI TTS, DeerAPI chat, WildAPI, Groq, ...) gets:
+
+* a token bucket capping the request rate,
+* an AIMD concurrency limit that halves on 429/5xx/timeouts and grows by
+  roughly one slot per window of successful calls,
+* a circuit breaker that fails fast for ``cooldown`` seconds after
+  ``failure_threshold`` consecutive provider failures, then lets a single
+  probe request through (half-open).
+
+Streamed responses (``call(..., stream=True)``) hold their slot until the
+body has been read or the response is closed, so body transfers count
+against the concurrency limit, are timed to the last byte, and a body cut
+off mid-transfer counts as a provider failure.
+"""
+
+import os
+import random
+import threading
+import time
+
+import requests
+
+from utils import metrics
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a provider whose circuit breaker is open."""
+
+    def __init__(self, name, retry_in):
+        super().__init__(f"{name} 暂时不可用（熔断中），请 {retry_in:.0f} 秒后重试")
+        self.provider = name
+        self.retry_in = retry_in
+
+
+class TokenBucket:
+    """At most ``rate`` acquisitions per second, bursting up to ``burst``."""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1.0, float(burst))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = threading.Lock()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds`` (e.g. a 429 Retry-After)."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+            self._tokens = 0.0
+
+    def acquire(self):
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class ProviderGovernor:
+    def __init__(self, name, rate=2.0, burst=4, max_concurrency=8, min_concurrency=1,
+                 initial_concurrency=None, failure_threshold=5, cooldown=30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst)
+        self.max_concurrency = max(1, int(max_concurrency))
+        self.min_concurrency = max(1, min(int(min_concurrency), self.max_concurrency))
+        self.limit = float(initial_concurrency or self.max_concurrency)
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.in_flight = 0
+        self.consecutive_failures = 0
+        self.state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._cond = threading.Condition()
+
+    # ---- circuit breaker -------------------------------------------------
+
+    def _check_circuit(self):
+        """Raise CircuitOpenError if calls are not admitted; return True when this
+        call becomes the half-open probe (the caller must pass it to ``release``)."""
+        if self.state == "open":
+            elapsed = time.monotonic() - self._opened_at
+            if elapsed < self.cooldown:
+                raise CircuitOpenError(self.name, self.cooldown - elapsed)
+            self.state = "half_open"
+        if self.state == "half_open":
+            if self._probe_in_flight:
+                raise CircuitOpenError(self.name, 1)
+            self._probe_in_flight = True
+            return True
+        return False
+
+    # ---- slots -----------------------------------------------------------
+
+    def acquire(self):
+        """Wait for a slot; return the probe token to hand back to ``release``."""
+        with self._cond:
+            probe = self._check_circuit()
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+                if not probe:
+                    probe = self._check_circuit()
+            self.in_flight += 1
+        self.bucket.acquire()
+        return probe
+
+    def release(self, ok, throttled=False, provider_failure=False, retry_after=None, probe=False):
+        """Give back a slot. Only the release holding the probe token (from
+        ``acquire``) may close or reopen a half-open circuit; calls admitted
+        before the circuit opened finish without touching its state."""
+        with self._cond:
+            self.in_flight -= 1
+            if probe:
+                self._probe_in_flight = False
+            if throttled:
+                # multiplicative decrease
+                self.limit = max(float(self.min_concurrency), self.limit / 2)
+            elif ok:
+                # additive increase: about +1 slot per window of successes
+                self.limit = min(float(self.max_concurrency), self.limit + 1.0 / max(self.limit, 1.0))
+
+            if provider_failure:
+                self.consecutive_failures += 1
+                if probe or (self.state == "closed" and self.consecutive_failures >= self.failure_threshold):
+                    self.state = "open"
+                    self._opened_at = time.monotonic()
+            else:
+                self.consecutive_failures = 0
+                if probe:
+                    self.state = "closed"
+            self._cond.notify_all()
+        if retry_after:
+            self.bucket.pause(retry_after)
+
+    def _release_for_status(self, status, response=None, probe=False):
+        if status == 429:
+            self.release(ok=False, throttled=True, retry_after=_retry_after(response), probe=probe)
+        elif status >= 500:
+            self.release(ok=False, throttled=True, provider_failure=True, probe=probe)
+        else:
+            self.release(ok=True, probe=probe)
+
+    def call(self, fn, stream=False):
+        """Run ``fn()`` under this governor.
+
+        ``fn`` may return a requests.Response (classified by status code) or any
+        other value (an SDK result, counted as success). SDK exceptions that
+        carry ``status_code`` are classified the same way.
+
+        With ``stream=True`` a response is returned wrapped in GovernedStream:
+        the slot is released, and the call classified and timed, only when the
+        body is exhausted, fails, or the response is closed.
+        """
+        try:
+            probe = self.acquire()
+        except CircuitOpenError:
+            metrics.inc("outbound_requests_total", channel=self.name, status="circuit_open")
+            raise
+        started = time.perf_counter()
+        try:
+            result = fn()
+        except BaseException as e:
+            status = getattr(e, "status_code", None)
+            if isinstance(status, int):
+                self._release_for_status(status, getattr(e, "response", None), probe=probe)
+            elif _is_transport_error(e):
+                self.release(ok=False, throttled=True, provider_failure=True, probe=probe)
+            else:
+                self.release(ok=False, probe=probe)
+            self._record(started, status if isinstance(status, int) else "error")
+            raise
+
+        status = getattr(result, "status_code", None)
+        status = status if isinstance(status, int) else 200
+        if stream and hasattr(result, "iter_content"):
+            return GovernedStream(self, result, status, probe, started)
+        self._release_for_status(status, result, probe=probe)
+        self._record(started, status)
+        return result
+
+    def _record(self, started, status):
+        metrics.observe("outbound_request_duration_seconds", time.perf_counter() - started, channel=self.name)
+        metrics.inc("outbound_requests_total", channel=self.name, status=status)
+
+    def snapshot(self):
+        with self._cond:
+            return {
+                "state": self.state,
+                "limit": round(self.limit, 2),
+                "in_flight": self.in_flight,
+                "consecutive_failures": self.consecutive_failures,
+            }
+
+
+class GovernedStream:
+    """A streamed requests.Response that holds its governor slot until done.
+
+    Attribute access is forwarded to the response. The slot is released
+    exactly once: when ``iter_content`` is exhausted (classified by status
+    code), when reading the body fails (a transport error counts as a
+    provider failure) or on ``close()``.
+    """
+
+    def __init__(self, governor, response, status, probe, started):
+        self._governor = governor
+        self._response = response
+        self._status = status
+        self._probe = probe
+        self._started = started
+        self._finished = False
+        self._finish_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        return getattr(self._response, name)
+
+    def _finish(self, error=None):
+        with self._finish_lock:
+            if self._finished:
+                return
+            self._finished = True
+        governor = self._governor
+        if error is None:
+            governor._release_for_status(self._status, self._response, probe=self._probe)
+            governor._record(self._started, self._status)
+        elif _is_transport_error(error):
+            governor.release(ok=False, throttled=True, provider_failure=True, probe=self._probe)
+            governor._record(self._started, "error")
+        else:
+            governor.release(ok=False, probe=self._probe)
+            governor._record(self._started, "error")
+
+    def iter_content(self, chunk_size=1, decode_unicode=False):
+        try:
+            yield from self._response.iter_content(chunk_size=chunk_size, decode_unicode=decode_unicode)
+        except GeneratorExit:
+            raise   # the reader stopped early; close() releases the slot
+        except BaseException as e:
+            self._finish(error=e)
+            raise
+        self._finish()
+
+    def close(self):
+        try:
+            self._response.close()
+        finally:
+            self._finish()
+
+    def __del__(self):
+        # safety net for callers that never close the response
+        if not self.__dict__.get("_finished", True):
+            self._finish()
+
+
+def _retry_after(response):
+    try:
+        return min(60.0, float(response.headers.get("Retry-After", 0)))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def _is_transport_error(exc):
+    if isinstance(exc, (requests.exceptions.Timeout, requests.exceptions.ConnectionError,
+                        requests.exceptions.ChunkedEncodingError)):
+        return True
+    # openai / httpx connection and timeout errors
+    name = type(exc).__name__
+    return "Timeout" in name or "Connection" in name
+
+
+def backoff_delay(attempt, base=1.0, cap=30.0):
+    """Jittered exponential backoff shared by the provider retry loops."""
+    return random.uniform(base / 2, min(cap, base * (2 ** attempt)))
+
+
+# Defaults per channel; override with GOVERNOR_<NAME>_RATE / _MAX_CONCURRENCY.
+GOVERNOR_DEFAULTS = {
+    "deerapi_tts": {"rate": 4.0, "burst": 4, "max_concurrency": 8, "initial_concurrency": 4},
+    "deerapi_chat": {"rate": 2.0, "burst": 4, "max_concurrency": 8, "initial_concurrency": 4},
+    "deerapi_asr": {"rate": 0.5, "burst": 2, "max_concurrency": 4, "initial_concurrency": 2},
+    "wildapi": {"rate": 2.0, "burst": 4, "max_concurrency": 8, "initial_concurrency": 4},
+    "groq": {"rate": 0.5, "burst": 2, "max_concurrency": 4, "initial_concurrency": 2},
+}
+
+_governors = {}
+_lock = threading.Lock()
+
+
+def _config_for(name):
+    config = dict(GOVERNOR_DEFAULTS.get(name, {}))
+    prefix = f"GOVERNOR_{name.upper()}_"
+    if os.getenv(prefix + "RATE"):
+        config["rate"] = float(os.getenv(prefix + "RATE"))
+    if os.getenv(prefix + "MAX_CONCURRENCY"):
+        config["max_concurrency"] = int(os.getenv(prefix + "MAX_CONCURRENCY"))
+    return config
+
+
+def get_governor(name):
+    governor = _governors.get(name)
+    if governor is None:
+        with _lock:
+            governor = _governors.get(name)
+            if governor is None:
+                governor = _governors[name] = ProviderGovernor(name, **_config_for(name))
+    return governor
+
+
+def snapshot_all():
+    return {name: governor.snapshot() for name, governor in list(_governors.items())}
+
+
+def reset_all():
+    with _lock:
+        _governors.clear()
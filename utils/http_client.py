@@ -0,0 +1,107 @@
+"""Pooled outbound HTTP clients for the external AI providers.
+
+One keep-alive ``requests.Session`` per provider (DeerAPI, WildAPI, Groq) so
+TTS / chat / ASR calls reuse TLS connections, plus cached OpenAI SDK clients.
+"""
+
+import os
+import threading
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from utils.governor import get_governor
+
+# (connect, read) seconds; callers may override per request
+DEFAULT_TIMEOUT = (10, 60)
+POOL_SIZE = 16
+
+# Which providers must go out through PROXY_URL (mirrors the old per-call proxies=...)
+PROVIDERS = {
+    "deerapi": {"proxy": False},
+    "wildapi": {"proxy": False},
+    "groq": {"proxy": True},
+}
+
+_sessions = {}
+_openai_clients = {}
+_lock = threading.Lock()
+
+
+def proxy_url():
+    return os.getenv("PROXY_URL", "").strip()
+
+
+def _build_session(provider):
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=POOL_SIZE)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    proxy = proxy_url()
+    if proxy and PROVIDERS.get(provider, {}).get("proxy"):
+        session.proxies.update({"http": proxy, "https": proxy})
+    return session
+
+
+def get_session(provider):
+    """Return the shared keep-alive session for ``provider``."""
+    session = _sessions.get(provider)
+    if session is None:
+        with _lock:
+            session = _sessions.get(provider)
+            if session is None:
+                session = _sessions[provider] = _build_session(provider)
+    return session
+
+
+def request(provider, method, url, channel=None, **kwargs):
+    """Send a request through the provider's pooled session with a default timeout.
+
+    The call is admitted by the governor for ``channel`` (defaults to the
+    provider name): rate limit, adaptive concurrency and circuit breaker.
+    With ``stream=True`` the governor slot is held until the returned
+    response's body is read or the response is closed, so callers must close it.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    session = get_session(provider)
+    return get_governor(channel or provider).call(
+        lambda: session.request(method, url, **kwargs), stream=bool(kwargs.get("stream"))
+    )
+
+
+def post(provider, url, channel=None, **kwargs):
+    return request(provider, "POST", url, channel=channel, **kwargs)
+
+
+def get_openai_client(provider, base_url, api_key, use_proxy=False, timeout=120.0, **kwargs):
+    """Return a cached OpenAI SDK client; one per (provider, base_url, api_key, proxy)."""
+    proxy = proxy_url() if use_proxy else ""
+    key = (provider, base_url, api_key, proxy, tuple(sorted(kwargs.items())))
+    client = _openai_clients.get(key)
+    if client is None:
+        with _lock:
+            client = _openai_clients.get(key)
+            if client is None:
+                from openai import OpenAI
+
+                http_client = None
+                if proxy:
+                    import httpx
+
+                    http_client = httpx.Client(proxy=proxy, timeout=timeout)
+                client = OpenAI(
+                    base_url=base_url, api_key=api_key, http_client=http_client, **kwargs
+                )
+                _openai_clients[key] = client
+    return client
+
+
+def close_all():
+    """Close every pooled session and SDK client (used by tests and shutdown hooks)."""
+    with _lock:
+        for session in _sessions.values():
+            session.close()
+        for client in _openai_clients.values():
+            client.close()
+        _sessions.clear()
+        _openai_clients.clear()
@@ -0,0 +1,156 @@
+"""In-process registry of background jobs with per-item progress.
+
+Slow routes (TTS generation, audio merging) call ``submit``: the work runs on
+a dedicated bounded thread pool (``JOB_WORKERS``) so it never occupies a web
+worker, and the route returns 202 with the job id. Clients poll
+``/api/jobs/<id>`` or follow ``/api/jobs/<id>/events`` (SSE), which waits on
+``wait_for_update``. Jobs live in memory only (a restart forgets them) and
+the registry keeps the most recent ``MAX_JOBS``.
+"""
+
+import os
+import threading
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+MAX_JOBS = 500
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+FINISHED = ("completed", "failed")
+
+_lock = threading.Lock()
+_changed = threading.Condition(_lock)
+_jobs = OrderedDict()   # job id -> job dict
+_executor = None
+
+
+def _now():
+    return datetime.now().isoformat()
+
+
+def _copy(job):
+    return {**job, "items": [dict(item) for item in job["items"]]}
+
+
+def _touch(job):
+    # caller holds _lock
+    job["updated_at"] = _now()
+    job["version"] += 1
+    _changed.notify_all()
+
+
+def create_job(kind, items=(), **meta):
+    """Register a queued job; ``items`` are dicts merged into each progress entry."""
+    job_id = uuid.uuid4().hex
+    now = _now()
+    job = {
+        "id": job_id,
+        "kind": kind,
+        "status": "queued",
+        "created_at": now,
+        "updated_at": now,
+        "total": len(items),
+        "done": 0,
+        "failed": 0,
+        "error": None,
+        "result": None,
+        "version": 0,
+        "items": [{"index": i, "status": "pending", **item} for i, item in enumerate(items)],
+        **meta,
+    }
+    with _lock:
+        _jobs[job_id] = job
+        while len(_jobs) > MAX_JOBS:
+            _jobs.popitem(last=False)
+    return job_id
+
+
+def update_job(job_id, **fields):
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is not None:
+            job.update(fields)
+            _touch(job)
+
+
+def update_item(job_id, index, **fields):
+    """Update one item; ``status`` of ``done`` / ``failed`` advances the counters."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        item = job["items"][index]
+        item.update(fields)
+        job["done"] = sum(1 for i in job["items"] if i["status"] == "done")
+        job["failed"] = sum(1 for i in job["items"] if i["status"] == "failed")
+        _touch(job)
+
+
+def finish_job(job_id, error=None, result=None):
+    """Mark the job finished: ``failed`` on error or if every item failed, else ``completed``."""
+    with _lock:
+        job = _jobs.get(job_id)
+        if job is None:
+            return
+        if error is not None or (job["total"] and job["failed"] == job["total"]):
+            job["status"] = "failed"
+        else:
+            job["status"] = "completed"
+        job["error"] = error
+        job["result"] = result
+        _touch(job)
+
+
+def get_job(job_id):
+    """Snapshot of one job (a copy), or None if unknown or evicted."""
+    with _lock:
+        job = _jobs.get(job_id)
+        return _copy(job) if job is not None else None
+
+
+def wait_for_update(job_id, version, timeout):
+    """Block until the job's ``version`` differs from ``version`` (or ``timeout``
+    seconds pass); return its snapshot, or None if the job is unknown."""
+    with _lock:
+        _changed.wait_for(
+            lambda: _jobs.get(job_id) is None or _jobs[job_id]["version"] != version,
+            timeout=timeout,
+        )
+        job = _jobs.get(job_id)
+        return _copy(job) if job is not None else None
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="job")
+        return _executor
+
+
+def _run(job_id, fn):
+    update_job(job_id, status="running")
+    try:
+        result = fn(job_id)
+    except Exception as e:
+        print(f"后台任务 {job_id} 失败: {e}")
+        finish_job(job_id, error=str(e))
+        return
+    finish_job(job_id, result=result)
+
+
+def submit(kind, fn, items=(), **meta):
+    """Create a job and run ``fn(job_id)`` on the job pool; return the job id.
+
+    ``fn``'s return value becomes the job ``result``; an exception fails the
+    job with its message as ``error``.
+    """
+    job_id = create_job(kind, items, **meta)
+    _get_executor().submit(_run, job_id, fn)
+    return job_id
+
+
+def reset():
+    with _lock:
+        _jobs.clear()
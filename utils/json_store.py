@@ -1,11 +1,185 @@
-"""Small JSON storage helpers for file-backed app data."""
+"""Small JSON storage helpers for file-backed app data.
+
+Writes go through a temp file + ``os.replace`` so readers never see a torn
+file and need no lock. Read-modify-write cycles must run under
+``update_json`` / ``json_transaction``, which hold an advisory ``fcntl`` lock
+on a ``<file>.lock`` sidecar so concurrent gunicorn workers (and threads)
+serialize their updates instead of silently overwriting each other. The lock
+is re-entrant within a thread, so transactions on the same file may nest.
+
+Record-oriented data (messages, comments, practice records, ...) is accessed
+through ``open_collection``, which returns either the original JSON layout or
+a SQLite (WAL) table depending on ``STORAGE_BACKEND``. With SQLite, inserts,
+point lookups and point updates cost O(log n) instead of rewriting the file.
+
+``load_json(path, default, cached=True)`` serves repeated reads of unchanged
+files from a bounded LRU of parsed objects, validated against ``os.stat``
+(mtime_ns, size, inode). Callers always get a private copy, so mutating the
+result can never corrupt the cached value.
+"""
 
 import json
 import os
+import re
+import sqlite3
 import tempfile
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+
+from utils import metrics
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - non-POSIX platforms
+    fcntl = None
+
+_held = threading.local()
+# Fallback when fcntl is unavailable: serializes threads of this process only.
+_thread_locks = {}
+_thread_locks_guard = threading.Lock()
+
+
+def _lock_path(path):
+    return f"{os.path.abspath(path)}.lock"
+
+
+@contextmanager
+def file_lock(path):
+    """Hold an exclusive advisory lock for ``path`` (re-entrant per thread)."""
+    key = _lock_path(path)
+    held = getattr(_held, "paths", None)
+    if held is None:
+        held = _held.paths = {}
+    if key in held:
+        held[key] += 1
+        try:
+            yield
+        finally:
+            held[key] -= 1
+        return
+
+    directory = os.path.dirname(key)
+    os.makedirs(directory, exist_ok=True)
+    if fcntl is not None:
+        handle = open(key, "a+")
+        try:
+            fcntl.flock(handle.fileno(), fcntl.LOCK_EX)
+            held[key] = 1
+            try:
+                yield
+            finally:
+                del held[key]
+                fcntl.flock(handle.fileno(), fcntl.LOCK_UN)
+        finally:
+            handle.close()
+    else:
+        with _thread_locks_guard:
+            lock = _thread_locks.setdefault(key, threading.Lock())
+        with lock:
+            held[key] = 1
+            try:
+                yield
+            finally:
+                del held[key]
+
+
+def try_lock(path):
+    """Take a non-blocking exclusive lock on ``path``; hold it until the handle is closed.
+
+    Returns the open handle, or None if another process holds the lock. Used
+    to elect a single owner for background loops across worker processes.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    handle = open(path, "a+")
+    if fcntl is None:
+        return handle
+    try:
+        fcntl.flock(handle.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        handle.close()
+        return None
+    return handle
+
+
+# ---- Parsed-JSON read cache --------------------------------------------------
+
+JSON_CACHE_MAX_ENTRIES = int(os.environ.get("JSON_CACHE_MAX_ENTRIES", "256"))
+
+_json_cache = OrderedDict()  # abspath -> ((mtime_ns, size, ino), parsed)
+_json_cache_lock = threading.Lock()
+_json_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _copy_json(value):
+    """Copy the containers of a parsed JSON value; str/int/float/None are immutable."""
+    if isinstance(value, dict):
+        return {k: _copy_json(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_copy_json(v) for v in value]
+    return value
 
 
-def load_json(path, default):
+def _invalidate_cached(path):
+    with _json_cache_lock:
+        _json_cache.pop(os.path.abspath(path), None)
+
+
+def _load_json_cached(path, default):
+    key = os.path.abspath(path)
+    try:
+        st = os.stat(key)
+    except OSError:
+        _invalidate_cached(key)
+        return default
+    # os.replace swaps in a new inode, so atomic rewrites always change the signature
+    signature = (st.st_mtime_ns, st.st_size, st.st_ino)
+
+    with _json_cache_lock:
+        entry = _json_cache.get(key)
+        hit = entry is not None and entry[0] == signature
+        if hit:
+            _json_cache.move_to_end(key)
+            _json_cache_stats["hits"] += 1
+        else:
+            _json_cache_stats["misses"] += 1
+    metrics.record_cache("json", hit)
+    if hit:
+        return _copy_json(entry[1])
+
+    try:
+        with open(key, "r", encoding="utf-8") as f:
+            data = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return default
+
+    with _json_cache_lock:
+        _json_cache[key] = (signature, data)
+        _json_cache.move_to_end(key)
+        while len(_json_cache) > JSON_CACHE_MAX_ENTRIES:
+            _json_cache.popitem(last=False)
+    return _copy_json(data)
+
+
+def json_cache_stats():
+    """Hit/miss counters and current size of the parsed-JSON cache."""
+    with _json_cache_lock:
+        return {**_json_cache_stats, "entries": len(_json_cache)}
+
+
+def clear_json_cache():
+    with _json_cache_lock:
+        _json_cache.clear()
+        _json_cache_stats.update(hits=0, misses=0)
+
+
+def load_json(path, default, cached=False):
+    """Parse the JSON at ``path``, or return ``default`` if missing/invalid.
+
+    With ``cached=True`` an unchanged file is served from the read cache.
+    """
+    if cached:
+        return _load_json_cached(path, default)
     if not os.path.exists(path):
         return default
     try:
@@ -16,11 +190,12 @@ def load_json(path, default):
 
 
 def save_json_atomic(path, data):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
     fd, tmp_path = tempfile.mkstemp(
         prefix=f".{os.path.basename(path)}.",
         suffix=".tmp",
-        dir=os.path.dirname(path),
+        dir=directory,
         text=True,
     )
     try:
@@ -28,9 +203,393 @@ def save_json_atomic(path, data):
             json.dump(data, f, ensure_ascii=False, indent=2)
             f.write("\n")
         os.replace(tmp_path, path)
+        _invalidate_cached(path)
     except Exception:
         try:
             os.remove(tmp_path)
         except OSError:
             pass
         raise
+
+
+class JsonTransaction:
+    """Mutable view of one JSON file inside ``json_transaction``.
+
+    Mutate ``data`` in place or assign a new value; call ``abort()`` to leave
+    the file untouched.
+    """
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self.aborted = False
+
+    def abort(self):
+        self.aborted = True
+
+
+@contextmanager
+def json_transaction(path, default):
+    """Lock ``path``, load it, yield a ``JsonTransaction`` and save on success.
+
+    Nothing is written if the block raises or calls ``abort()``.
+    """
+    with file_lock(path):
+        txn = JsonTransaction(path, load_json(path, default))
+        yield txn
+        if not txn.aborted:
+            save_json_atomic(path, txn.data)
+
+
+def update_json(path, fn, default):
+    """Atomically apply ``fn`` to the JSON at ``path`` and return the saved data.
+
+    ``fn(data)`` may mutate ``data`` in place (returning None) or return a
+    replacement value.
+    """
+    with json_transaction(path, default) as txn:
+        result = fn(txn.data)
+        if result is not None:
+            txn.data = result
+    return txn.data
+
+
+# ---- Collections -----------------------------------------------------------
+#
+# A collection is an ordered list of dict records keyed by their ``id`` field.
+# ``list`` layout keeps the whole collection in one JSON array file, ``dir``
+# layout keeps one ``<id>.json`` file per record.
+
+STORAGE_BACKENDS = ("json", "sqlite")
+_FIELD_RE = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def storage_backend():
+    """Backend selected by the ``STORAGE_BACKEND`` env var (default ``json``)."""
+    backend = os.environ.get("STORAGE_BACKEND", "json").strip().lower() or "json"
+    if backend not in STORAGE_BACKENDS:
+        raise ValueError(f"unknown STORAGE_BACKEND: {backend}")
+    return backend
+
+
+def open_collection(name, json_path, db_path, layout="list", backend=None):
+    """Open the logical collection ``name``.
+
+    ``json_path`` is the array file (``list`` layout) or record directory
+    (``dir`` layout) used by the JSON backend; ``db_path`` is the SQLite
+    database used by the SQLite backend.
+    """
+    backend = backend or storage_backend()
+    if backend == "sqlite":
+        return SqliteCollection(name, db_path)
+    if layout == "dir":
+        return JsonDirCollection(name, json_path)
+    return JsonListCollection(name, json_path)
+
+
+def _same_id(record, record_id):
+    # ids are compared as strings in every backend (SQLite stores them as TEXT,
+    # the dir layout uses them as file names), so 7 and "7" name the same record
+    return record.get("id") is not None and str(record["id"]) == str(record_id)
+
+
+def _apply(fn, record):
+    result = fn(record)
+    return record if result is None else result
+
+
+class JsonListCollection:
+    """Collection stored as a JSON array in one file (the original layout)."""
+
+    def __init__(self, name, path):
+        self.name = name
+        self.path = path
+
+    def all(self):
+        return load_json(self.path, [], cached=True)
+
+    def get(self, record_id):
+        return next((r for r in self.all() if _same_id(r, record_id)), None)
+
+    def find(self, field, value):
+        return [r for r in self.all() if r.get(field) == value]
+
+    def count(self):
+        return len(self.all())
+
+    def insert(self, record, first=False):
+        def add(records):
+            if first:
+                records.insert(0, record)
+            else:
+                records.append(record)
+        update_json(self.path, add, [])
+        return record
+
+    def update(self, record_id, fn):
+        """Apply ``fn`` to one record under the lock; return it, or None if missing."""
+        with json_transaction(self.path, []) as txn:
+            for i, record in enumerate(txn.data):
+                if _same_id(record, record_id):
+                    txn.data[i] = _apply(fn, record)
+                    return txn.data[i]
+            txn.abort()
+        return None
+
+    def delete(self, record_id):
+        """Remove one record; return it, or None if it did not exist."""
+        with json_transaction(self.path, []) as txn:
+            for i, record in enumerate(txn.data):
+                if _same_id(record, record_id):
+                    return txn.data.pop(i)
+            txn.abort()
+        return None
+
+    def delete_where(self, field, value):
+        removed = []
+
+        def keep(records):
+            removed.extend(r for r in records if r.get(field) == value)
+            return [r for r in records if r.get(field) != value]
+        if os.path.exists(self.path):
+            update_json(self.path, keep, [])
+        return removed
+
+    def replace_all(self, records):
+        save_json_atomic(self.path, list(records))
+
+
+class JsonDirCollection:
+    """Collection stored as one ``<id>.json`` file per record in a directory."""
+
+    def __init__(self, name, directory):
+        self.name = name
+        self.directory = directory
+
+    def _path(self, record_id):
+        return os.path.join(self.directory, f"{record_id}.json")
+
+    def _lock(self):
+        # one lock for the whole directory so records don't each get a sidecar
+        return file_lock(os.path.join(self.directory, ".collection"))
+
+    def _files(self):
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+        return [n for n in names if n.endswith(".json") and not n.startswith(".")]
+
+    def all(self):
+        records = []
+        for filename in self._files():
+            record = load_json(os.path.join(self.directory, filename), None)
+            if isinstance(record, dict):
+                records.append(record)
+        return records
+
+    def get(self, record_id):
+        return load_json(self._path(record_id), None)
+
+    def find(self, field, value):
+        return [r for r in self.all() if r.get(field) == value]
+
+    def count(self):
+        return len(self._files())
+
+    def insert(self, record, first=False):
+        save_json_atomic(self._path(record["id"]), record)
+        return record
+
+    def update(self, record_id, fn):
+        with self._lock():
+            record = self.get(record_id)
+            if record is None:
+                return None
+            record = _apply(fn, record)
+            save_json_atomic(self._path(record_id), record)
+            return record
+
+    def delete(self, record_id):
+        with self._lock():
+            record = self.get(record_id)
+            try:
+                os.remove(self._path(record_id))
+            except FileNotFoundError:
+                return None
+            return record
+
+    def delete_where(self, field, value):
+        removed = []
+        for record in self.find(field, value):
+            if self.delete(record["id"]) is not None:
+                removed.append(record)
+        return removed
+
+    def replace_all(self, records):
+        with self._lock():
+            for filename in self._files():
+                os.remove(os.path.join(self.directory, filename))
+            for record in records:
+                save_json_atomic(self._path(record["id"]), record)
+
+
+_sqlite_local = threading.local()
+_sqlite_schema_ready = set()
+_sqlite_schema_lock = threading.Lock()
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS records (
+    collection TEXT NOT NULL,
+    id TEXT NOT NULL,
+    seq INTEGER NOT NULL,
+    data TEXT NOT NULL,
+    PRIMARY KEY (collection, id)
+);
+CREATE INDEX IF NOT EXISTS records_by_seq ON records (collection, seq);
+"""
+
+
+def sqlite_connection(db_path):
+    """Per-thread autocommit connection to ``db_path`` in WAL mode."""
+    key = os.path.abspath(db_path)
+    connections = getattr(_sqlite_local, "connections", None)
+    if connections is None:
+        connections = _sqlite_local.connections = {}
+    conn = connections.get(key)
+    if conn is None:
+        os.makedirs(os.path.dirname(key), exist_ok=True)
+        conn = sqlite3.connect(key, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        with _sqlite_schema_lock:
+            if key not in _sqlite_schema_ready:
+                conn.executescript(_SQLITE_SCHEMA)
+                _sqlite_schema_ready.add(key)
+        connections[key] = conn
+    return conn
+
+
+def close_sqlite_connections():
+    """Close this thread's cached connections (tests, forked workers)."""
+    connections = getattr(_sqlite_local, "connections", {})
+    for conn in connections.values():
+        conn.close()
+    connections.clear()
+    with _sqlite_schema_lock:
+        _sqlite_schema_ready.clear()
+
+
+@contextmanager
+def _sqlite_write(conn):
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class SqliteCollection:
+    """Collection stored as rows of the shared ``records`` table."""
+
+    def __init__(self, name, db_path):
+        self.name = name
+        self.db_path = db_path
+
+    @property
+    def _conn(self):
+        return sqlite_connection(self.db_path)
+
+    def all(self):
+        rows = self._conn.execute(
+            "SELECT data FROM records WHERE collection = ? ORDER BY seq", (self.name,)
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def get(self, record_id):
+        row = self._conn.execute(
+            "SELECT data FROM records WHERE collection = ? AND id = ?", (self.name, str(record_id))
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def find(self, field, value):
+        """Records whose top-level ``field`` equals ``value`` (scans the collection)."""
+        if not _FIELD_RE.match(field):
+            raise ValueError(f"invalid field name: {field}")
+        rows = self._conn.execute(
+            "SELECT data FROM records WHERE collection = ? AND json_extract(data, ?) = ? ORDER BY seq",
+            (self.name, f"$.{field}", value),
+        )
+        return [json.loads(data) for (data,) in rows]
+
+    def count(self):
+        return self._conn.execute(
+            "SELECT COUNT(*) FROM records WHERE collection = ?", (self.name,)
+        ).fetchone()[0]
+
+    def insert(self, record, first=False):
+        conn = self._conn
+        edge = "MIN(seq) - 1" if first else "MAX(seq) + 1"
+        with _sqlite_write(conn):
+            seq = conn.execute(
+                f"SELECT COALESCE({edge}, 0) FROM records WHERE collection = ?", (self.name,)
+            ).fetchone()[0]
+            conn.execute(
+                "INSERT OR REPLACE INTO records (collection, id, seq, data) VALUES (?, ?, ?, ?)",
+                (self.name, str(record["id"]), seq, json.dumps(record, ensure_ascii=False)),
+            )
+        return record
+
+    def update(self, record_id, fn):
+        conn = self._conn
+        with _sqlite_write(conn):
+            row = conn.execute(
+                "SELECT data FROM records WHERE collection = ? AND id = ?", (self.name, str(record_id))
+            ).fetchone()
+            if row is None:
+                return None
+            record = _apply(fn, json.loads(row[0]))
+            conn.execute(
+                "UPDATE records SET data = ? WHERE collection = ? AND id = ?",
+                (json.dumps(record, ensure_ascii=False), self.name, str(record_id)),
+            )
+        return record
+
+    def delete(self, record_id):
+        conn = self._conn
+        with _sqlite_write(conn):
+            row = conn.execute(
+                "SELECT data FROM records WHERE collection = ? AND id = ?", (self.name, str(record_id))
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "DELETE FROM records WHERE collection = ? AND id = ?", (self.name, str(record_id))
+            )
+        return json.loads(row[0])
+
+    def delete_where(self, field, value):
+        removed = self.find(field, value)
+        for record in removed:
+            self.delete(record["id"])
+        return removed
+
+    def replace_all(self, records):
+        conn = self._conn
+        with _sqlite_write(conn):
+            conn.execute("DELETE FROM records WHERE collection = ?", (self.name,))
+            conn.executemany(
+                "INSERT OR REPLACE INTO records (collection, id, seq, data) VALUES (?, ?, ?, ?)",
+                [
+                    (self.name, str(record["id"]), seq, json.dumps(record, ensure_ascii=False))
+                    for seq, record in enumerate(records)
+                ],
+            )
+
+
+def sqlite_collection_names(db_path):
+    """Names of every collection stored in ``db_path``."""
+    rows = sqlite_connection(db_path).execute("SELECT DISTINCT collection FROM records ORDER BY collection")
+    return [name for (name,) in rows]
@@ -0,0 +1,76 @@
+"""One place to serve audio files to the browser.
+
+Every audio route goes through ``send_media`` so they all behave the same:
+
+- byte ranges (``Range`` / ``If-Range`` / 206 / 416), so seeking in a long
+  combined playlist or listening recording only fetches what is played;
+- a strong ETag built from the file's inode, size and mtime. Files are only
+  ever replaced atomically, so any new content gets a new ETag;
+- 304 for ``If-None-Match`` / ``If-Modified-Since`` hits;
+- ``Cache-Control: public, max-age=<1 year>, immutable`` for files whose
+  URL is never reused for other bytes (generated article audio gets a new
+  unique filename each time), and ``no-cache`` (always revalidate, usually
+  a 304) for everything else;
+- an explicit MIME type for every audio format the upload routes accept.
+"""
+
+import os
+
+from flask import abort, send_file
+from werkzeug.security import safe_join
+
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+AUDIO_MIME_TYPES = {
+    ".mp3": "audio/mpeg",
+    ".wav": "audio/wav",
+    ".m4a": "audio/mp4",
+    ".mp4": "audio/mp4",
+    ".flac": "audio/flac",
+    ".ogg": "audio/ogg",
+    ".webm": "audio/webm",
+}
+
+
+def media_type(path):
+    """MIME type for an audio path (``application/octet-stream`` if unknown)."""
+    return AUDIO_MIME_TYPES.get(os.path.splitext(path)[1].lower(), "application/octet-stream")
+
+
+def file_etag(st):
+    return f"{st.st_ino:x}-{st.st_size:x}-{st.st_mtime_ns:x}"
+
+
+def send_media(path, immutable=False, download_name=None, as_attachment=False):
+    """Serve the file at ``path`` with range, ETag and cache headers; 404 if missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+    response = send_file(
+        path,
+        mimetype=media_type(path),
+        as_attachment=as_attachment,
+        download_name=download_name,
+        conditional=True,
+        etag=file_etag(st),
+        last_modified=st.st_mtime,
+    )
+    response.accept_ranges = "bytes"
+    if immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = IMMUTABLE_MAX_AGE
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    return response
+
+
+def send_media_from(directory, filename, immutable=False, **kwargs):
+    """``send_media`` for ``filename`` inside ``directory`` (404 on path escapes)."""
+    path = safe_join(directory, filename)
+    if path is None:
+        abort(404)
+    return send_media(path, immutable=immutable, **kwargs)
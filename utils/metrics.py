@@ -0,0 +1,211 @@
+"""In-process request / outbound-call metrics rendered in Prometheus text format.
+
+Recording is a dict lookup plus a few arithmetic ops under one lock, so the
+before/after-request hooks stay cheap. Latency quantiles (p50/p95/p99) are
+computed at scrape time from a bounded window of the most recent samples.
+"""
+
+import threading
+import time
+from collections import deque
+
+QUANTILES = (0.5, 0.95, 0.99)
+WINDOW_SIZE = 1024
+
+_lock = threading.Lock()
+_counters = {}    # (name, labels) -> float
+_summaries = {}   # (name, labels) -> _Summary
+_gauges = {}      # name -> (help, callback)
+_help = {}        # name -> (type, help)
+
+
+class _Summary:
+    __slots__ = ("count", "total", "window")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.window = deque(maxlen=WINDOW_SIZE)
+
+    def observe(self, value):
+        self.count += 1
+        self.total += value
+        self.window.append(value)
+
+    def quantiles(self):
+        samples = sorted(self.window)
+        if not samples:
+            return {q: 0.0 for q in QUANTILES}
+        last = len(samples) - 1
+        return {q: samples[min(last, int(q * len(samples)))] for q in QUANTILES}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items())) if labels else ()
+
+
+def describe(name, metric_type, help_text):
+    _help[name] = (metric_type, help_text)
+
+
+def inc(name, value=1, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def observe(name, value, **labels):
+    key = (name, _labels(labels))
+    with _lock:
+        summary = _summaries.get(key)
+        if summary is None:
+            summary = _summaries[key] = _Summary()
+        summary.observe(value)
+
+
+def register_gauge(name, help_text, callback):
+    """Register a gauge read at scrape time.
+
+    ``callback()`` returns a number, or a list of ``(labels_dict, value)``.
+    """
+    _gauges[name] = (help_text, callback)
+
+
+def record_cache(cache, hit):
+    """Count a hit or miss for one of the in-process caches."""
+    inc("cache_requests_total", cache=cache, result="hit" if hit else "miss")
+
+
+def cache_hit_ratios():
+    """Gauge callback: hit ratio per cache, derived from ``cache_requests_total``."""
+    totals = {}
+    with _lock:
+        for (name, labels), value in _counters.items():
+            if name != "cache_requests_total":
+                continue
+            label_map = dict(labels)
+            hits, count = totals.get(label_map["cache"], (0, 0))
+            if label_map["result"] == "hit":
+                hits += value
+            totals[label_map["cache"]] = (hits, count + value)
+    return [({"cache": cache}, hits / count) for cache, (hits, count) in sorted(totals.items()) if count]
+
+
+def summary_stats(name, **labels):
+    """Return ``{"count", "sum", "quantiles"}`` for one summary series (or None)."""
+    with _lock:
+        summary = _summaries.get((name, _labels(labels)))
+        if summary is None:
+            return None
+        return {"count": summary.count, "sum": summary.total, "quantiles": summary.quantiles()}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
+        _summaries.clear()
+
+
+# ---- Prometheus text format ----------------------------------------------
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value):
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, int):
+        return str(value)
+    return repr(float(value))
+
+
+def _header(lines, name, default_type):
+    metric_type, help_text = _help.get(name, (default_type, name))
+    lines.append(f"# HELP {name} {help_text}")
+    lines.append(f"# TYPE {name} {metric_type}")
+
+
+def render():
+    """Render every metric in the Prometheus text exposition format."""
+    with _lock:
+        counters = sorted(_counters.items())
+        summaries = sorted(
+            ((key, s.count, s.total, s.quantiles()) for key, s in _summaries.items()),
+            key=lambda item: item[0],
+        )
+
+    lines = []
+    seen = set()
+    for (name, labels), value in counters:
+        if name not in seen:
+            seen.add(name)
+            _header(lines, name, "counter")
+        lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+    for (name, labels), count, total, quantiles in summaries:
+        if name not in seen:
+            seen.add(name)
+            _header(lines, name, "summary")
+        for q, value in quantiles.items():
+            lines.append(f"{name}{_format_labels(labels, [('quantile', q)])} {_format_value(value)}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {_format_value(total)}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+
+    for name, (help_text, callback) in sorted(_gauges.items()):
+        try:
+            value = callback()
+        except Exception as e:
+            print(f"metrics gauge {name} failed: {e}")
+            continue
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, list):
+            for labels, item in value:
+                lines.append(f"{name}{_format_labels(_labels(labels))} {_format_value(item)}")
+        else:
+            lines.append(f"{name} {_format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+# ---- Flask instrumentation -----------------------------------------------
+
+describe("http_requests_total", "counter", "HTTP requests by endpoint, method and status code")
+describe("http_request_duration_seconds", "summary", "HTTP request latency by endpoint")
+describe("http_response_size_bytes", "summary", "HTTP response body size by endpoint")
+describe("outbound_requests_total", "counter", "Outbound provider calls by channel and status")
+describe("outbound_request_duration_seconds", "summary", "Outbound provider call latency by channel")
+describe("cache_requests_total", "counter", "In-process cache lookups by cache and result")
+
+
+def init_app(app):
+    """Install before/after-request hooks that time every request on ``app``."""
+    from flask import g, request
+
+    @app.before_request
+    def _metrics_start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _metrics_record(response):
+        started = g.pop("_metrics_started", None)
+        if started is None:
+            return response
+        # label by endpoint name (e.g. auth.user_login), not the raw path, to bound cardinality
+        endpoint = request.endpoint or "unmatched"
+        elapsed = time.perf_counter() - started
+        inc("http_requests_total", endpoint=endpoint, method=request.method, status=response.status_code)
+        observe("http_request_duration_seconds", elapsed, endpoint=endpoint)
+        # header only: never buffer a streamed body just to measure it
+        size = response.content_length
+        if size is not None:
+            observe("http_response_size_bytes", size, endpoint=endpoint)
+        return response
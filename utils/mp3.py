@@ -0,0 +1,393 @@
+"""Minimal MPEG audio (MP3) frame parser and splicer.
+
+Reads frame headers only, never decodes audio, so clip durations can be
+computed at write time from the bytes already in hand instead of decoding
+the file with pydub/ffmpeg later. Handles ID3v2 prefixes, ID3v1 trailers,
+Xing/Info (VBR) headers and garbage between frames.
+
+``concat_files`` joins same-format MP3 files by copying their frames and
+inserting all-zero (silent) frames for the gaps, writing the result as it
+goes: no decoding, no re-encoding, and one input file in memory at a time.
+"""
+
+import os
+import secrets
+import shutil
+from collections import namedtuple
+
+FrameHeader = namedtuple(
+    "FrameHeader", "version layer bitrate sample_rate padding channel_mode samples length"
+)
+
+# bitrate tables in kbit/s, index 0 = free format (unsupported), 15 = invalid
+_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_SAMPLE_RATES = {
+    1: (44100, 48000, 32000),
+    2: (22050, 24000, 16000),
+    2.5: (11025, 12000, 8000),
+}
+_VERSIONS = {0: 2.5, 2: 2, 3: 1}   # version bits -> MPEG version (1 is reserved)
+_LAYERS = {1: 3, 2: 2, 3: 1}       # layer bits -> layer (0 is reserved)
+
+
+def parse_header(data, offset=0):
+    """Parse the 4-byte frame header at ``offset``; return a FrameHeader or None."""
+    if offset + 4 > len(data):
+        return None
+    b0, b1, b2, b3 = data[offset:offset + 4]
+    if b0 != 0xFF or (b1 & 0xE0) != 0xE0:
+        return None
+    version = _VERSIONS.get((b1 >> 3) & 0x03)
+    layer = _LAYERS.get((b1 >> 1) & 0x03)
+    bitrate_index = (b2 >> 4) & 0x0F
+    rate_index = (b2 >> 2) & 0x03
+    if version is None or layer is None or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+    table_version = 1 if version == 1 else 2
+    bitrate = _BITRATES[(table_version, layer)][bitrate_index] * 1000
+    sample_rate = _SAMPLE_RATES[version][rate_index]
+    padding = (b2 >> 1) & 0x01
+    channel_mode = (b3 >> 6) & 0x03
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    elif layer == 3 and version != 1:
+        samples = 576
+        length = 72 * bitrate // sample_rate + padding
+    else:
+        samples = 1152
+        length = 144 * bitrate // sample_rate + padding
+    return FrameHeader(version, layer, bitrate, sample_rate, padding, channel_mode, samples, length)
+
+
+def id3v2_size(data):
+    """Length of a leading ID3v2 tag (0 if there is none)."""
+    if len(data) < 10 or data[:3] != b"ID3":
+        return 0
+    size = 0
+    for byte in data[6:10]:
+        size = (size << 7) | (byte & 0x7F)
+    footer = 10 if data[5] & 0x10 else 0
+    return 10 + size + footer
+
+
+def _audio_end(data):
+    # ID3v1 tag: last 128 bytes start with "TAG"
+    if len(data) >= 128 and data[-128:-125] == b"TAG":
+        return len(data) - 128
+    return len(data)
+
+
+def iter_frames(data):
+    """Yield ``(offset, FrameHeader)`` for every frame, skipping tags and junk.
+
+    A candidate header only counts when the next frame also parses (or the
+    data ends there), which filters out false syncs inside tag data.
+    """
+    offset = id3v2_size(data)
+    end = _audio_end(data)
+    while offset + 4 <= end:
+        header = parse_header(data, offset)
+        if header is not None and header.length > 4:
+            next_offset = offset + header.length
+            if next_offset >= end or parse_header(data, next_offset) is not None:
+                yield offset, header
+                offset = next_offset
+                continue
+        offset = data.find(b"\xff", offset + 1, end)
+        if offset < 0:
+            return
+
+
+def _xing_frames(data, offset, header):
+    """Frame count from a Xing/Info header inside the first frame, else None."""
+    if header.version == 1:
+        side_info = 17 if header.channel_mode == 3 else 32
+    else:
+        side_info = 9 if header.channel_mode == 3 else 17
+    tag_offset = offset + 4 + side_info
+    tag = data[tag_offset:tag_offset + 4]
+    if tag not in (b"Xing", b"Info"):
+        return None
+    flags = int.from_bytes(data[tag_offset + 4:tag_offset + 8], "big")
+    if not flags & 0x01:
+        return None
+    return int.from_bytes(data[tag_offset + 8:tag_offset + 12], "big")
+
+
+def duration(data):
+    """Playback length of MP3 ``data`` (bytes) in seconds, or None if no frames.
+
+    Uses the Xing/Info frame count when present, otherwise sums the frames.
+    """
+    total = 0.0
+    first = True
+    for offset, header in iter_frames(data):
+        if first:
+            first = False
+            frames = _xing_frames(data, offset, header)
+            if frames is not None:
+                return frames * header.samples / header.sample_rate
+        total += header.samples / header.sample_rate
+    return None if first else total
+
+
+def file_duration(path):
+    """``duration`` of the MP3 file at ``path`` (None if unreadable or not MP3)."""
+    try:
+        with open(path, "rb") as f:
+            return duration(f.read())
+    except OSError:
+        return None
+
+
+class ConcatError(ValueError):
+    """The inputs cannot be spliced frame by frame (not MP3, or formats differ)."""
+
+
+def _stream_format(header):
+    # frames can only be spliced when decoders need no reconfiguration
+    return (header.version, header.layer, header.sample_rate, header.channel_mode == 3)
+
+
+def _template_header(raw):
+    """``raw`` frame header bytes with CRC protection and padding switched off."""
+    return bytes((raw[0], raw[1] | 0x01, raw[2] & ~0x02 & 0xFF, raw[3]))
+
+
+def silent_frame(raw_header):
+    """One frame in the format of ``raw_header`` that decodes to silence.
+
+    All-zero side information means no main data and zero gain, which every
+    decoder renders as silence; the frame does not use the bit reservoir.
+    """
+    header_bytes = _template_header(raw_header)
+    header = parse_header(header_bytes)
+    return header_bytes + bytes(header.length - 4)
+
+
+def _xing_frame(raw_header, frames, size, vbr):
+    """Xing/Info frame recording the frame count and byte size of the stream."""
+    frame = bytearray(silent_frame(raw_header))
+    header = parse_header(frame)
+    if header.version == 1:
+        side_info = 17 if header.channel_mode == 3 else 32
+    else:
+        side_info = 9 if header.channel_mode == 3 else 17
+    offset = 4 + side_info
+    if header.length < offset + 16:
+        # e.g. MPEG-2 8 kbit/s mono frames are only 24 bytes: no room for the tag
+        raise ConcatError(f"{header.length}-byte frames are too short for an Info frame")
+    frame[offset:offset + 16] = (
+        (b"Xing" if vbr else b"Info") + (0x03).to_bytes(4, "big")
+        + frames.to_bytes(4, "big") + size.to_bytes(4, "big")
+    )
+    return bytes(frame)
+
+
+class _Splicer:
+    """Copies input frames into ``out`` and keeps the running Xing/Info totals."""
+
+    def __init__(self, out, gap, template=None, frames=0, size=0, vbr=False):
+        self.out = out
+        self.gap = gap
+        self.frames = frames
+        self.size = size
+        self.bitrates = set()
+        self.vbr = vbr
+        self.template = None
+        if template is not None:
+            self._set_format(template)
+
+    def _set_format(self, template):
+        header = parse_header(template)
+        self.template = template
+        self.fmt = _stream_format(header)
+        self.samples = header.samples
+        self.sample_rate = header.sample_rate
+        self.silence = silent_frame(template)
+        self.gap_frames = round(self.gap * header.sample_rate / header.samples)
+        self.bitrates.add(header.bitrate)
+
+    @property
+    def gap_seconds(self):
+        return self.gap_frames * self.samples / self.sample_rate
+
+    def add(self, path, leading_gap, on_format=None):
+        """Append one input file; return its duration in seconds."""
+        with open(path, "rb") as f:
+            data = f.read()
+        view = memoryview(data)
+        clip_samples = 0
+        first = True
+        for offset, header in iter_frames(data):
+            if first:
+                first = False
+                if self.template is None:
+                    self._set_format(bytes(view[offset:offset + 4]))
+                    if on_format:
+                        on_format()
+                elif _stream_format(header) != self.fmt:
+                    raise ConcatError(f"{path}: MP3 format differs from the playlist")
+                if leading_gap and self.gap_frames:
+                    self.out.write(self.silence * self.gap_frames)
+                    self.frames += self.gap_frames
+                    self.size += len(self.silence) * self.gap_frames
+                if _xing_frames(data, offset, header) is not None:
+                    continue   # the input's own Xing/Info frame carries no audio
+            self.out.write(view[offset:offset + header.length])
+            self.frames += 1
+            self.size += header.length
+            clip_samples += header.samples
+            self.bitrates.add(header.bitrate)
+        if first:
+            raise ConcatError(f"{path}: no MP3 frames")
+        return clip_samples / self.sample_rate
+
+    def info_frame(self):
+        vbr = self.vbr or len(self.bitrates) > 1
+        return _xing_frame(self.template, self.frames, self.size + len(self.silence), vbr)
+
+
+def concat_files(paths, dest, gap=0.0):
+    """Splice the MP3 files ``paths`` into ``dest`` with ``gap`` seconds of silence between them.
+
+    Returns ``(durations, gap)``: each input's duration in seconds and the gap
+    actually inserted (rounded to whole frames). ``dest`` is written through
+    a temporary file and replaced atomically. Raises ConcatError when an input
+    has no frames or its format (MPEG version, layer, sample rate, mono vs
+    stereo) differs from the first one.
+    """
+    tmp_path = f"{dest}.{secrets.token_hex(4)}.tmp"
+    try:
+        with open(tmp_path, "wb") as out:
+            splicer = _Splicer(out, gap)
+            # placeholder for the Xing/Info frame, rewritten once the totals are known
+            write_placeholder = lambda: out.write(_xing_frame(splicer.template, 0, 0, False))
+            durations = [
+                splicer.add(path, leading_gap=index > 0, on_format=write_placeholder)
+                for index, path in enumerate(paths)
+            ]
+            if splicer.template is None:
+                raise ConcatError("nothing to concatenate")
+            out.seek(0)
+            out.write(splicer.info_frame())
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return durations, splicer.gap_seconds
+
+
+class _Chunks(list):
+    def write(self, data):
+        self.append(data)
+
+
+def iter_concat(paths, gap=0.0):
+    """Yield the splice of ``paths`` (``gap`` seconds apart) one input at a time.
+
+    Same frames as ``concat_files`` but without the leading Info frame, for
+    streaming a playlist that is never stored. Callers should check inputs
+    with ``probe`` first: a bad input raises ConcatError mid-stream.
+    """
+    chunks = _Chunks()
+    splicer = _Splicer(chunks, gap)
+    for index, path in enumerate(paths):
+        splicer.add(path, leading_gap=index > 0)
+        yield b"".join(chunks)
+        chunks.clear()
+
+
+def probe(path):
+    """FrameHeader of the first audio frame of the file at ``path`` (reads only its head), or None."""
+    try:
+        with open(path, "rb") as f:
+            f.seek(id3v2_size(f.read(10)))
+            head = f.read(8192)
+    except OSError:
+        return None
+    for _, header in iter_frames(head):
+        return header
+    return None
+
+
+def same_format(a, b):
+    """Whether frames with headers ``a`` and ``b`` can be spliced into one stream."""
+    return _stream_format(a) == _stream_format(b)
+
+
+def gap_seconds(header, gap):
+    """``gap`` rounded to whole frames of ``header``'s format, as spliced by this module."""
+    return round(gap * header.sample_rate / header.samples) * header.samples / header.sample_rate
+
+
+def read_info(path):
+    """``(raw header, frames, bytes, vbr)`` from the leading Xing/Info frame of ``path``, or None."""
+    try:
+        with open(path, "rb") as f:
+            head = f.read(4096)
+    except OSError:
+        return None
+    header = parse_header(head)
+    if header is None:
+        return None
+    frames = _xing_frames(head, 0, header)
+    if frames is None:
+        return None
+    tag_offset = head.find(b"Xing", 4, header.length)
+    if tag_offset < 0:
+        tag_offset = head.find(b"Info", 4, header.length)
+    size = int.from_bytes(head[tag_offset + 12:tag_offset + 16], "big")
+    return head[:4], frames, size, head[tag_offset:tag_offset + 4] == b"Xing"
+
+
+def append_files(dest, paths, gap=0.0):
+    """Append ``paths`` to a playlist written by ``concat_files``, ``gap`` seconds apart.
+
+    The existing stream is copied to a temporary file (no decoding), the new
+    frames are appended there and the Info frame is rewritten with the new
+    totals; the result then replaces ``dest`` atomically, so a reader never
+    sees a half-appended file. Returns ``(durations, gap)`` like
+    ``concat_files``. Raises ConcatError when ``dest`` has no Info frame (it
+    was not written by ``concat_files``) or the formats differ; ``dest`` is
+    left untouched in that case.
+    """
+    info = read_info(dest)
+    if info is None:
+        raise ConcatError(f"{dest}: no Info frame to extend")
+    template, frames, size, vbr = info
+    splicer = _Splicer(None, gap, template=template, frames=frames,
+                       size=size - len(silent_frame(template)), vbr=vbr)
+    # check every input before touching the playlist
+    for path in paths:
+        with open(path, "rb") as f:
+            data = f.read()
+        first = next(iter_frames(data), None)
+        if first is None:
+            raise ConcatError(f"{path}: no MP3 frames")
+        if _stream_format(first[1]) != splicer.fmt:
+            raise ConcatError(f"{path}: MP3 format differs from the playlist")
+    tmp_path = f"{dest}.{secrets.token_hex(4)}.tmp"
+    try:
+        shutil.copyfile(dest, tmp_path)
+        with open(tmp_path, "r+b") as out:
+            out.seek(0, os.SEEK_END)
+            splicer.out = out
+            durations = [splicer.add(path, leading_gap=True) for path in paths]
+            out.seek(0)
+            out.write(splicer.info_frame())
+        os.replace(tmp_path, dest)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return durations, splicer.gap_seconds
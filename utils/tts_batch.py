@@ -0,0 +1,79 @@
+"""Bounded batch runner for TTS synthesis.
+
+A fixed set of daemon workers pulls jobs from a priority queue, so bulk word
+lists (challenges, CSV imports, backfill scripts) run N requests at a time
+without starving interactive requests submitted with a higher priority.
+Provider rate limits are enforced below this layer by utils.governor.
+"""
+
+import itertools
+import queue
+import threading
+from concurrent.futures import Future
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BULK = 10
+
+
+class TTSBatchEngine:
+    """Run ``synthesize(text)`` on a bounded worker pool, deduping in-flight keys."""
+
+    def __init__(self, synthesize, key_fn, workers=4):
+        self._synthesize = synthesize
+        self._key_fn = key_fn
+        self._workers = max(1, int(workers))
+        self._queue = queue.PriorityQueue()
+        self._counter = itertools.count()
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self._threads = []
+
+    def _ensure_workers(self):
+        if len(self._threads) >= self._workers:
+            return
+        with self._lock:
+            while len(self._threads) < self._workers:
+                thread = threading.Thread(target=self._worker, daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def _worker(self):
+        while True:
+            _, _, key, text, future = self._queue.get()
+            try:
+                if future.set_running_or_notify_cancel():
+                    try:
+                        future.set_result(self._synthesize(text))
+                    except Exception as e:
+                        future.set_exception(e)
+            finally:
+                with self._lock:
+                    if self._inflight.get(key) is future:
+                        del self._inflight[key]
+                self._queue.task_done()
+
+    def submit(self, text, priority=PRIORITY_BULK):
+        """Queue one text; identical in-flight texts share the same Future."""
+        key = self._key_fn(text)
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                return future
+            future = self._inflight[key] = Future()
+        self._queue.put((priority, next(self._counter), key, text, future))
+        self._ensure_workers()
+        return future
+
+    def run_many(self, texts, priority=PRIORITY_BULK, timeout=None):
+        """Synthesize every text and return per-item results in input order.
+
+        Each result is ``{"text", "ok", "result", "error"}``.
+        """
+        futures = [self.submit(text, priority) for text in texts]
+        results = []
+        for text, future in zip(texts, futures):
+            try:
+                results.append({"text": text, "ok": True, "result": future.result(timeout), "error": None})
+            except Exception as e:
+                results.append({"text": text, "ok": False, "result": None, "error": str(e)})
+        return results